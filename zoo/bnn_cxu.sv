@@ -32,7 +32,7 @@ module bnn_cxu
     initial ignore(`CHECK_CXU_L0_PARAMS);
     wire _unused_ok = &{1'b0,req_func,req_cxu,req_valid,1'b0};
 `ifdef BNN_CXU_VCD
-    initial begin $dumpfile("bnn_cxu.vcd"); $dumpvars(0, bnn_cxu); end
+    `CXU_WAVES(bnn_cxu, "bnn_cxu.vcd")
 `endif
 
     wire `V(CXU_DATA_W) xnor_ = req_data0 ~^ req_data1;
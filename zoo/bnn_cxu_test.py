@@ -20,6 +20,7 @@ import cocotb
 import random
 from cxu_li import *
 from tb import TB
+import refmodels
 
 # testbench
 @cocotb.test()
@@ -30,41 +31,14 @@ async def bnn_cxu_tb(dut):
     await tb.stop()
 
 async def sweep(tb):
-    mask = (1 << tb.n_bits) - 1
-    for (i,j) in cases(tb.n_bits):
-        model = bin(~(i^j) & mask).count('1')
-        await tb.test(0, 0, i, j, model)
-
-# generate test cases
-def cases(n_bits):
-    mask = (1<<n_bits) - 1
-
-    for i in range(1024):
-        yield (i,0)
-        yield (mask,i)
-        yield (i,i)
-        yield (i,~i & mask)
-
-    for i in range(n_bits):
-        for j in range(n_bits):
-            yield(1<<i,1<<j)
-            yield(1<<i,~(1<<j) & mask)
-
-    # fibonnaci
-    (i,j) = (1,1)
-    for _ in range(1000):
-        yield (i,j)
-        (i,j) = (j,(i+j)&mask)
-
-    # random
-    for _ in range(1000):
-        yield (random.randrange(1<<n_bits),random.randrange(1<<n_bits))
+    (a, b, counts) = refmodels.bnn_vectors(tb.n_bits, random.randrange(1<<32))
+    await tb.drive(refmodels.txns(0, 0, 0, a, b, counts))
 
 # cocotb-test, thanks @forencich
 
 import os
 import pytest
-from cocotb_test.simulator import run
+from vectors import run
 
 @pytest.mark.parametrize("width", [32, 64])
 
@@ -26,7 +26,7 @@ module bnn_l1_l2_cxu
 );
     initial ignore(`CHECK_CXU_L2_PARAMS && check_param("CXU_N_STATES", CXU_N_STATES, 0));
 `ifdef BNN_L1_L2_CXU_VCD
-    initial begin $dumpfile("bnn_l1_l2_cxu.vcd"); $dumpvars(0, bnn_l1_l2_cxu); end
+    `CXU_WAVES(bnn_l1_l2_cxu, "bnn_l1_l2_cxu.vcd")
 `endif
 
     `CXU_L1_NETS(l1_req, l1_resp);
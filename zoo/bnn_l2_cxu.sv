@@ -25,7 +25,7 @@ module bnn_l2_cxu
 );
     initial ignore(`CHECK_CXU_L2_PARAMS && check_param("CXU_N_STATES", CXU_N_STATES, 0));
 `ifdef BNN_L2_CXU_VCD
-    initial begin $dumpfile("bnn_l2_cxu.vcd"); $dumpvars(0, bnn_l2_cxu); end
+    `CXU_WAVES(bnn_l2_cxu, "bnn_l2_cxu.vcd")
 `endif
 
     `CXU_L0_NETS(t_req, t_resp);
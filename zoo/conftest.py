@@ -0,0 +1,99 @@
+## conftest.py: pytest options for the zoo testbenches
+
+'''
+Copyright (C) 2019-2023, Gray Research LLC.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+# By default each test_* runs the full cross product of its @pytest.mark.parametrize
+# stacks (e.g. nightly). With --tway=t (or CXU_TWAY=t), e.g. --tway=2 for fast pre-merge
+# runs, each test_* runs only a t-wise covering array of its parameter combinations:
+# a subset in which every combination of values of every t parameters still occurs.
+# The other combinations are deselected, and listed in the terminal summary. Under xdist
+# (-n), only the workers collect, so each worker sends its report to the controller, which
+# lists the first one (all workers collect the same items).
+
+from itertools import combinations
+import os
+import pytest
+
+def pytest_addoption(parser):
+    parser.addoption("--tway", type=int, default=int(os.environ.get("CXU_TWAY", 0)),
+                     help="run a t-wise covering array of each test's parameter combinations (0: all)")
+
+# greedily choose rows (dicts of parameter => value) until every t-wise combination of the
+# rows' parameter values is covered; returns the chosen rows' indices
+def covering_array(rows, t):
+    names = sorted({ name for row in rows for name in row
+                     if len({ repr(r.get(name)) for r in rows }) > 1 })  # (varying parameters)
+    t = min(t, len(names))
+    def tuples(row):
+        return { tuple((name, repr(row.get(name))) for name in names_)
+                 for names_ in combinations(names, t) }
+    covers = [tuples(row) for row in rows]
+    uncovered = set().union(*covers) if covers else set()
+
+    chosen = []
+    while uncovered:
+        best = max(range(len(rows)), key=lambda k: len(covers[k] & uncovered))
+        chosen.append(best)
+        uncovered -= covers[best]
+    return sorted(chosen) if names else list(range(len(rows)))
+
+def pytest_collection_modifyitems(config, items):
+    t = config.getoption("tway")
+    if t <= 0:
+        return
+
+    # group each test function's parametrized items
+    groups = {}
+    for item in items:
+        if hasattr(item, "callspec"):
+            groups.setdefault((item.module.__name__, item.originalname), []).append(item)
+
+    deselected = []
+    config._cxu_tway = []
+    for ((module, name), group) in groups.items():
+        keep = set(covering_array([item.callspec.params for item in group], t))
+        skipped = [item for (k, item) in enumerate(group) if k not in keep]
+        deselected += skipped
+        config._cxu_tway.append((f"{module}::{name}", len(keep), len(group),
+                                 [item.callspec.id for item in skipped]))
+    if deselected:
+        skip = set(deselected)
+        items[:] = [item for item in items if item not in skip]
+        config.hook.pytest_deselected(items=deselected)
+
+# xdist worker: send the report to the controller
+def pytest_sessionfinish(session):
+    report = getattr(session.config, "_cxu_tway", None)
+    if report and hasattr(session.config, "workeroutput"):
+        session.config.workeroutput["cxu_tway"] = report
+
+# xdist controller: take a worker's report
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+    report = getattr(node, "workeroutput", {}).get("cxu_tway")
+    if report and not getattr(node.config, "_cxu_tway", None):
+        node.config._cxu_tway = report
+
+def pytest_terminal_summary(terminalreporter, config):
+    report = getattr(config, "_cxu_tway", None)
+    if not report:
+        return
+    terminalreporter.section("{0}-way covering array parametrization ({1} deselected)".format(
+        config.getoption("tway"), sum(n_all - n_kept for (_, n_kept, n_all, _) in report)))
+    for (test, n_kept, n_all, skipped) in report:
+        terminalreporter.write_line("{0}: {1} of {2} combinations; skipped {3}".format(
+            test, n_kept, n_all, " ".join(skipped) if skipped else "none"))
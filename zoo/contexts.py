@@ -0,0 +1,175 @@
+## contexts.py: virtualize many software state contexts on a CXU's hardware state contexts
+
+'''
+Copyright (C) 2019-2023, Gray Research LLC.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+# A CXU has CXU_N_STATES hardware state contexts; software may have many more. Contexts maps
+# n_ctxs logical contexts onto them, as an OS would, through the TB, using IStateContext:
+# a logical context's request first switches it in, if not resident, evicting the least
+# recently used resident context, saving its state to (host) memory, then restoring the
+# logical context's saved state into the freed hardware context.
+#
+# Lazily (by default), the context status (CS) tracking avoids state traffic:
+#   - evicting, read_status; save (read_state) only if dirty; a clean context's saved state
+#     is already current, and an init one's is nothing
+#   - restoring an init context, write_status(init) (if not already), rather than its state
+#   - restoring other contexts, write_state then write_status(clean), so that unless the
+#     context then changes, its next eviction needs no save; and after save(), clean too
+# Eagerly (lazy=False), every eviction saves and every restore writes state, regardless.
+#
+# Each request's expected response is the manager's model of the context, so the TB checks
+# that every save and restore round trips through the hardware. Each switch's traffic is
+# recorded; report() and summary() tally it, and perf.write(report, FILE) appends the report
+# to contexts.json.
+#
+# (one word state contexts, i.e. context status words' state_size 1, as IMulAcc's)
+
+from collections import Counter, OrderedDict
+from typing import Any, Dict
+
+from cxu_li import *
+
+FILE = "contexts.json"
+TRAFFIC = ["status_reads", "saves", "restores", "status_writes"]
+
+class Contexts:
+    def __init__(self, tb, n_ctxs, cxu=0, lazy=True, state_size=1):
+        self.tb = tb
+        self.cxu = cxu
+        self.lazy = lazy
+        self.state_size = state_size
+        self.n_ctxs = n_ctxs
+        self.slots = [None] * tb.n_states           # hardware context => resident logical context
+        self.css = [CS.init] * tb.n_states          # hardware contexts' CS, as after reset
+        self.resident = OrderedDict()               # logical context => hardware context, LRU first
+        self.values = [0] * n_ctxs                  # logical contexts' current state
+        self.saved = [None] * n_ctxs                # logical contexts' saved state, None if init
+        self.switches = []                          # each switch's logical context, victim, and traffic
+        self.other = Counter()                      # traffic of save() and release()
+        self.hits = 0
+
+    # the context status word of CS cs
+    def csw(self, cs):
+        return (self.state_size << 2) | cs
+
+    async def request(self, slot, func, data0, model, traffic, kind):
+        await self.tb.test_cxu(self.cxu, slot, func, data0, 0, model)
+        traffic[kind] += 1
+
+    # make logical context ctx resident, returning its hardware context
+    async def switch(self, ctx):
+        if ctx in self.resident:
+            self.resident.move_to_end(ctx)
+            self.hits += 1
+            return self.resident[ctx]
+        traffic = Counter()
+        victim = None
+        if None in self.slots:
+            slot = self.slots.index(None)
+        else:
+            (victim, slot) = self.resident.popitem(last=False)
+            await self.evict(victim, slot, traffic)
+        await self.restore(ctx, slot, traffic)
+        self.slots[slot] = ctx
+        self.resident[ctx] = slot
+        self.switches.append(dict({ "ctx":ctx, "slot":slot, "victim":victim },
+                                  **{ kind:traffic[kind] for kind in TRAFFIC }))
+        return slot
+
+    async def evict(self, ctx, slot, traffic):
+        cs = self.css[slot]
+        if self.lazy:
+            await self.request(slot, IStateContext.read_status, 0, self.csw(cs), traffic, "status_reads")
+            if cs == CS.clean:
+                return
+            if cs == CS.init:
+                self.saved[ctx] = None
+                return
+        await self.request(slot, IStateContext.read_state, 0, self.values[ctx], traffic, "saves")
+        self.saved[ctx] = self.values[ctx]
+
+    async def restore(self, ctx, slot, traffic):
+        cs = self.css[slot]
+        if self.lazy and self.saved[ctx] is None:
+            if cs != CS.init:
+                await self.request(slot, IStateContext.write_status, CS.init, self.csw(cs), traffic, "status_writes")
+                self.css[slot] = CS.init
+            return
+        value = 0 if self.saved[ctx] is None else self.saved[ctx]
+        await self.request(slot, IStateContext.write_state, value, value, traffic, "restores")
+        self.css[slot] = CS.dirty
+        if self.lazy:
+            await self.request(slot, IStateContext.write_status, CS.clean, self.csw(CS.dirty), traffic, "status_writes")
+            self.css[slot] = CS.clean
+
+    # issue a request updating logical context ctx's state to model, e.g. IMulAcc.mulacc
+    async def update(self, ctx, func, data0, data1, model):
+        slot = await self.switch(ctx)
+        await self.tb.test_cxu(self.cxu, slot, func, data0, data1, model)
+        self.values[ctx] = model
+        self.css[slot] = CS.dirty
+
+    # issue a request reading logical context ctx's state
+    async def read(self, ctx):
+        slot = await self.switch(ctx)
+        await self.tb.test_cxu(self.cxu, slot, IStateContext.read_state, 0, 0, self.values[ctx])
+
+    # save logical context ctx's state, if resident (and dirty), leaving it resident (and clean)
+    async def save(self, ctx):
+        if ctx not in self.resident:
+            return
+        slot = self.resident[ctx]
+        if self.lazy and self.css[slot] != CS.dirty:
+            return
+        await self.request(slot, IStateContext.read_state, 0, self.values[ctx], self.other, "saves")
+        self.saved[ctx] = self.values[ctx]
+        if self.lazy:
+            await self.request(slot, IStateContext.write_status, CS.clean, self.csw(CS.dirty), self.other, "status_writes")
+            self.css[slot] = CS.clean
+
+    # reinitialize logical context ctx, e.g. on its software's exit
+    async def release(self, ctx):
+        (self.values[ctx], self.saved[ctx]) = (0, None)
+        if ctx in self.resident:
+            slot = self.resident[ctx]
+            await self.request(slot, IStateContext.write_status, CS.init, self.csw(self.css[slot]),
+                               self.other, "status_writes")
+            self.css[slot] = CS.init
+
+    def report(self) -> Dict[str, Any]:
+        totals = Counter()
+        for switch in self.switches:
+            totals.update({ kind:switch[kind] for kind in TRAFFIC })
+        n = len(self.switches)
+        return {
+            "policy": "lazy" if self.lazy else "eager",
+            "n_ctxs": self.n_ctxs,
+            "n_states": len(self.slots),
+            "hits": self.hits,
+            "switches": n,
+            "traffic": { kind:totals[kind] for kind in TRAFFIC },
+            "per_switch": { kind:totals[kind] / n if n else None for kind in TRAFFIC },
+            "state_words_per_switch": (totals["saves"] + totals["restores"]) * self.state_size / n if n else None,
+            "other": { kind:self.other[kind] for kind in TRAFFIC },
+            "by_switch": self.switches }
+
+    def summary(self) -> str:
+        r = self.report()
+        return "contexts: {0} {1} contexts on {2} states, {3} switches ({4} hits), " \
+               "saves {5} restores {6} status reads {7} writes {8}, {9} state words/switch".format(
+            r["policy"], r["n_ctxs"], r["n_states"], r["switches"], r["hits"], r["traffic"]["saves"],
+            r["traffic"]["restores"], r["traffic"]["status_reads"], r["traffic"]["status_writes"],
+            "-" if r["state_words_per_switch"] is None else "{0:.2f}".format(r["state_words_per_switch"]))
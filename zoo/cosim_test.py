@@ -0,0 +1,76 @@
+## cosim_test.py: RV32IM ISS + CXU co-simulation testbench: kernels' speedups with custom instructions
+
+'''
+Copyright (C) 2019-2023, Gray Research LLC.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+import cocotb
+import os
+from cxu_li import *
+import iss
+import perf
+
+# testbench: run CXU_KERNEL on the ISS, software-only, and with its custom instructions on the dut
+@cocotb.test()
+async def cosim_tb(dut):
+    port = iss.DutPort(dut, Level(int(os.environ["CXU_LEVEL"])))
+    await port.start()
+    report = await iss.cosim(os.environ["CXU_KERNEL"], port, int(os.environ.get("CXU_KERNEL_N", 0)) or None)
+    dut._log.info(iss.summary(report))
+    if cocotb.SIM_NAME:
+        perf.write(report, iss.FILE)
+
+# cocotb-test, thanks @forencich
+
+import pytest
+from iss import run
+
+# kernel, dut, level, verilog_sources besides common.svh, cxu.svh, the dut's
+CONFIGS = [
+    ("dotprod",  "mulacc_cxu",    Level.l1_pipe,   ["shared.sv"]),
+    ("dotprod",  "mulacc_l2_cxu", Level.l2_stream, ["cvt12_cxu.sv", "mulacc_cxu.sv", "shared.sv"]),
+    ("dotprod8", "dotprod_cxu",   Level.l1_pipe,   ["shared.sv"]),
+    ("bnn",      "bnn_l1_cxu",    Level.l1_pipe,   ["cvt01_cxu.sv", "shared.sv", "bnn_cxu.sv", "popcount_cxu.sv"]),
+    ("bnn",      "bnn_l1_l2_cxu", Level.l2_stream, ["cvt01_cxu.sv", "cvt12_cxu.sv", "shared.sv", "bnn_cxu.sv", "popcount_cxu.sv"]),
+]
+
+@pytest.mark.parametrize("config", CONFIGS, ids=[f"{k}-{d}" for (k, d, _, _) in CONFIGS])
+@pytest.mark.parametrize("latency", [0,2])
+
+def test_cosim(request, config, latency):
+    (kernel, dut, level, sources) = config
+    module = os.path.splitext(os.path.basename(__file__))[0]
+    states = 0 if kernel == "bnn" else 1
+    parameters = {}
+    parameters['CXU_LATENCY'] = latency
+    parameters['CXU_N_STATES'] = states
+    if states:
+        parameters['CXU_STATE_ID_W'] = 0
+    parameters['CXU_DATA_W'] = 32
+    if dut == "dotprod_cxu":
+        parameters['ELEM_W'] = 8
+    sim_build = os.path.join(".", "sim_build",
+        request.node.name.replace('[', '-').replace(']', ''))
+
+    run(
+        includes=["."],
+        verilog_sources=["common.svh", "cxu.svh", f"{dut}.sv"] + sources,
+        toplevel=dut,
+        module=module,
+        parameters=parameters,
+        extra_env={ 'CXU_LEVEL':str(int(level)), 'CXU_KERNEL':kernel, 'CXU_N_STATES':str(states),
+                    'CXU_LATENCY':str(latency), 'CXU_DATA_W':str(32) },
+        sim_build=sim_build
+    )
@@ -0,0 +1,321 @@
+## cppdriver.py: standalone Verilator C++ driver backend for CXU testbenches
+
+'''
+Copyright (C) 2019-2023, Gray Research LLC.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+# With CXU_BACKEND=cpp, a test_*() pytest function runs its module's cocotb testbenches
+# in-process, without a simulator, with TB in vector mode recording the test cases and
+# expected responses (see vectors.py) to a binary request stream. A generated C++ main,
+# <dut>_driver.cpp, built with the dut by Verilator, reads the requests, drives the
+# valid/ready handshakes and resp_ready backpressure natively, and writes a binary
+# response stream, which is then checked here against the expected responses.
+#
+# requests:  records of 8 uint64: op, cxu, state, func, data0, data1, status, data
+# responses: for each REQ record, in order, 3 uint64: cycle, status, data
+
+import asyncio
+import cocotb
+import contextlib
+import importlib
+from jinja2 import Template
+import numpy as np
+import os
+import re
+import subprocess
+import time
+
+from cxu_li import *
+import simcache
+import vectors
+
+REQS  = "cxu_reqs.bin"
+RESPS = "cxu_resps.bin"
+
+def enabled():
+    return os.environ.get("CXU_BACKEND", "cocotb") == "cpp"
+
+# drop-in for simcache.run(), for the cocotb-test arguments that apply
+def run(toplevel, module, verilog_sources, includes=(), parameters=None, defines=(),
+        extra_env=None, sim_build="sim_build", **_):
+    parameters = parameters or {}
+    os.makedirs(sim_build, exist_ok=True)
+
+    # record the module's testbenches' test cases
+    recs = record(module, extra_env or {})
+    n_bits = parameters.get("CXU_DATA_W", 32)
+    mask = np.uint64((1 << n_bits) - 1)
+    recs[:, [4,5,7]] &= mask
+    reqs = os.path.join(sim_build, REQS)
+    resps = os.path.join(sim_build, RESPS)
+    recs.tofile(reqs)
+
+    # build (or reuse) the driver, then run it
+    driver = generate(toplevel, f"{toplevel}.sv", sim_build)
+    kwargs = dict(toplevel=toplevel, verilog_sources=list(verilog_sources) + [driver],
+                  includes=list(includes), parameters=parameters,
+                  defines=[d for d in defines if not d.endswith("_VCD")])   # (no waveforms)
+    with build_dir(kwargs, sim_build) as dir:
+        start = time.time()
+        result = subprocess.run([os.path.join(dir, f"V{toplevel}"), reqs, resps, "1"])
+        elapsed = time.time() - start
+    assert result.returncode == 0, f"{toplevel} driver exited with status {result.returncode}"
+
+    check(recs, np.fromfile(resps, dtype=np.uint64).reshape(-1, 3), elapsed)
+
+# run the module's cocotb tests, with no dut, returning their recorded records as a (n,8) array
+def record(module, extra_env):
+    saved = { name:os.environ.get(name) for name in extra_env }
+    os.environ.update(extra_env)
+    vectors.recorded = []
+    try:
+        m = importlib.import_module(module)
+        for test in [t for t in vars(m).values() if isinstance(t, cocotb.test)]:
+            asyncio.run(test._func(None))
+        return np.array(vectors.recorded, dtype=np.uint64).reshape(-1, 8)
+    finally:
+        vectors.recorded = None
+        for (name, value) in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+# check each response matches its REQ record's expected response
+def check(recs, resps, elapsed, driver="cpp driver"):
+    reqs = recs[recs[:,0] == vectors.REQ]
+    cycles = int(resps[-1,0]) + 1 if len(resps) else 0
+    print("{4}: {0} requests, {1} responses, {2} cycles, {3:.3f} s".format(
+        len(reqs), len(resps), cycles, elapsed, driver))
+    n = min(len(reqs), len(resps))
+    bad = np.flatnonzero((resps[:n,1] != reqs[:n,6]) | (resps[:n,2] != reqs[:n,7]))
+    for k in bad[:10]:
+        (_, _, state, func, data0, data1, status, data) = (int(x) for x in reqs[k])
+        print("test({0},{1:2d},{2:08x},{3:08x}) => {4:1d}:{5:08x} != {6:1d}:{7:08x}".format(
+            state, func, data0, data1, int(resps[k,1]), int(resps[k,2]), status, data))
+    assert len(bad) == 0 and len(resps) == len(reqs), \
+        "{3}: {0} errors, {1} of {2} responses".format(len(bad), len(resps), len(reqs), driver)
+
+# the directory of the Verilator build of the dut and its driver, cached unless CXU_SIM_CACHE=0
+@contextlib.contextmanager
+def build_dir(kwargs, sim_build):
+    def build(dir):
+        toplevel = kwargs["toplevel"]
+        cmd = (["verilator", "--cc", "--exe", "--build", "-O3", "--x-assign", "fast", "--x-initial", "fast",
+                "-Mdir", dir, "--prefix", "Vtop", "--top-module", toplevel, "-o", f"V{toplevel}"]
+            + [f"-I{include}" for include in kwargs["includes"]]
+            + [f"-D{define}" for define in kwargs["defines"]]
+            + [f"-G{name}={value}" for (name, value) in kwargs["parameters"].items()]
+            + [os.path.abspath(source) for source in kwargs["verilog_sources"]])
+        subprocess.run(cmd, check=True)
+
+    if not simcache.enabled():
+        dir = os.path.abspath(os.path.join(sim_build, "cpp"))
+        build(dir)
+        yield dir
+        return
+    with simcache.cached("verilator-cpp", build, **kwargs) as dir:
+        yield os.path.abspath(dir)
+
+# generate sim_build/<dut>_driver.cpp, a driver for the dut at the CXU-LI level of its
+# `CXU_L<n>_PARAMS() declaration in source
+def generate(dut, source, sim_build="."):
+    with open(source) as f:
+        m = re.search(r"`CXU_L([0-3])_PARAMS\(", f.read())
+    if m is None:
+        raise ValueError(f"{source}: no `CXU_L<n>_PARAMS(...) declaration")
+    level = int(m.group(1))
+    if level == Level.l3_ooo:
+        raise ValueError(f"{source}: the C++ driver does not support CXU-L3")
+
+    output = os.path.join(sim_build, f"{dut}_driver.cpp")
+    with open(output, 'w') as f:
+        f.write(TEMPLATE.render(dut=dut, level=level))
+        f.flush()
+    return output
+
+TEMPLATE = Template(
+"""// {{dut}}_driver.cpp: standalone Verilator driver for {{dut}} (CXU-L{{level}}), generated by cppdriver.py
+//
+// Copyright (C) 2019-2023, Gray Research LLC.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//    http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+// usage: V{{dut}} requests.bin responses.bin [seed]
+//
+// requests:  records of 8 uint64: op, cxu, state, func, data0, data1, status, data
+//     op REQ(0): issue request; RESET(1): await responses, reset; FLOW(2): resp_ready % = data0
+// responses: for each REQ record, in order, 3 uint64: cycle, status, data
+
+#include <cstdint>
+#include <cstdio>
+#include <cstdlib>
+#include <vector>
+#include "Vtop.h"
+#include "verilated.h"
+
+enum { REQ = 0, RESET = 1, FLOW = 2 };
+const uint64_t TIMEOUT = 100000;        // no. of cycles without progress until hung
+
+{%- if level >= 2 %}
+
+// xorshift64 pseudo-random numbers, for resp_ready backpressure
+static uint64_t rng_state = 1;
+static uint64_t rng() {
+    rng_state ^= rng_state << 13;
+    rng_state ^= rng_state >> 7;
+    rng_state ^= rng_state << 17;
+    return rng_state;
+}
+{%- endif %}
+
+int main(int argc, char** argv) {
+    if (argc < 3) {
+        fprintf(stderr, "usage: %s requests.bin responses.bin [seed]\\n", argv[0]);
+        return 1;
+    }
+{%- if level >= 2 %}
+    if (argc > 3 && strtoull(argv[3], nullptr, 0) != 0)
+        rng_state = strtoull(argv[3], nullptr, 0);
+{%- endif %}
+
+    // read requests
+    FILE* in = fopen(argv[1], "rb");
+    if (!in) {
+        perror(argv[1]);
+        return 1;
+    }
+    std::vector<uint64_t> recs;
+    uint64_t buf[8];
+    while (fread(buf, sizeof(buf), 1, in) == 1)
+        recs.insert(recs.end(), buf, buf + 8);
+    fclose(in);
+    const size_t n = recs.size() / 8;
+
+    Verilated::commandArgs(argc, argv);
+    Vtop* top = new Vtop;
+    std::vector<uint64_t> resps;
+    resps.reserve(3 * n);
+
+    size_t   i = 0;                         // next record to issue
+    long     n_out = 0;                     // no. of requests awaiting responses
+    int      rst_cnt = 0;                   // no. of reset cycles remaining
+{%- if level >= 2 %}
+    unsigned pct = 100;                     // resp_ready percentage
+{%- endif %}
+    uint64_t cycle = 0;
+    uint64_t idle = 0;                      // no. of cycles without progress
+    int      status = 0;
+{%- if level >= 1 %}
+    top->clk = 0;
+    top->clk_en = 1;
+    top->rst = 0;
+{%- endif %}
+
+    while (i < n || n_out > 0 || rst_cnt > 0) {
+        const uint64_t* r = &recs[8 * (i < n ? i : 0)];
+
+        // perform a control record, once every outstanding response is received
+        if (rst_cnt == 0 && i < n && r[0] != REQ && n_out == 0) {
+{%- if level >= 1 %}
+            if (r[0] == RESET)
+                rst_cnt = 2;
+{%- endif %}
+{%- if level >= 2 %}
+            if (r[0] == FLOW)
+                pct = (unsigned)r[4];
+{%- endif %}
+            ++i;
+            continue;
+        }
+
+        // present this cycle's inputs
+        const bool valid = rst_cnt == 0 && i < n && r[0] == REQ;
+        top->req_valid = valid;
+        top->req_cxu   = r[1];
+{%- if level >= 1 %}
+        top->req_state = r[2];
+{%- endif %}
+        top->req_func  = r[3];
+        top->req_data0 = r[4];
+        top->req_data1 = r[5];
+{%- if level >= 1 %}
+        top->rst = rst_cnt != 0;
+{%- endif %}
+{%- if level >= 2 %}
+        top->req_insn = 0;
+        top->resp_ready = rng() % 100 < pct;
+{%- endif %}
+        top->eval();
+
+        // sample handshakes, then advance to the next cycle
+{%- if level >= 2 %}
+        const bool req_hs  = valid && top->req_ready;
+        const bool resp_hs = top->resp_valid && top->resp_ready;
+{%- elif level == 1 %}
+        const bool req_hs  = valid;
+        const bool resp_hs = top->resp_valid;
+{%- else %}
+        const bool req_hs  = valid;
+        const bool resp_hs = valid;         // combinational: response is that of the current request
+{%- endif %}
+        if (resp_hs) {
+            resps.push_back(cycle);
+            resps.push_back(top->resp_status);
+            resps.push_back(top->resp_data);
+        }
+{%- if level >= 1 %}
+        top->clk = 1;
+        top->eval();
+        top->clk = 0;
+{%- endif %}
+
+        i += req_hs;
+        n_out += (long)req_hs - (long)resp_hs;
+        if (rst_cnt != 0)
+            --rst_cnt;
+        idle = (req_hs || resp_hs) ? 0 : idle + 1;
+        ++cycle;
+        if (idle >= TIMEOUT) {
+            fprintf(stderr, "%s: no progress in %llu cycles, at record %zu of %zu\\n",
+                argv[0], (unsigned long long)TIMEOUT, i, n);
+            status = 2;
+            break;
+        }
+    }
+    top->final();
+    delete top;
+
+    // write responses
+    FILE* out = fopen(argv[2], "wb");
+    if (!out) {
+        perror(argv[2]);
+        return 1;
+    }
+    fwrite(resps.data(), sizeof(uint64_t), resps.size(), out);
+    fclose(out);
+    return status;
+}
+""")
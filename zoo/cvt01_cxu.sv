@@ -45,7 +45,7 @@ module cvt01_cxu
     initial ignore(`CHECK_CXU_L1_PARAMS && check_param("CXU_N_STATES", CXU_N_STATES, 0));
     wire _unused_ok = &{1'b0,req_state,1'b0};
 `ifdef CVT01_CXU_VCD
-    initial begin $dumpfile("cvt01_cxu.vcd"); $dumpvars(0, cvt01_cxu); end
+    `CXU_WAVES(cvt01_cxu, "cvt01_cxu.vcd")
 `endif
 
     // forward request to target combinational CXU
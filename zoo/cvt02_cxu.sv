@@ -41,7 +41,7 @@ module cvt02_cxu
 
     wire _unused_ok = &{1'b0,req_state,req_insn,1'b0};
 `ifdef CVT02_CXU_VCD
-    initial begin $dumpfile("cvt02_cxu.vcd"); $dumpvars(0, cvt02_cxu); end
+    `CXU_WAVES(cvt02_cxu, "cvt02_cxu.vcd")
 `endif
 
     always_comb begin
@@ -54,7 +54,7 @@ module cvt12_cxu
 
     wire _unused_ok = &{1'b0,req_insn,1'b0};
 `ifdef CVT12_CXU_VCD
-    initial begin $dumpfile("cvt12_cxu.vcd"); $dumpvars(0, cvt12_cxu); end
+    `CXU_WAVES(cvt12_cxu, "cvt12_cxu.vcd")
 `endif
 
     // suspend new initiator requests (negate req_ready) when pending count reaches CXU_FIFO_SIZE
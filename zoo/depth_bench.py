@@ -0,0 +1,171 @@
+## depth_bench.py: queue depth vs. throughput sweep for cvt12_cxu and switch_cxu_core
+
+'''
+Copyright (C) 2019-2023, Gray Research LLC.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+# Sweep a queue depth, cvt12_cxu's CXU_FIFO_SIZE (via mulacc_l2_cxu) or switch_cxu_core's
+# N_REQS (via a generated switchMxN_macs_cxu), across target latencies and resp_ready
+# fractions, measuring the sustained throughput (responses per cycle) of a long saturating
+# IMulAcc request stream at each point. The target latency is mulacc_l2_cxu's CXU_LATENCY,
+# which it forwards to its mulacc_cxu as well as to its cvt12_cxu, so a cvt12_cxu queue
+# shallower than its target's pipeline throttles it. For each (latency, resp_ready fraction)
+# configuration, recommend the smallest depth whose throughput is within a tolerance of the
+# best depth's, and, for cvt12, compare it with mulacc_l2_cxu's default CXU_FIFO_SIZE.
+#
+# usage: python3 depth_bench.py cvt12  [-l 0 1 2 4 8] [-d 1 2 4 8 16] [-f 1.0 0.9 0.5]
+#        python3 depth_bench.py switch [-p 2 2] [-l ...] [-d 2 4 8 16 32] [-f ...]
+# writes the measurements and recommendations to depth_bench.json
+
+import cocotb
+
+import argparse
+import json
+import numpy as np
+import os
+import random
+
+from cxu_li import *
+from imulacc import IMulAcc
+from initiators import Initiators
+import perf
+import refmodels
+from tb import TB
+
+N_TXNS = 2000                           # no. of requests per initiator per run
+
+# testbench: cvt12_cxu, as mulacc_l2_cxu, to a CXU_LATENCY mulacc_cxu, at CXU_BENCH_FRAC resp_ready fraction
+@cocotb.test()
+async def cvt12_bench(dut):
+    tb = TB(dut, Level.l2_stream)
+    if tb.perf is None:
+        tb.perf = perf.PerfMonitor(tb.dut, tb.level)
+    tb.resp_ready_frac = float(os.environ.get("CXU_BENCH_FRAC", 1.0))
+    await tb.start()
+    (zero, state, a, b, model) = bench_vectors(tb.n_states, tb.n_bits)
+    await tb.drive(refmodels.txns(0, state, np.where(zero, IMulAcc.mul, IMulAcc.mulacc), a, b, model))
+    await tb.stop()
+
+# testbench: switch_cxu_core, as switchMxN_macs_cxu, all initiators contending
+@cocotb.test()
+async def switch_bench(dut):
+    from switch_macs_cxu_test import contention_txns
+    inis = Initiators(dut, Level.l2_stream, int(os.environ.get("CXU_N_INIS")))
+    inis.set_resp_ready_frac(float(os.environ.get("CXU_BENCH_FRAC", 1.0)))
+    await inis.start()
+    await inis.drive([contention_txns(tb, p, random.randrange(1<<32), n=N_TXNS) for (p, tb) in enumerate(inis.tbs)])
+    await inis.stop()
+
+# random IMulAcc requests across the states, occasionally zeroing
+def bench_vectors(n_states, n_bits, n=N_TXNS, seed=0):
+    rng = np.random.default_rng(seed)
+    zero = (rng.integers(0, 10, size=n) == 0).astype(np.uint64)
+    state = rng.integers(0, n_states, size=n, dtype=np.uint64)
+    a = refmodels.randoms(rng, n, n_bits)
+    b = refmodels.randoms(rng, n, n_bits)
+    return (zero, state, a, b, refmodels.accumulate(zero, state, a * b, n_states, n_bits))
+
+# run one configuration's benchmark; returns its throughput
+def bench(dut, latency, depth, frac, ports=(2,2), width=32):
+    from simcache import run
+    import switch_cxu_gen
+
+    sim_build = os.path.join(".", "sim_build", "depth_bench",
+        "{0}-lat{1}-depth{2}-frac{3}".format(dut if dut == "cvt12" else "switch{0}x{1}".format(*ports),
+                                             latency, depth, frac))
+    os.makedirs(sim_build, exist_ok=True)
+    report = os.path.join(sim_build, perf.FILE)
+    if os.path.exists(report):
+        os.remove(report)
+
+    if dut == "cvt12":
+        toplevel = "mulacc_l2_cxu"
+        sources = [f"{toplevel}.sv", "cvt12_cxu.sv"]
+        parameters = { 'CXU_LATENCY':latency, 'CXU_FIFO_SIZE':depth, 'CXU_N_STATES':1 }
+        env = { 'CXU_LATENCY':str(latency), 'CXU_N_STATES':"1" }
+    else:
+        (m, n) = ports
+        toplevel = f"switch{m}x{n}_macs_cxu"
+        switch_cxu_gen.generate([m, n], macs=True, dir=sim_build)
+        sources = [os.path.join(sim_build, f"{toplevel}.sv"), os.path.join(sim_build, f"switch{m}x{n}_cxu.sv"),
+                   "switch_cxu_core.sv", "mulacc_l2_cxu.sv", "cvt12_cxu.sv"]
+        parameters = { 'CXU_N_CXUS':n, 'CXU_N_STATES':m, 'CXU_STATE_ID_W':(m-1).bit_length(),
+                       'N_REQS':depth, 'LATENCY':latency }
+        env = { 'CXU_N_INIS':str(m), 'CXU_N_CXUS':str(n), 'CXU_N_STATES':str(m) }
+    parameters['CXU_DATA_W'] = width
+
+    run(
+        includes=["."],
+        verilog_sources=["common.svh", "cxu.svh"] + sources + ["mulacc_cxu.sv", "shared.sv"],
+        toplevel=toplevel,
+        module="depth_bench",
+        testcase=f"{dut}_bench",
+        parameters=parameters,
+        extra_env=dict(env, CXU_DATA_W=str(width), CXU_BENCH_FRAC=str(frac), CXU_VECTORS="0"),
+        sim_build=sim_build
+    )
+    with open(report) as f:
+        reports = json.load(f)
+    return reports[-1]["throughput"]    # (the last report is Initiators' aggregate, if any)
+
+# the smallest depth whose throughput is within tolerance of the best, per (latency, frac);
+# for cvt12, also mulacc_l2_cxu's default CXU_FIFO_SIZE
+def recommend(results, tolerance, dut="cvt12"):
+    recs = []
+    for config in sorted({ (r["latency"], r["frac"]) for r in results }):
+        points = sorted((r["depth"], r["throughput"] or 0.0) for r in results if (r["latency"], r["frac"]) == config)
+        best = max(t for (_, t) in points)
+        depth = min(d for (d, t) in points if t >= (1 - tolerance) * best)
+        recs.append({ "latency":config[0], "frac":config[1], "saturation":best, "depth":depth })
+        if dut == "cvt12":
+            recs[-1]["default"] = 1 << config[0].bit_length()   # (mulacc_l2_cxu: 2**$clog2(1+CXU_LATENCY))
+    return recs
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep queue depths vs. throughput")
+    parser.add_argument('dut', choices=["cvt12", "switch"], help="cvt12: CXU_FIFO_SIZE; switch: N_REQS")
+    parser.add_argument('-l', '--latencies', type=int, default=[0,1,2,4,8], nargs='+', help="target CXU_LATENCYs")
+    parser.add_argument('-d', '--depths', type=int, nargs='+', help="depths (powers of 2)")
+    parser.add_argument('-f', '--fracs', type=float, default=[1.0,0.9,0.5], nargs='+', help="resp_ready fractions")
+    parser.add_argument('-p', '--ports', type=int, default=[2,2], nargs=2, help="switch: no. of initiators, targets")
+    parser.add_argument('-w', '--width', type=int, default=32, help="CXU_DATA_W")
+    parser.add_argument('-t', '--tolerance', type=float, default=0.01, help="saturation tolerance")
+    parser.add_argument('-o', '--output', default="depth_bench.json", help="results file")
+    args = parser.parse_args()
+    depths = args.depths or ([1,2,4,8,16] if args.dut == "cvt12" else [2,4,8,16,32])
+
+    results = []
+    for latency in args.latencies:
+        for frac in args.fracs:
+            for depth in depths:
+                if args.dut == "cvt12" and depth < latency:
+                    continue            # (cvt12_cxu requires CXU_FIFO_SIZE >= CXU_LATENCY)
+                throughput = bench(args.dut, latency, depth, frac, args.ports, args.width)
+                results.append({ "latency":latency, "frac":frac, "depth":depth, "throughput":throughput })
+                print("latency {0:2d} frac {1:.2f} depth {2:3d}: throughput {3:.3f}".format(
+                    latency, frac, depth, throughput or 0.0))
+
+    recs = recommend(results, args.tolerance, args.dut)
+    print("recommended depths (within {0:.1%} of saturation):".format(args.tolerance))
+    for r in recs:
+        print("latency {0:2d} frac {1:.2f}: depth {2:3d} (saturation throughput {3:.3f}){4}".format(
+            r["latency"], r["frac"], r["depth"], r["saturation"],
+            " vs. default CXU_FIFO_SIZE {0}".format(r["default"]) if "default" in r else ""))
+    with open(args.output, "w") as f:
+        json.dump({ "dut":args.dut, "ports":args.ports if args.dut == "switch" else None, "width":args.width,
+                    "tolerance":args.tolerance, "results":results, "recommended":recs }, f, indent=1)
+
+if __name__ == "__main__":
+    main()
@@ -52,7 +52,7 @@ module dotprod_cxu
     end
     wire _unused_ok = &{1'b0,req_cxu,1'b0};
 `ifdef DOTPROD_CXU_VCD
-    initial begin $dumpfile("dotprod_cxu.vcd"); $dumpvars(0, dotprod_cxu); end
+    `CXU_WAVES(dotprod_cxu, "dotprod_cxu.vcd")
 `endif
     typedef enum logic[$bits(cfid_t)-1:0] {
         cfid_dotprod    = 0,             // acc = dotproduct-elementwise(data0,data1)
@@ -25,9 +25,13 @@ from cocotb.triggers import FallingEdge, RisingEdge, Timer
 from enum import IntEnum
 import random
 import math
+import numpy as np
 
 from cxu_li import *
 from tb import TB
+import funccov
+import producer
+import refmodels
 
 class IDotProd(IntEnum): # extends IDotProd
     dotprod = 0
@@ -37,6 +41,8 @@ class DotProdTB(TB):
     def __init__(self, dut, level):
         super().__init__(dut, level)
         self.elem_w = int(os.environ.get("ELEM_W"))
+        if self.coverage is not None:
+            self.coverage = funccov.Coverage(self.n_states, self.n_bits, self.elem_w)
 
 # testbench
 @cocotb.test()
@@ -45,7 +51,7 @@ async def dotprod_cxu_tb(dut):
     await tb.start()
     await IStateContext_tests(tb)
     await IDotProd_tests(tb)
-    await tb.idle()
+    await tb.stop()
 
 # For each state context, test IDotProd standard custom functions
 # {read,write}_{status,state}() and operation of state context status states
@@ -137,72 +143,23 @@ def csw(cs):
 
 # test IDotProd custom functions .dotprod() and .dotprodacc(), interleaved across random state contexts
 async def IDotProd_tests(tb):
-    mask = (1 << tb.n_bits) - 1
-    elem_mask = (1 << tb.elem_w) - 1
-    model = [0] * tb.n_states
-    for (zero,state,a,b) in cases(tb.n_states, tb.n_bits, tb.elem_w):
-        dotp = 0
-        for i in range(tb.n_bits//tb.elem_w):
-            dotp += ((a>>(tb.elem_w*i)) & elem_mask) * ((b>>(tb.elem_w*i)) & elem_mask)
-        model[state] = (dotp + (0 if zero else model[state])) & mask
-        await tb.test(state, IDotProd.dotprod if zero else IDotProd.dotprodacc, a, b, model[state])
-
-# generate test cases; yields (zero,a,b)
-def cases(n_states, n_bits, elem_w):
-    # dotprod-acc all the subcases, no reset
-    for (a,b) in subcases(n_bits, elem_w):
-        state = random.randrange(n_states)
-        yield (0,state,a,b)
-
-    # dotprod-acc all the subcases again, with some random acc resets
-    for state in range(n_states):
-        yield (1,state,0,0)                 # reset state
-    for (a,b) in subcases(n_bits, elem_w):
-        zero = random.randrange(10) == 0
-        state = random.randrange(n_states)
-        yield (zero,state,a,b)
-
-
-# generate subcases; yields (a,b)
-def subcases(n_bits, elem_w):
-    n_elems = n_bits // elem_w
-    mask = (1<<n_bits) - 1
-    elem_mask = (1<<elem_w) - 1
-
-    def e(x,i):
-        return ((x&elem_mask) << (i*elem_w)) & mask
-
-    for i in range(n_elems):
-        for x in range(min(1024,1<<elem_w)):
-            yield (e(x,i),0)
-            yield (mask,e(x,i))
-            yield (e(x,i),e(x,i))
-            yield (e(x,i),e(~x,i))
-
-    for i in range(n_elems):
-        for j in range(elem_w):
-            for k in range(elem_w):
-                yield (e(1<<j,i),e(1<<k,i))
-                yield (e(1<<j,i),e(~(1<<k),i))
-                yield (e(~(1<<j),i),e(1<<k,i))
-                yield (e(~(1<<j),i),e(~(1<<j),i))
-
-    # fibonacci
-    (i,j) = (1,1)
-    for _ in range(1000):
-        yield (i,j)
-        (i,j) = (j,(i+j)&mask)
-
-    # random
-    for _ in range(1000):
-        yield (random.randrange(1<<n_bits),random.randrange(1<<n_bits))
+    await tb.drive(IDotProd_txns(tb))
+
+# generate IDotProd test transactions (cxu,state,func,a,b,model), in a worker process
+# if CXU_PRODUCER=1 (see producer.py)
+def IDotProd_txns(tb):
+    (n_states, n_bits, elem_w, seed) = (tb.n_states, tb.n_bits, tb.elem_w, random.randrange(1<<32))
+    def chunks():
+        for (zero, state, a, b, model) in refmodels.dotprod_chunks(n_states, n_bits, elem_w, seed):
+            yield (0, state, np.where(zero, IDotProd.dotprod, IDotProd.dotprodacc), a, b, model)
+    return producer.txns(chunks)
 
 
 # cocotb-test, follows Alex Forencich's helpful examples to sweep over dut module parameters
 
 import os
 import pytest
-from cocotb_test.simulator import run
+from vectors import run
 
 @pytest.mark.parametrize("latency", [0,1,2])
 @pytest.mark.parametrize("states", [1,3])
@@ -0,0 +1,382 @@
+## estimate.py: analytical throughput and latency estimates of composed CXUs
+
+'''
+Copyright (C) 2019-2023, Gray Research LLC.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+# Size a composition before simulating it. From a dut's RTL parameters (its defaults, e.g.
+# mux3_macs_cxu's MAC<k>_LATENCYs, overridden by -p NAME=VALUE), build its structure (via
+# its tlm.py model: pipelines, cvt12_cxu response queues, switch_cxu_core ports), then bound
+# the sustained throughput (responses/cycle) of each stage, under a saturating request stream
+# with a traffic mix (target weights and mean run length, for muxes and switches) and a
+# resp_ready duty cycle f, and report the estimate and the stage that saturates first.
+#
+# Each credit loop of n credits, held for h cycles per request, sustains n/h requests/cycle:
+#   cvt12_cxu:        CXU_FIFO_SIZE credits, held CXU_LATENCY + 2 + W cycles (req_ready does
+#                     not forward the response handshake, so a credit returns a cycle later)
+#   switch_cxu_core:  per initiator, N_REQS-1 requests in flight, held for the target's
+#                     latency + 3 + W
+# where W = (1-f)/f is the mean wait for resp_ready. A single stage dut's estimate is its
+# least bound. Through a switch (or mux), each stage instead adds its excess cycles per
+# request: within a run to a target, the least rate of those above, with the target's shared
+# round robin among the initiators at it; plus, between runs to different targets, the drain
+# of the last target, as an initiator may only switch targets with no requests in flight.
+#
+# Minimum latency (request to response handshake) is the sum of the stages' register delays;
+# mean latency, by Little's law, is the requests in flight divided by the throughput, once
+# backpressure fills the credit loop; else the minimum plus W. Through a switch, an initiator
+# drains its requests in flight before switching targets, so they fill the loop only up to the
+# mean run of requests between target switches.
+#
+# With --validate, also runs the same traffic through the dut's RTL, with CXU_PERF=1 (see
+# perf.py), and reports the measured throughput and latency, and the estimates' errors; with
+# --tlm (or CXU_BACKEND=tlm), through its cycle-accurate tlm.py model instead, which
+# tlm_test.py checks against the RTL, cycle for cycle.
+#
+# Against the tlm.py models (mulacc_l2_cxu, bnn_l1_l2_cxu, CXU_LATENCY 0..6;
+# switch1x2..3x3_macs_cxu, LATENCY 1 and 6, mean runs 1, 4, and 16, uniform weights; f 1.0, 0.9,
+# 0.5, 0.3), single initiator duts' throughput and mean latency estimates are within 2%, except
+# where a cvt12_cxu's credit loop and resp_ready both nearly saturate: mulacc_l2_cxu's default
+# CXU_FIFO_SIZE 2 at CXU_LATENCY 1 (throughput up to +17%, mean latency down to -18%), and 4 at
+# CXU_LATENCY 3 (+4%, -5%). Switches' throughput estimates are within -25%..+2% at f >= 0.9, and
+# -14%..+43% at f 0.5 and 0.3; mean latency estimates are within -13%..+29% at f >= 0.9, and
+# -35%..+76% at f 0.5 and 0.3. The largest errors are overestimates where initiators share a
+# target under backpressure (e.g. switch3x1_macs_cxu, run 1), as one initiator's unready
+# response also stalls the others'; and throughput underestimates of short runs to fast targets
+# (e.g. switch3x2_macs_cxu, LATENCY 1, run 1). estimate_test.py checks these bounds.
+#
+# usage: python3 estimate.py <dut> [-p NAME=VALUE ...] [-f fractions] [-w weights] [-r run] [--validate [--tlm]]
+# writes the estimates (and measurements) to estimate.json
+
+import cocotb
+
+import argparse
+from collections import deque
+import json
+from math import comb
+import numpy as np
+import os
+
+from cxu_li import *
+from initiators import Initiators
+import perf
+from tb import TB
+import tlm
+
+EPS = 1e-9
+
+# a path's stage: its name, its minimum latency (request to response handshake, in cycles),
+# and its credit loop, if any: credits, and the cycles each request holds one (less W)
+class Stage:
+    def __init__(self, name, latency, credits=None, hold=None):
+        self.name = name
+        self.latency = latency
+        self.credits = credits
+        self.hold = hold
+
+    # this stage's throughput bound at mean resp_ready wait W
+    def bound(self, W):
+        return 1.0 if self.credits is None else min(1.0, self.credits / (self.hold + W))
+
+# the stage of a single initiator model
+def stage(m):
+    if not hasattr(m, "step"):
+        return Stage("combinational", 0)
+    if isinstance(m, tlm.Cvt12):
+        L = m.target.latency
+        return Stage(f"cvt12_cxu (CXU_LATENCY={L}, CXU_FIFO_SIZE={m.fifo_size})", L + 1, m.fifo_size, L + 2)
+    if isinstance(m, tlm.Cvt02):
+        return Stage("cvt02_cxu response register", 1, 1, 1)
+    name = { tlm.DotProd:"dotprod_cxu", tlm.MulAcc:"mulacc_cxu", tlm.Cvt01:"cvt01_cxu" }[type(m)]
+    return Stage(f"{name} (CXU_LATENCY={m.latency})", m.latency)
+
+# the least bound, in stage order (so at a tie, the initiator, then resp_ready, then the
+# stage nearest the initiator); returns (throughput, bottleneck)
+def least(bounds):
+    x = min(b for (_, b) in bounds)
+    return (x, next(name for (name, b) in bounds if b <= x + EPS))
+
+# estimate a single initiator dut's throughput and latencies at resp_ready fraction f
+def estimate(level, m, f=1.0, weights=None, run=4.0):
+    if isinstance(m, tlm.Switch):
+        return estimate_switch(m, f, weights, run)
+    W = (1 - f) / f if level >= Level.l2_stream else 0.0
+    s = stage(m)
+    bounds = [("initiator (1 request/cycle)", 1.0)]
+    if level >= Level.l2_stream:
+        bounds.append(("resp_ready", f))
+    if s.credits is not None:
+        bounds.append((s.name, s.bound(W)))
+    (x, bottleneck) = least(bounds)
+    # (below the initiator's rate, requests fill the credit loop, less the cycle returning a credit)
+    mean = s.latency + W if s.credits is None or x >= 1.0 - EPS else max(s.latency + W, s.credits / x - 1)
+    return { "throughput":x, "bottleneck":bottleneck, "bounds":dict(bounds),
+             "latency_min":s.latency, "latency_mean":mean }
+
+# estimate a mux's or switch's throughput and latencies: each initiator sends runs of mean
+# length run to targets drawn per weights (default uniform); its cycles per request are 1,
+# plus each stage's excess: within a run, the least rate of resp_ready, its N_REQS-1 window,
+# and the target's credit loop, shared round robin with the k-1 other initiators at that
+# target (k-1 binomially distributed); and between runs to different targets, the last one's
+# drain. A response waits for resp_ready only if its initiator's i_resp register is still
+# full, so the mean wait is W scaled by that register's utilization, found by iteration.
+def estimate_switch(m, f, weights, run):
+    n_tgts = len(m.targets)
+    w = np.array(weights if weights else [1.0] * n_tgts, dtype=float)[:n_tgts]
+    w = w / w.sum()
+    stages = [stage(t) for t in m.targets]
+    lats = [s.latency + 2 for s in stages]                  # (+ t_req and i_resp registers)
+    p_switch = (1 - (w * w).sum()) / run                    # P(next request to another target)
+    window = m.n_reqs - 1
+    resp_ready = "resp_ready"
+    in_flight = f"switch_cxu_core N_REQS={m.n_reqs} in flight per initiator"
+    drains = "switch_cxu_core target switching drains"
+
+    x_ini = f
+    for _ in range(8):
+        W = (1 - f) / f * min(1.0, x_ini / f)
+        excess = { resp_ready:0.0, in_flight:0.0, drains:0.0 }
+        latency = 0.0
+        for (t, (s, lat, wt)) in enumerate(zip(stages, lats, w)):
+            cap = s.bound(W)
+            limits = [(resp_ready, 1 / f), (in_flight, (lat + 1 + W) / window), (f"target {t}: {s.name}", 1 / cap)]
+            (name, c) = max(limits, key=lambda limit: limit[1])
+            # (backpressure fills the path's registers, or the window, but no more than the mean
+            # run between target switches, which each drain it; so by Little's law...)
+            filled = { resp_ready:(s.credits or 0) + 2, in_flight:window }.get(name) if c > 1.0 else None
+            if filled is not None and p_switch > 0:
+                filled = min(filled, 1 / p_switch)
+            latency += wt * (lat + W if filled is None else max(lat + W, filled * c - 1))
+            for k in range(1, m.n_inis + 1):
+                p = comb(m.n_inis - 1, k - 1) * wt**(k - 1) * (1 - wt)**(m.n_inis - k)
+                (name_k, c_k) = (name, c) if k == 1 or k / cap <= c else (f"target {t}: {s.name}, shared", k / cap)
+                if c_k > 1.0:
+                    excess[name_k] = excess.get(name_k, 0.0) + p * wt * (c_k - 1)
+        excess[drains] = p_switch * sum(wt * (lat + W) for (wt, lat) in zip(w, lats))
+        x_ini = 1 / (1 + sum(excess.values()))
+
+    # each stage's bound, were it the only one
+    bounds = [("initiator (1 request/cycle)", float(m.n_inis))] + \
+             [(name, m.n_inis / (1 + e)) for (name, e) in excess.items()]
+    bottleneck = max(excess, key=excess.get) if max(excess.values()) > EPS else bounds[0][0]
+    return { "throughput":m.n_inis * x_ini, "bottleneck":bottleneck, "bounds":dict(bounds),
+             "latency_min":min(lat for (lat, wt) in zip(lats, w) if wt > 0), "latency_mean":latency }
+
+
+# each initiator's requests (cxu,state,func,data0,data1): n IMulAcc.mul's, in runs of
+# geometrically distributed lengths to targets drawn per weights, using state context ini
+def traffic(n_inis, n_tgts, n, weights=None, run=4.0, seed=0):
+    rng = np.random.default_rng(seed)
+    w = np.array(weights if weights else [1.0] * n_tgts, dtype=float)[:n_tgts]
+    streams = []
+    for ini in range(n_inis):
+        runs = rng.geometric(1 / run, size=n)
+        cxus = np.repeat(rng.choice(n_tgts, size=n, p=w / w.sum()), runs)[:n]
+        streams.append([(int(cxu), ini, 0, 3, 5) for cxu in cxus])
+    return streams
+
+def multi(m):
+    return isinstance(m, tlm.Switch) and not isinstance(m, tlm.Mux)
+
+# step(reqs, resp_readys) => ([request handshaken?], [response or None]), per initiator, of
+# the model
+def stepper(level, m):
+    if multi(m):
+        return m.step
+    if level == Level.l0_comb:
+        def step(reqs, _):
+            return ([reqs[0] is not None], [None if reqs[0] is None else m(reqs[0])])
+    elif level == Level.l1_pipe:
+        def step(reqs, _):
+            return ([reqs[0] is not None], [m.step(reqs[0])])
+    else:
+        def step(reqs, readys):
+            (req_hs, resp) = m.step(reqs[0], readys[0])
+            return ([req_hs], [resp])
+    return step
+
+# a (fresh) model's response data to initiator 0's request req
+def respond(level, m, req):
+    (step, n) = (stepper(level, m), m.n_inis if multi(m) else 1)
+    for _ in range(tlm.TIMEOUT):
+        (req_hss, resps) = step([req] + [None] * (n - 1), [True] * n)
+        if resps[0] is not None:
+            return resps[0][1]
+        if req_hss[0]:
+            req = None
+    raise RuntimeError("estimate: no response")
+
+# simulate the traffic through the model, its initiators saturating, at resp_ready percentage
+# pct; returns the measured throughput (responses/cycle), and minimum and mean latencies
+def measure(level, m, streams, pct=100, seed=1):
+    rng = tlm.xorshift(seed)
+    step = stepper(level, m)
+    n = len(streams)
+    nexts = [0] * n
+    issued = [deque() for _ in range(n)]
+    latencies = []
+    (cycle, n_resps, total) = (0, 0, sum(len(stream) for stream in streams))
+    while n_resps < total:
+        reqs = [stream[k] if k < len(stream) else None for (stream, k) in zip(streams, nexts)]
+        (req_hss, resps) = step(reqs, [next(rng) % 100 < pct for _ in range(n)])
+        for i in range(n):
+            if req_hss[i]:
+                issued[i].append(cycle)
+                nexts[i] += 1
+            if resps[i] is not None:
+                latencies.append(cycle - issued[i].popleft())
+                n_resps += 1
+        cycle += 1
+        if cycle > 1000 * (total + 100):
+            raise RuntimeError("estimate: simulation made no progress")
+    return { "throughput":total / cycle, "latency_min":min(latencies),
+             "latency_mean":sum(latencies) / len(latencies) }
+
+# testbench: the dut, its initiators saturating with CXU_ESTIMATE's traffic at its resp_ready
+# fraction; TB (CXU_PERF=1) and Initiators append their measurements to perf.json
+@cocotb.test()
+async def estimate_tb(dut):
+    config = json.loads(os.environ["CXU_ESTIMATE"])
+    level = Level(config["level"])
+    streams = traffic(config["inis"], config["tgts"], config["txns"], config["weights"], config["run"])
+    txnss = [[req + (config["data"],) for req in stream] for stream in streams]
+    if config["multi"]:
+        tb = Initiators(dut, level, config["inis"])
+        tb.set_resp_ready_frac(config["frac"])
+    else:
+        tb = TB(dut, level)
+        tb.resp_ready_frac = config["frac"]
+        txnss = txnss[0]
+    await tb.start()
+    await tb.drive(txnss)
+    await tb.stop()
+
+# the RTL sources of a dut (other than common.svh, cxu.svh, shared.sv)
+SOURCES = {
+    "mulacc_cxu":       ["mulacc_cxu.sv"],
+    "dotprod_cxu":      ["dotprod_cxu.sv"],
+    "bnn_l1_cxu":       ["bnn_l1_cxu.sv", "cvt01_cxu.sv", "bnn_cxu.sv", "popcount_cxu.sv"],
+    "bnn_l2_cxu":       ["bnn_l2_cxu.sv", "cvt02_cxu.sv", "bnn_cxu.sv", "popcount_cxu.sv"],
+    "bnn_l1_l2_cxu":    ["bnn_l1_l2_cxu.sv", "cvt01_cxu.sv", "cvt12_cxu.sv", "bnn_cxu.sv", "popcount_cxu.sv"],
+    "mulacc_l2_cxu":    ["mulacc_l2_cxu.sv", "cvt12_cxu.sv", "mulacc_cxu.sv"],
+}
+MACS = ["switch_cxu_core.sv", "mulacc_l2_cxu.sv", "cvt12_cxu.sv", "mulacc_cxu.sv"]
+
+# the no. of state contexts of a model's (first) stateful core
+def n_states(m):
+    if isinstance(m, tlm.Switch):
+        return n_states(m.targets[0])
+    if isinstance(m, (tlm.Cvt12, tlm.Cvt01)):
+        return n_states(m.target)
+    return getattr(m, "n_states", 0)
+
+# run the traffic through the dut's RTL, its initiators saturating, at resp_ready fraction f;
+# returns the measured throughput (responses/cycle), and minimum and mean latencies
+def measure_rtl(dut, parameters, level, m, f, weights, run, n):
+    from simcache import run as sim_run
+    import switch_cxu_gen
+
+    (n_inis, n_tgts) = (m.n_inis, len(m.targets)) if isinstance(m, tlm.Switch) else (1, 1)
+    sim_build = os.path.join(".", "sim_build", "estimate", "{0}{1}-frac{2}-run{3}".format(
+        dut, "".join(f"-{k}{v}" for (k, v) in sorted(parameters.items())), f, run))
+    os.makedirs(sim_build, exist_ok=True)
+    report = os.path.join(sim_build, perf.FILE)
+    if os.path.exists(report):
+        os.remove(report)
+
+    parameters = dict(parameters)
+    if dut in SOURCES:
+        sources = SOURCES[dut]
+    elif multi(m):
+        switch_cxu_gen.generate([n_inis, n_tgts], macs=True, dir=sim_build)
+        sources = [os.path.join(sim_build, f"{dut}.sv"), os.path.join(sim_build, f"switch{n_inis}x{n_tgts}_cxu.sv")] + MACS
+        parameters.update(CXU_N_CXUS=n_tgts, CXU_N_STATES=n_inis, CXU_STATE_ID_W=(n_inis-1).bit_length())
+    else:
+        sources = [f"{dut}.sv", f"mux{n_tgts}_cxu.sv"] + MACS
+        parameters.update(CXU_N_CXUS=n_tgts)
+    states = n_states(m)
+    streams = traffic(n_inis, n_tgts, 1)
+    config = { "level":int(level), "multi":multi(m), "inis":n_inis, "tgts":n_tgts, "txns":n,
+               "weights":weights, "run":run, "frac":f, "data":respond(level, m, streams[0][0]) }
+    env = { 'CXU_ESTIMATE':json.dumps(config), 'CXU_PERF':"1", 'CXU_VECTORS':"0", 'CXU_BACKEND':"cocotb",
+            'CXU_N_CXUS':str(n_tgts), 'CXU_N_STATES':str(states), 'CXU_DATA_W':str(parameters.get("CXU_DATA_W", 32)),
+            'CXU_LATENCY':str(parameters.get("CXU_LATENCY", 0)) }
+
+    sim_run(
+        includes=["."],
+        verilog_sources=["common.svh", "cxu.svh"] + sources + ["shared.sv"],
+        toplevel=dut,
+        module="estimate",
+        testcase="estimate_tb",
+        parameters=parameters,
+        extra_env=env,
+        sim_build=sim_build
+    )
+    with open(report) as f:
+        reports = json.load(f)
+    # (with several initiators, each TB's report, then Initiators' aggregate)
+    inis = reports[-1-n_inis:-1] if multi(m) else reports[-1:]
+    responses = sum(r["responses"] for r in inis)
+    return { "throughput":reports[-1]["throughput"], "latency_min":min(r["latency"]["min"] for r in inis),
+             "latency_mean":sum(r["latency"]["mean"] * r["responses"] for r in inis) / responses }
+
+# an estimate's relative error
+def error(estimate, measured, key):
+    return estimate[key] / measured[key] - 1 if measured[key] else estimate[key] - measured[key]
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate a composed CXU's throughput and latency")
+    parser.add_argument('dut', help="e.g. mulacc_l2_cxu, bnn_l1_l2_cxu, mux3_macs_cxu, switch2x2_macs_cxu")
+    parser.add_argument('-p', '--parameters', nargs='+', default=[], metavar="NAME=VALUE", help="RTL parameters")
+    parser.add_argument('-f', '--fracs', type=float, nargs='+', default=[1.0, 0.9, 0.5], help="resp_ready fractions")
+    parser.add_argument('-w', '--weights', type=float, nargs='+', help="target weights (default uniform)")
+    parser.add_argument('-r', '--run', type=float, default=4.0, help="mean run length to one target")
+    parser.add_argument('--validate', action='store_true', help="also simulate the RTL (CXU_PERF=1)")
+    parser.add_argument('--tlm', action='store_true', help="validate against the tlm.py model rather than the RTL")
+    parser.add_argument('-n', '--txns', type=int, default=4000, help="no. of requests per initiator, to validate")
+    parser.add_argument('-o', '--output', default="estimate.json", help="results file")
+    args = parser.parse_args()
+
+    parameters = { name:int(value) for (name, value) in (p.split("=", 1) for p in args.parameters) }
+    use_tlm = args.tlm or tlm.enabled()
+    print("{0:>6s} {1:>10s} {2:>8s} {3:>8s}  {4}".format("frac", "throughput", "lat_min", "lat_mean", "bottleneck"))
+    results = []
+    for f in args.fracs:
+        (level, m) = tlm.model(args.dut, parameters)
+        e = estimate(level, m, f, args.weights, args.run)
+        r = { "dut":args.dut, "parameters":parameters, "frac":f, "weights":args.weights, "run":args.run,
+              "estimate":e }
+        print("{0:6.2f} {1:10.3f} {2:8.1f} {3:8.1f}  {4}".format(
+            f, e["throughput"], e["latency_min"], e["latency_mean"], e["bottleneck"]))
+        if args.validate and not use_tlm and level not in (Level.l1_pipe, Level.l2_stream):
+            print("{0:>6s} (RTL validation supports CXU-L1 and -L2 duts; try --tlm)".format(""))
+        elif args.validate:
+            if use_tlm:
+                n_inis = m.n_inis if isinstance(m, tlm.Switch) else 1
+                n_tgts = len(m.targets) if isinstance(m, tlm.Switch) else 1
+                streams = traffic(n_inis, n_tgts, args.txns, args.weights, args.run)
+                s = measure(level, m, streams, round(f * 100))
+            else:
+                s = measure_rtl(args.dut, parameters, level, m, f, args.weights, args.run, args.txns)
+            r["measured"] = dict(s, backend="tlm" if use_tlm else "rtl")
+            print("{0:>6s} {1:10.3f} {2:8.1f} {3:8.1f}  ({4}; throughput error {5:+.1%}, mean latency error {6:+.1%})".format(
+                "", s["throughput"], s["latency_min"], s["latency_mean"], "tlm model" if use_tlm else "RTL",
+                error(e, s, "throughput"), error(e, s, "latency_mean")))
+        results.append(r)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=1)
+
+if __name__ == "__main__":
+    main()
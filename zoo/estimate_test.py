@@ -0,0 +1,65 @@
+## estimate_test.py: check estimate.py's estimates against the tlm.py models, within its stated bounds
+
+'''
+Copyright (C) 2019-2023, Gray Research LLC.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+# Estimate each configuration of the sweep in estimate.py's header, and measure it, as
+# estimate.py --validate --tlm does, on its tlm.py model (which tlm_test.py checks against the
+# RTL): its throughput and mean latency estimates' errors must be within the header's bounds.
+
+import itertools
+import pytest
+
+import estimate
+import tlm
+
+FRACS = [1.0, 0.9, 0.5, 0.3]
+
+# (dut, parameters, mean run)
+CONFIGS = [(dut, { "CXU_LATENCY":latency }, 4.0)
+           for dut in ["mulacc_l2_cxu", "bnn_l1_l2_cxu"] for latency in range(7)] + \
+          [(f"switch{m}x{n}_macs_cxu", { "LATENCY":latency }, run)
+           for (m, n) in itertools.product([1, 2, 3], [1, 2, 3]) if (m, n) != (1, 1)
+           for latency in [1, 6] for run in [1.0, 4.0, 16.0]]
+
+# estimate.py's bounds on a configuration's (throughput, mean latency) errors: (min, max) each
+def bounds(dut, parameters, f):
+    if dut.startswith("switch"):
+        return ((-0.25, 0.02), (-0.13, 0.29)) if f >= 0.9 else ((-0.14, 0.43), (-0.35, 0.76))
+    if dut == "mulacc_l2_cxu" and parameters["CXU_LATENCY"] in (1, 3):
+        return ((-0.02, 0.17), (-0.18, 0.02)) if parameters["CXU_LATENCY"] == 1 else ((-0.02, 0.04), (-0.05, 0.02))
+    return ((-0.02, 0.02), (-0.02, 0.02))
+
+# estimate the dut, then measure its model under the same traffic; check the estimates' errors
+def run(dut, parameters, f, run, n=4000):
+    (level, m) = tlm.model(dut, parameters)
+    e = estimate.estimate(level, m, f, None, run)
+    n_inis = m.n_inis if isinstance(m, tlm.Switch) else 1
+    n_tgts = len(m.targets) if isinstance(m, tlm.Switch) else 1
+    (level, m) = tlm.model(dut, parameters)
+    s = estimate.measure(level, m, estimate.traffic(n_inis, n_tgts, n, None, run), round(f * 100))
+    for (key, (lo, hi)) in zip(["throughput", "latency_mean"], bounds(dut, parameters, f)):
+        err = estimate.error(e, s, key)
+        assert lo <= err <= hi, "{0} {1} f={2} run={3}: {4} error {5:+.1%} not within {6:+.0%}..{7:+.0%}".format(
+            dut, parameters, f, run, key, err, lo, hi)
+
+@pytest.mark.parametrize("f", FRACS)
+@pytest.mark.parametrize("config", CONFIGS,
+    ids=["{0}-{1}-{2:g}".format(dut, "-".join(str(v) for v in p.values()), r) for (dut, p, r) in CONFIGS])
+
+def test_estimate(request, config, f):
+    (dut, parameters, mean_run) = config
+    run(dut=dut, parameters=parameters, f=f, run=mean_run)
@@ -0,0 +1,170 @@
+## funccov.py: functional coverage of CXU test streams, with coverage-driven early termination
+
+'''
+Copyright (C) 2019-2023, Gray Research LLC.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+# With CXU_COVERAGE=<target>, e.g. 1 or 0.95, TB samples each checked request and response
+# (or, in vector mode, each recorded test case) into these coverpoints:
+#
+#   istatecontext   IStateContext function x context status transition (from, to) x state
+#   operands        data0/data1 bit pattern class, per lane (elem_w bits, else CXU_DATA_W)
+#   hazards         consecutive requests to the same state, as (state, prior func, func),
+#                   for the custom functions 0 and 1 (e.g. mul/mulacc), i.e. back-to-back when
+#                   streaming, so each reads the accumulator the other writes
+#
+# and TB.drive() stops each stream of test cases once the stream has covered that fraction of
+# the stimulus coverpoints' (operands, hazards) bins; the rest of the generated test cases are
+# skipped. (istatecontext is covered by directed tests, so is reported but does not stop them.)
+# At stop(), TB logs the coverage, and appends a JSON report, with the uncovered bins, to
+# coverage.json in the test's run directory.
+
+from collections import Counter
+import os
+from typing import Any, Dict
+
+from cxu_li import *
+
+FILE = "coverage.json"
+STIMULUS = ("operands", "hazards")
+
+def target():
+    return float(os.environ.get("CXU_COVERAGE", 0))
+
+def enabled():
+    return target() > 0
+
+ISTATECONTEXT = { int(f) for f in IStateContext }
+
+# operand bit pattern classes of a lane_w-bit lane, in order of precedence
+PATTERNS = ("zero", "ones", "onehot_lsb", "onehot_msb", "onehot", "onecold_lsb", "onecold_msb", "onecold",
+            "msb", "other")
+
+def pattern(x, lane_w):
+    mask = (1 << lane_w) - 1
+    msb = 1 << (lane_w - 1)
+    y = ~x & mask
+    if x == 0:
+        return "zero"
+    if x == mask:
+        return "ones"
+    if x & (x - 1) == 0:
+        return "onehot_lsb" if x == 1 else "onehot_msb" if x == msb else "onehot"
+    if y & (y - 1) == 0:
+        return "onecold_lsb" if y == 1 else "onecold_msb" if y == msb else "onecold"
+    return "msb" if x & msb else "other"
+
+class Coverage:
+    def __init__(self, n_states:int, n_bits:int, lane_w:int = None, operands=("data0", "data1")):
+        self.n_states = n_states
+        self.n_bits = n_bits
+        self.lane_w = lane_w or n_bits
+        self.operands = operands        # the operands the CXU's functions use
+        n_lanes = n_bits // self.lane_w
+
+        # goal bins of each coverpoint
+        self.goals: Dict[str, set] = {
+            "operands": { (operand, lane, p) for operand in operands
+                                             for lane in range(n_lanes) for p in PATTERNS } }
+        if n_states > 0:
+            self.goals["hazards"] = { (s, prior, func) for s in range(n_states)
+                                                       for prior in (0, 1) for func in (0, 1) }
+            self.goals["istatecontext"] = \
+                { (IStateContext.read_status.name, cs.name, cs.name, s) for cs in CS for s in range(n_states) } | \
+                { (IStateContext.read_state.name, cs.name, cs.name, s) for cs in CS if cs != CS.off
+                                                                       for s in range(n_states) } | \
+                { (IStateContext.write_state.name, cs.name, CS.dirty.name, s) for cs in CS if cs != CS.off
+                                                                             for s in range(n_states) } | \
+                { (IStateContext.write_status.name, a.name, b.name, s) for a in CS for b in CS
+                                                                       for s in range(n_states) }
+        self.hits = { point:Counter() for point in self.goals }
+        self.stream = None              # stimulus goal bins covered by the current stream
+        self.skipped = 0                # no. of test cases skipped, once streams were covered
+        self.reset()
+
+    # after a reset, each state context is init, and there is no prior request
+    def reset(self):
+        self.cs = [CS.init] * self.n_states
+        self.prior = None
+
+    def hit(self, point, bin):
+        if point not in self.hits:
+            return
+        self.hits[point][bin] += 1
+        if self.stream is not None and point in STIMULUS and bin in self.goals[point]:
+            self.stream.add((point, bin))
+
+    # sample one request and its response
+    def sample(self, state, func, data0, data1, status, data):
+        lane_mask = (1 << self.lane_w) - 1
+        for (operand, x) in (("data0", data0), ("data1", data1)):
+            if operand not in self.operands:
+                continue
+            for lane in range(self.n_bits // self.lane_w):
+                self.hit("operands", (operand, lane, pattern((x >> (lane * self.lane_w)) & lane_mask, self.lane_w)))
+        if self.n_states == 0 or state >= self.n_states:
+            return
+
+        if func in (0, 1):
+            if self.prior is not None and self.prior[0] == state and self.prior[1] in (0, 1):
+                self.hit("hazards", (state, self.prior[1], func))
+        self.prior = (state, func)
+
+        # context status transition
+        cs = self.cs[state]
+        if func == IStateContext.read_status:
+            cs = next_cs = CS(data & 3) if status == Status.CXU_OK else cs
+        elif func == IStateContext.write_status:
+            next_cs = CS(data0 & 3)
+        elif func == IStateContext.read_state or status != Status.CXU_OK:
+            next_cs = cs
+        else:
+            next_cs = CS.dirty          # write_state, or a custom function
+        if func in ISTATECONTEXT:
+            self.hit("istatecontext", (IStateContext(func).name, cs.name, next_cs.name, state))
+        self.cs[state] = next_cs
+
+    # fraction of the goal bins of these coverpoints covered
+    def ratio(self, points) -> float:
+        goals = sum(len(self.goals[p]) for p in points if p in self.goals)
+        covered = sum(len(self.goals[p] & set(self.hits[p])) for p in points if p in self.goals)
+        return covered / goals if goals else 1.0
+
+    # yield test cases from txns until this stream has covered target of the stimulus bins
+    def until(self, txns, target):
+        goals = sum(len(self.goals[p]) for p in STIMULUS if p in self.goals)
+        self.stream = set()
+        try:
+            it = iter(txns)
+            for txn in it:
+                if len(self.stream) >= target * goals:
+                    self.skipped += 1 + sum(1 for _ in it)
+                    return
+                yield txn
+        finally:
+            self.stream = None
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "skipped": self.skipped,
+            "points": { p: { "bins":len(self.goals[p]),
+                             "covered":len(self.goals[p] & set(self.hits[p])),
+                             "ratio":self.ratio([p]),
+                             "uncovered":sorted(str(b) for b in self.goals[p] - set(self.hits[p])) }
+                        for p in self.goals } }
+
+    def summary(self) -> str:
+        return "coverage: " + ", ".join("{0} {1:.1%}".format(p, self.ratio([p])) for p in self.goals) + \
+               ", {0} test cases skipped".format(self.skipped)
@@ -0,0 +1,149 @@
+## hol_bench.py: benchmark the CXU-L2 switch vs. the head-of-line-blocking-free CXU-L3 switch
+
+'''
+Copyright (C) 2019-2023, Gray Research LLC.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+# switch_cxu_core admits an initiator's request only if the initiator has no request in flight
+# upon any other target, so an initiator interleaving requests to a slow target and a fast one
+# runs at the slow one's pace. switch_l3_cxu_core tags requests with request ids instead, and
+# returns responses out of order (REORDER=0) or reorders them (REORDER=1). For each set of
+# target latencies, mean run length of requests to the same target, and resp_ready fraction,
+# run the same IMulAcc request streams, from every initiator concurrently, through each switch,
+# as a generated switchMxN_macs_cxu and switchMxN_l3_macs_cxu whose mulacc_l2_cxu targets have
+# those latencies, and compare their sustained throughputs (responses per cycle).
+#
+# usage: python3 hol_bench.py [-p 2 2] [-t 1,9 0,2,16 ...] [-r 1 4] [-f 1.0 0.5] [-d 16] [--tlm]
+# --tlm (or CXU_BACKEND=tlm) runs the switches' tlm.py models rather than their RTL;
+# writes the measurements to hol_bench.json
+
+import cocotb
+
+import argparse
+import json
+import os
+import random
+from types import SimpleNamespace
+
+from cxu_li import *
+from initiators import Initiators
+import perf
+from switch_macs_cxu_test import contention_txns
+import tlm
+
+N_TXNS = 2000                           # no. of requests per initiator per run
+SWITCHES = ["l2", "l3", "l3_reorder"]
+
+# testbench: switch_cxu_core or switch_l3_cxu_core, all initiators contending
+@cocotb.test()
+async def hol_bench(dut):
+    inis = Initiators(dut, Level(int(os.environ.get("CXU_LEVEL"))), int(os.environ.get("CXU_N_INIS")))
+    inis.set_resp_ready_frac(float(os.environ.get("CXU_BENCH_FRAC", 1.0)))
+    await inis.start()
+    await inis.drive(txnss(inis.tbs[0].n_cxus, len(inis.tbs), float(os.environ.get("CXU_BENCH_RUN", 1))))
+    await inis.stop()
+
+# each initiator's IMulAcc requests, in runs to random targets
+def txnss(n_tgts, n_inis, mean_run, n=N_TXNS):
+    random.seed(0)
+    tb = SimpleNamespace(n_cxus=n_tgts, n_bits=32)
+    return [contention_txns(tb, p, random.randrange(1<<32), n, mean_run) for p in range(n_inis)]
+
+# run one configuration's benchmark through its RTL; returns its throughput
+def bench(switch, latencies, mean_run, frac, depth=16, ports=(2,2)):
+    from simcache import run
+    import switch_cxu_gen
+
+    (m, n) = ports
+    l3 = switch != "l2"
+    sim_build = os.path.join(".", "sim_build", "hol_bench", "{0}-switch{1}x{2}-lat{3}-run{4}-frac{5}".format(
+        switch, m, n, "_".join(map(str, latencies)), mean_run, frac))
+    os.makedirs(sim_build, exist_ok=True)
+    report = os.path.join(sim_build, perf.FILE)
+    if os.path.exists(report):
+        os.remove(report)
+
+    sw = "_l3" if l3 else ""
+    toplevel = f"switch{m}x{n}{sw}_macs_cxu"
+    switch_cxu_gen.generate([m, n], dir=sim_build, l3=l3)
+    switch_cxu_gen.generate_macs(m, n, sim_build, l3, offsets=[lat - min(latencies) for lat in latencies])
+    parameters = { 'CXU_N_CXUS':n, 'CXU_N_STATES':m, 'CXU_STATE_ID_W':(m-1).bit_length(), 'CXU_DATA_W':32,
+                   'N_REQS':depth, 'LATENCY':min(latencies) }
+    env = { 'CXU_LEVEL':str(int(Level.l3_ooo if l3 else Level.l2_stream)), 'CXU_N_INIS':str(m),
+            'CXU_N_CXUS':str(n), 'CXU_N_STATES':str(m), 'CXU_DATA_W':"32", 'CXU_BENCH_FRAC':str(frac),
+            'CXU_BENCH_RUN':str(mean_run), 'CXU_VECTORS':"0", 'CXU_BACKEND':"cocotb" }
+    if l3:
+        parameters.update(CXU_REQ_ID_W=4, REORDER=int(switch == "l3_reorder"))
+        env['CXU_REQ_ID_W'] = "4"
+
+    run(
+        includes=["."],
+        verilog_sources=["common.svh", "cxu.svh", os.path.join(sim_build, f"{toplevel}.sv"),
+                         os.path.join(sim_build, f"switch{m}x{n}{sw}_cxu.sv"), f"switch{sw}_cxu_core.sv",
+                         "mulacc_l2_cxu.sv", "cvt12_cxu.sv", "mulacc_cxu.sv", "shared.sv"],
+        toplevel=toplevel,
+        module="hol_bench",
+        testcase="hol_bench",
+        parameters=parameters,
+        extra_env=env,
+        sim_build=sim_build
+    )
+    with open(report) as f:
+        reports = json.load(f)
+    return reports[-1]["throughput"]    # (the last report is Initiators' aggregate)
+
+# run one configuration's benchmark through its tlm.py model; returns its throughput
+def bench_tlm(switch, latencies, mean_run, frac, depth=16, ports=(2,2)):
+    (m, n) = ports
+    targets = [tlm.mulacc_l2(m, 32, lat) for lat in latencies]
+    model = tlm.Switch(targets, m, depth) if switch == "l2" else tlm.SwitchL3(targets, m, depth, switch == "l3_reorder")
+    (n_resps, n_errors, cycles) = tlm.drive_switch(model, txnss(n, m, mean_run), round(frac * 100))
+    assert n_errors == 0, f"hol_bench: {switch} {latencies}: {n_errors} errors"
+    return sum(n_resps) / cycles
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the CXU-L2 switch vs. the CXU-L3 switch")
+    parser.add_argument('-p', '--ports', type=int, default=[2,2], nargs=2, help="no. of initiators, targets")
+    parser.add_argument('-t', '--latencies', default=["1,9", "0,2,16"], nargs='+',
+                        help="target latency sets, each one latency per target, e.g. 1,9")
+    parser.add_argument('-r', '--runs', type=float, default=[1,4], nargs='+', help="mean run lengths")
+    parser.add_argument('-f', '--fracs', type=float, default=[1.0,0.5], nargs='+', help="resp_ready fractions")
+    parser.add_argument('-d', '--depth', type=int, default=16, help="N_REQS")
+    parser.add_argument('--tlm', action='store_true', help="run the tlm.py models rather than the RTL")
+    parser.add_argument('-o', '--output', default="hol_bench.json", help="results file")
+    args = parser.parse_args()
+    run = bench_tlm if args.tlm or tlm.enabled() else bench
+
+    results = []
+    for lats in args.latencies:
+        latencies = [int(lat) for lat in lats.split(",")]
+        ports = (args.ports[0], len(latencies))
+        for mean_run in args.runs:
+            for frac in args.fracs:
+                r = { "latencies":latencies, "run":mean_run, "frac":frac }
+                for switch in SWITCHES:
+                    r[switch] = run(switch, latencies, mean_run, frac, args.depth, ports)
+                r["speedup"] = r["l3"] / r["l2"]
+                r["speedup_reorder"] = r["l3_reorder"] / r["l2"]
+                results.append(r)
+                print("latencies {0:10s} run {1:4.1f} frac {2:.2f}: l2 {3:.3f} l3 {4:.3f} ({5:.2f}x) "
+                      "l3 reorder {6:.3f} ({7:.2f}x)".format(lats, mean_run, frac, r["l2"], r["l3"], r["speedup"],
+                                                             r["l3_reorder"], r["speedup_reorder"]))
+    with open(args.output, "w") as f:
+        json.dump({ "initiators":args.ports[0], "depth":args.depth, "backend":"tlm" if run is bench_tlm else "rtl",
+                    "results":results }, f, indent=1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+## impact.py: change-impact test selection, from the tests' source dependency graph
+
+'''
+Copyright (C) 2019-2023, Gray Research LLC.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+# Each parametrized test_* names its exact verilog_sources. Build the dependency graph of
+# every test: its sources (by calling it with run() replaced, see speed_bench.run_kwargs),
+# the files they `include, the generators of its generated sources, and its test module and
+# the zoo Python modules that imports. Diff each file against its hash at the last green
+# run, in the state file, impact_state.json, and run (via regress.py) only the tests that
+# depend on a changed file; then, if all pass, record the tree as green (but not with -t, which
+# runs only covering arrays of their parameter combinations, so leaves the rest still affected).
+#
+# So touching popcount_cxu.sv reruns the popcount, bnn and bnn adapter tests, but not dotprod
+# or mux_macs; touching tb.py reruns every test. Without a state file, every test is affected.
+#
+# usage: python3 impact.py [-n] [-c changed files...] [-j jobs] [-s sims] [-t tway] [--record] [modules...]
+
+import argparse
+import ast
+import contextlib
+import glob
+import hashlib
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+import simcache
+from speed_bench import run_kwargs
+
+STATE = "impact_state.json"
+
+# generated sources => the generator that writes them
+GENERATORS = [
+    (r"(^|/)mux\d+(_l3)?_cxu\.sv$",           "mux_cxu_gen.py"),
+    (r"(^|/)switch\d+x\d+(_l3)?(_macs)?_cxu\.sv$", "switch_cxu_gen.py"),
+]
+
+# collect the modules' tests: [(nodeid, module, function, parameters, name)]
+def collect(modules, args=()):
+    tests = []
+    class Collector:
+        def pytest_collection_finish(self, session):
+            for item in session.items:
+                tests.append((item.nodeid, item.module.__name__, item.originalname,
+                              dict(item.callspec.params) if hasattr(item, "callspec") else {}, item.name))
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        code = pytest.main(["--collect-only", "-q", "-p", "no:cacheprovider"] + list(args) + list(modules),
+                           plugins=[Collector()])
+    if code != 0 or not tests:
+        sys.exit(out.getvalue())
+    return tests
+
+def relpath(path):
+    return os.path.relpath(os.path.normpath(path)).replace(os.sep, "/")
+
+# the zoo Python modules a module imports, transitively, including itself
+def imports(path, seen=None):
+    seen = [] if seen is None else seen
+    if path in seen or not os.path.isfile(path):
+        return seen
+    seen.append(path)
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            imports(relpath(os.path.join(os.path.dirname(path), name.split(".")[0] + ".py")), seen)
+    return seen
+
+# a test's dependencies: the files whose change may change its outcome
+def dependencies(module, test, parameters, name):
+    kwargs = run_kwargs(module, test, parameters, name)
+    sources = simcache.sources_closure(kwargs.get("verilog_sources", []), kwargs.get("includes", []))
+    deps = set()
+    for source in (relpath(s) for s in sources):
+        generator = next((gen for (pattern, gen) in GENERATORS if re.search(pattern, source)), None)
+        deps.add(generator or source)
+    # (a generated source not yet generated is not in the closure)
+    for source in (relpath(s) for s in kwargs.get("verilog_sources", [])):
+        deps.update(gen for (pattern, gen) in GENERATORS if re.search(pattern, source))
+    deps.update(imports(relpath(module + ".py")))
+    deps.add("conftest.py")
+    return deps
+
+# the dependency graph: nodeid => set of files
+def graph(tests):
+    return { nodeid:dependencies(module, test, parameters, name)
+             for (nodeid, module, test, parameters, name) in tests }
+
+def digest(path):
+    if not os.path.isfile(path):
+        return None
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+# the files, of those given, that differ from the state's (all of them, without a state)
+def changed(files, state):
+    return sorted(f for f in files if f not in state or digest(f) != state[f])
+
+# the tests that depend on any of the changed files
+def affected(deps, changes):
+    changes = set(changes)
+    return [nodeid for (nodeid, files) in deps.items() if files & changes]
+
+def load(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)["files"]
+
+def save(path, files):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({ "files":{ file:digest(file) for file in sorted(files) } }, f, indent=1)
+    os.replace(tmp, path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run only the zoo tests affected by changes since the last green run")
+    parser.add_argument('modules', nargs='*', help="test modules (default *_test.py)")
+    parser.add_argument('-c', '--changed', nargs='+', help="these files changed (default: diff against the state file)")
+    parser.add_argument('-n', '--dry-run', action='store_true', help="print the changed files and affected tests only")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help="no. of concurrent tests")
+    parser.add_argument('-s', '--sims', nargs='+', default=["icarus", "verilator"], help="simulators")
+    parser.add_argument('-t', '--tway', type=int, default=0, help="run t-wise covering arrays of parameters (see conftest.py)")
+    parser.add_argument('--record', action='store_true', help="record the tree as green without running")
+    parser.add_argument('--state', default=STATE, help="state file")
+    args = parser.parse_args()
+
+    deps = graph(collect(args.modules or sorted(glob.glob("*_test.py"))))
+    files = set().union(*deps.values())
+    if args.record:
+        save(args.state, files)
+        print(f"impact: recorded {len(files)} files as green in {args.state}")
+        return
+
+    state = load(args.state)
+    changes = [relpath(f) for f in args.changed] if args.changed else changed(files, state)
+    nodeids = affected(deps, changes)
+    print("impact: {0} changed files{1}; {2} of {3} tests affected".format(
+        len(changes), "" if state or args.changed else f" (no {args.state})", len(nodeids), len(deps)))
+    if args.dry_run:
+        for f in changes:
+            print(f"changed  {f}")
+        for nodeid in nodeids:
+            print(f"affected {nodeid}")
+        return
+    if not nodeids:
+        return
+
+    result = subprocess.run([sys.executable, "regress.py"] + nodeids +
+                            ["-j", str(args.jobs), "-t", str(args.tway), "-s"] + args.sims)
+    if result.returncode == 0 and args.tway:
+        # (the affected tests' other parameter combinations did not run, so are not yet green)
+        print(f"impact: all passed, of {args.tway}-way covering arrays; not recorded as green")
+    elif result.returncode == 0 and not args.changed:
+        save(args.state, files)
+        print(f"impact: all passed; recorded {len(files)} files as green in {args.state}")
+    sys.exit(result.returncode)
+
+if __name__ == "__main__":
+    main()
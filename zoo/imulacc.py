@@ -25,9 +25,15 @@ from cocotb.triggers import FallingEdge, RisingEdge, Timer
 from enum import IntEnum
 import random
 import math
+import numpy as np
 
+from contexts import Contexts
+import contexts
 from cxu_li import *
 from tb import TB
+import perf
+import producer
+import refmodels
 
 class IMulAcc(IntEnum): # extends IStateContext
     mul = 0
@@ -121,52 +127,62 @@ async def IStateContext_state_tests(tb, cxu, start, stop):
 def csw(cs):
     return (1<<2) | cs   # (IMulAcc:) always 1 word of state, no custom error
 
+# virtualize 3*n_states+1 IMulAcc contexts on the n_states state contexts (see contexts.py),
+# lazily and then eagerly, with the same workload, and compare their save/restore traffic
+async def IStateContext_virtual_tests(tb, cxu = 0, n_slices = 200):
+    n_ctxs = 3*tb.n_states + 1
+    workload = virtual_workload(n_ctxs, tb.n_states, n_slices, tb.n_bits, random.randrange(1<<32))
+    mask = (1 << tb.n_bits) - 1
+    reports = []
+    for lazy in [True, False]:
+        await tb.idle()
+        await tb.reset()
+        ctxs = Contexts(tb, n_ctxs, cxu, lazy)
+        for (ctx, kind, ops) in workload:
+            if kind == "release":
+                await ctxs.release(ctx)
+            elif kind == "save":
+                await ctxs.save(ctx)
+            elif kind == "read":
+                await ctxs.read(ctx)
+            else:
+                for (func, a, b) in ops:
+                    acc = ctxs.values[ctx] if func == IMulAcc.mulacc else 0
+                    await ctxs.update(ctx, func, a, b, (acc + a*b) & mask)
+        reports.append(ctxs.report())
+        if cocotb.SIM_NAME:             # (not when recording, see cppdriver.py)
+            tb.dut._log.info(tb.port + ctxs.summary())
+            perf.write(reports[-1], contexts.FILE)
+    await tb.idle()
+
+    # the same LRU evictions, but lazily, only dirty saves and no init restores
+    (lazy, eager) = reports
+    assert lazy["switches"] == eager["switches"]
+    assert lazy["state_words_per_switch"] is None or \
+           lazy["state_words_per_switch"] <= eager["state_words_per_switch"]
+
+# n_slices time slices of logical contexts (ctx,kind,ops), a few hot, in which the context's
+# software updates, only reads, saves, or releases its context; updates' ops are (func,a,b)
+def virtual_workload(n_ctxs, n_states, n_slices, n_bits, seed):
+    rng = random.Random(seed)
+    workload = []
+    for _ in range(n_slices):
+        ctx = min(int(rng.expovariate(1 / max(n_states, 1))), n_ctxs - 1)
+        kind = rng.choices(["update", "read", "save", "release"], weights=[60, 25, 5, 10])[0]
+        ops = [(rng.choice(list(IMulAcc)), rng.getrandbits(n_bits), rng.getrandbits(n_bits))
+               for _ in range(rng.randint(1, 4))] if kind == "update" else []
+        workload.append((ctx, kind, ops))
+    return workload
+
 # test IMulAcc custom functions .mul() and .mulacc(), interleaved across random state contexts
 async def IMulAcc_tests(tb, cxu = 0):
-    mask = (1 << tb.n_bits) - 1
-    model = [0] * tb.n_states
-    for (zero,state,a,b) in cases(tb.n_states, tb.n_bits):
-        model[state] = ((a*b) + (0 if zero else model[state])) & mask
-        await tb.test_cxu(cxu, state, IMulAcc.mul if zero else IMulAcc.mulacc, a, b, model[state])
-
-# generate test cases; yields (zero,a,b)
-def cases(n_states, n_bits):
-    # mul-acc all the subcases, no reset
-    for (a,b) in subcases(n_bits):
-        state = random.randrange(n_states)
-        yield (0,state,a,b)
-
-    # mul-acc all the subcases again, with some random acc resets
-    for state in range(n_states):
-        yield (1,state,0,0)                 # reset state
-    for (a,b) in subcases(n_bits):
-        zero = random.randrange(10) == 0
-        state = random.randrange(n_states)
-        yield (zero,state,a,b)
-
-# generate subcases; yields (a,b)
-def subcases(n_bits):
-    mask = (1<<n_bits) - 1
-
-    for i in range(256):
-        yield (i,0)
-        yield (mask,i)
-        yield (i,i)
-        yield (i,~i & mask)
-
-    for i in range(n_bits):
-        for j in range(0,n_bits,3):
-            yield (1<<i,1<<j)
-            yield (1<<i,~(1<<j)&mask)
-            yield (~(1<<i)&mask, 1<<j)
-            yield (~(1<<i)&mask, ~(1<<j)&mask)
-
-    # fibonacci
-    (i,j) = (1,1)
-    for _ in range(1000):
-        yield (i,j)
-        (i,j) = (j,(i+j)&mask)
-
-    # random
-    for _ in range(1000):
-        yield (random.randrange(1<<n_bits),random.randrange(1<<n_bits))
+    await tb.drive(IMulAcc_txns(tb, cxu))
+
+# generate IMulAcc test transactions (cxu,state,func,a,b,model), in a worker process
+# if CXU_PRODUCER=1 (see producer.py)
+def IMulAcc_txns(tb, cxu):
+    (n_states, n_bits, seed) = (tb.n_states, tb.n_bits, random.randrange(1<<32))
+    def chunks():
+        for (zero, state, a, b, model) in refmodels.mulacc_chunks(n_states, n_bits, seed):
+            yield (cxu, state, np.where(zero, IMulAcc.mul, IMulAcc.mulacc), a, b, model)
+    return producer.txns(chunks)
@@ -0,0 +1,119 @@
+## initiators.py: concurrent multi-initiator traffic for switchMxN CXUs
+
+'''
+Copyright (C) 2019-2023, Gray Research LLC.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+# Initiators drives each initiator port i<p>_ of a multi-initiator dut (e.g. a generated
+# switchMxN_cxu composition) with its own TB: its own driver, monitors, in-order scoreboard
+# and resp_ready flow control, all running concurrently, so the initiators contend for the
+# switch's targets. At stop(), it reports each initiator's throughput, latency and req_ready
+# stalls (arbitration losses), and the fairness of the arbitration across initiators.
+
+import cocotb
+from cocotb.triggers import Combine
+
+from typing import Any, Dict, List
+
+from cxu_li import *
+import perf
+from tb import TB
+import vectors
+
+class Initiators:
+    def __init__(self, dut, level:Level, n_inis:int):
+        if vectors.enabled():
+            raise ValueError("multi-initiator tests do not support vector mode")
+        self.dut = dut
+        self.level = level
+        self.tbs = [TB(dut, level, port=f"i{p}_", clock=(p == 0)) for p in range(n_inis)]
+        for tb in self.tbs:
+            if tb.perf is None:
+                tb.perf = perf.PerfMonitor(tb.dut, level)
+
+    # start (and reset) every initiator's TB in the same cycles, so that none is monitoring
+    # while another resets the dut
+    async def start(self):
+        await Combine(*[cocotb.start_soon(tb.start()) for tb in self.tbs])
+
+    async def reset(self):
+        await Combine(*[cocotb.start_soon(tb.reset()) for tb in self.tbs])
+
+    # resp_ready fraction of every initiator
+    def set_resp_ready_frac(self, frac):
+        for tb in self.tbs:
+            tb.resp_ready_frac = frac
+
+    # drive each initiator's stream of test cases, concurrently; txnss[p] is initiator p's
+    async def drive(self, txnss):
+        await Combine(*[cocotb.start_soon(tb.drive(txns)) for (tb, txns) in zip(self.tbs, txnss)])
+
+    async def idle(self):
+        await Combine(*[cocotb.start_soon(tb.idle()) for tb in self.tbs])
+
+    async def stop(self):
+        await self.idle()
+        for tb in self.tbs:
+            await tb.stop()
+        self.dut._log.info(self.summary())
+        perf.write(self.report())
+
+    # per initiator statistics, and fairness across initiators
+    def report(self) -> Dict[str, Any]:
+        reports = [tb.perf.report() for tb in self.tbs]
+        firsts = [tb.perf.first for tb in self.tbs if tb.perf.first is not None]
+        lasts = [tb.perf.last for tb in self.tbs if tb.perf.last is not None]
+        window = max(lasts) - min(firsts) + 1 if firsts and lasts else 0
+        responses = sum(r["responses"] for r in reports)
+
+        def attempts(r):                # request cycles: handshaken, or stalled on req_ready
+            return r["requests"] + r["req_ready_stalls"]
+        inis = [{ "port":tb.port,
+                  "responses":r["responses"],
+                  "share":r["responses"] / responses if responses else None,
+                  "throughput":r["throughput"],
+                  "finished":tb.perf.last,
+                  "req_ready_stalls":r["req_ready_stalls"],
+                  "grant_rate":r["requests"] / attempts(r) if attempts(r) else None,
+                  "latency_mean":r["latency"]["mean"] }
+                for (tb, r) in zip(self.tbs, reports)]
+        return {
+            "initiators": len(self.tbs),
+            "window_cycles": window,
+            "responses": responses,
+            "throughput": responses / window if window else None,
+            "fairness": { "throughput":jain([ini["throughput"] for ini in inis]),
+                          "grant_rate":jain([ini["grant_rate"] for ini in inis]) },
+            "by_initiator": inis }
+
+    def summary(self) -> str:
+        r = self.report()
+        def fmt(x):
+            return "-" if x is None else "{0:.3f}".format(x)
+        lines = ["initiators: {0} responses in {1} cycles, throughput {2}, fairness (Jain) throughput {3} grant rate {4}".format(
+            r["responses"], r["window_cycles"], fmt(r["throughput"]),
+            fmt(r["fairness"]["throughput"]), fmt(r["fairness"]["grant_rate"]))]
+        for ini in r["by_initiator"]:
+            lines.append("  {0}: {1} responses, share {2}, throughput {3}, grant rate {4}, latency {5}, finished at {6}".format(
+                ini["port"], ini["responses"], fmt(ini["share"]), fmt(ini["throughput"]),
+                fmt(ini["grant_rate"]), fmt(ini["latency_mean"]), ini["finished"]))
+        return "\n".join(lines)
+
+# Jain's fairness index of xs: 1 when all are equal, down to 1/n when one gets everything
+def jain(xs:List[float]):
+    xs = [x for x in xs if x is not None]
+    if not xs or not any(xs):
+        return None
+    return sum(xs)**2 / (len(xs) * sum(x*x for x in xs))
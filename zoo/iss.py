@@ -0,0 +1,690 @@
+## iss.py: minimal RV32IM instruction set simulator, co-simulating CX-ISA custom instructions on a CXU
+
+'''
+Copyright (C) 2019-2023, Gray Research LLC.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+# The CXU testbenches exercise each CXU in isolation. To measure the end-to-end speedup of a
+# kernel, Hart runs RV32IM code, with the CX-ISA (see ../spec/cx-isa.adoc) mcx_selector (0xBC0)
+# and cx_status (0x801) CSRs: with mcx_selector.version=1 and cxe=0, each custom-0 (R-type),
+# custom-1 (I-type) or custom-2 (flex-type) instruction issues a CXU request, of cxu_id and
+# state_id from mcx_selector, to a CXU port, and awaits its response, accruing error statuses
+# in cx_status; else it raises an illegal instruction Trap. A port is a CXU-L0..L2 dut, driven
+# from cocotb (DutPort), or its cycle-accurate model (ModelPort, see tlm.py).
+#
+# Timing is a simple in-order pipeline's, CYCLES per instruction class; a custom instruction
+# takes the cycles from its CXU request until its response, as measured on the port.
+#
+# Each kernel (KERNELS: dotprod, an int32 dot product via IMulAcc; dotprod8, a uint8 dot product
+# via IDotProd; bnn, a binarized neural net layer via bnn_cxu's xnor-popcount) is assembled
+# (Asm) in a software-only version and a CX version, run over the same data, and checked; its
+# report compares their instructions, cycles, and the CX version's speedup. With a 1-cycle mul,
+# dotprod's IMulAcc, which saves just an add, does not pay for its CXU round trip: its report
+# is a slowdown, labeled as such.
+#
+# usage: python3 iss.py [kernel ...] [-n size] [-l latency]
+# runs the kernels with each custom instruction issued to its CXU's model; or see cosim_test.py
+
+import argparse
+import asyncio
+import random
+import struct
+
+from cxu_li import *
+import perf
+
+MASK = (1 << 32) - 1
+
+# CSRs
+CX_STATUS    = 0x801
+MCX_SELECTOR = 0xBC0
+MCYCLE       = 0xB00
+MINSTRET     = 0xB02
+CYCLE        = 0xC00
+INSTRET      = 0xC02
+
+# cx_status error bits, and those CXU response statuses set
+(IV, IC, IS, OF, IF, OP, CU) = (1 << k for k in range(7))
+STATUS_BITS = { Status.CXU_ERROR_CXU:IC, Status.CXU_ERROR_STATE:IS, Status.CXU_ERROR_OFF:OF,
+                Status.CXU_ERROR_FUNC:IF, Status.CXU_ERROR_OP:OP, Status.CXU_ERROR_CUSTOM:CU }
+
+INVALID_SELECTOR = 0x10000000
+
+# a version 1 CX selector
+def selector(cxu_id, state_id=0, cxe=0):
+    return (1 << 29) | (cxe << 28) | ((state_id & 0xFF) << 16) | (cxu_id & 0xFF)
+
+CUSTOM0 = 0x0B
+CUSTOM1 = 0x2B
+CUSTOM2 = 0x5B
+
+# cycles per instruction class (a custom instruction: at least this, else its CXU's)
+CYCLES = { "alu":1, "mul":1, "div":34, "load":2, "store":1, "branch":1, "taken":3, "jump":3, "csr":1, "cx":1 }
+
+ILLEGAL_INSN = 2
+BREAKPOINT = 3
+
+def sext(value, bits):
+    value &= (1 << bits) - 1
+    return value - (1 << bits) if value >> (bits - 1) else value
+
+class Trap(Exception):
+    def __init__(self, cause, pc, insn):
+        super().__init__(f"trap {cause} at pc {pc:08x}, insn {insn:08x}")
+        self.cause = cause
+        self.pc = pc
+
+
+# RV32IM hart, with CX-ISA CSRs, issuing custom instructions to port (if any)
+class Hart:
+    def __init__(self, port=None, mem_size=1 << 16):
+        self.port = port
+        self.x = [0] * 32
+        self.pc = 0
+        self.mem = bytearray(mem_size)
+        self.mcx_selector = 0
+        self.cx_status = 0
+        self.instret = 0
+        self.cycles = 0
+        self.cx_requests = 0
+        self.cx_cycles = 0
+        self.halted = False
+
+    # store words at addr
+    def load(self, addr, words):
+        for (k, word) in enumerate(words):
+            struct.pack_into("<I", self.mem, addr + 4*k, word & MASK)
+
+    def read(self, addr, n, signed=False):
+        value = int.from_bytes(self.mem[addr:addr+n], "little")
+        return sext(value, 8*n) & MASK if signed else value
+
+    def write(self, addr, n, value):
+        self.mem[addr:addr+n] = (value & ((1 << 8*n) - 1)).to_bytes(n, "little")
+
+    # run until ebreak or ecall
+    async def run(self, max_insns=10_000_000):
+        while not self.halted:
+            await self.step()
+            if self.instret > max_insns:
+                raise RuntimeError(f"iss: no halt in {max_insns} instructions")
+
+    async def step(self):
+        (pc, x) = (self.pc, self.x)
+        insn = self.read(pc, 4)
+        (opcode, rd, f3, rs1, rs2, f7) = (insn & 0x7F, (insn >> 7) & 31, (insn >> 12) & 7,
+                                          (insn >> 15) & 31, (insn >> 20) & 31, insn >> 25)
+        (a, b) = (x[rs1], x[rs2])
+        imm_i = sext(insn >> 20, 12)
+        (next_pc, value, cycles) = (pc + 4, None, CYCLES["alu"])
+
+        if opcode == 0x37:                                          # lui
+            value = insn & 0xFFFFF000
+        elif opcode == 0x17:                                        # auipc
+            value = pc + (insn & 0xFFFFF000)
+        elif opcode == 0x6F:                                        # jal
+            imm = ((insn >> 31) << 20) | (((insn >> 12) & 0xFF) << 12) | (((insn >> 20) & 1) << 11) | \
+                  (((insn >> 21) & 0x3FF) << 1)
+            (value, next_pc, cycles) = (pc + 4, pc + sext(imm, 21), CYCLES["jump"])
+        elif opcode == 0x67 and f3 == 0:                            # jalr
+            (value, next_pc, cycles) = (pc + 4, (a + imm_i) & ~1, CYCLES["jump"])
+        elif opcode == 0x63 and f3 not in (2, 3):                   # branches
+            imm = ((insn >> 31) << 12) | (((insn >> 7) & 1) << 11) | (((insn >> 25) & 0x3F) << 5) | \
+                  (((insn >> 8) & 0xF) << 1)
+            (sa, sb) = (sext(a, 32), sext(b, 32))
+            taken = [a == b, a != b, None, None, sa < sb, sa >= sb, a < b, a >= b][f3]
+            (next_pc, cycles) = (pc + sext(imm, 13), CYCLES["taken"]) if taken else (next_pc, CYCLES["branch"])
+        elif opcode == 0x03 and f3 in (0, 1, 2, 4, 5):              # loads
+            (value, cycles) = (self.read((a + imm_i) & MASK, 1 << (f3 & 3), f3 < 4), CYCLES["load"])
+        elif opcode == 0x23 and f3 in (0, 1, 2):                    # stores
+            self.write((a + sext((f7 << 5) | rd, 12)) & MASK, 1 << f3, b)
+            (rd, cycles) = (0, CYCLES["store"])
+        elif opcode == 0x13:                                        # op-imm
+            if f3 == 1 and f7 == 0 or f3 == 5 and f7 in (0, 0x20):
+                value = self.alu(f3, f7, a, rs2)
+            elif f3 not in (1, 5):
+                value = self.alu(f3, 0, a, imm_i & MASK)
+            else:
+                raise Trap(ILLEGAL_INSN, pc, insn)
+        elif opcode == 0x33 and f7 in (0, 0x20) and (f7 == 0 or f3 in (0, 5)):
+            value = self.alu(f3, f7, a, b)                          # op
+        elif opcode == 0x33 and f7 == 1:                            # M
+            (value, cycles) = (self.muldiv(f3, a, b), CYCLES["mul"] if f3 < 4 else CYCLES["div"])
+        elif opcode == 0x0F:                                        # fence
+            pass
+        elif opcode == 0x73 and f3 == 0 and insn >> 20 in (0, 1) and rd == 0 and rs1 == 0:
+            self.halted = True                                      # ecall, ebreak
+        elif opcode == 0x73 and f3 != 0 and f3 != 4:                # csrr[wsc][i]
+            (value, cycles) = (self.csr(insn, f3, rs1, a), CYCLES["csr"])
+        elif opcode in (CUSTOM0, CUSTOM1, CUSTOM2):
+            (value, cycles) = await self.custom(insn, opcode, f3, a, b)
+        else:
+            raise Trap(ILLEGAL_INSN, pc, insn)
+
+        if rd != 0 and value is not None:
+            x[rd] = value & MASK
+        self.pc = next_pc & MASK
+        self.instret += 1
+        self.cycles += cycles
+
+    @staticmethod
+    def alu(f3, f7, a, b):
+        if f3 == 0:
+            return a - b if f7 == 0x20 else a + b
+        if f3 == 1:
+            return a << (b & 31)
+        if f3 == 2:
+            return int(sext(a, 32) < sext(b, 32))
+        if f3 == 3:
+            return int(a < b)
+        if f3 == 4:
+            return a ^ b
+        if f3 == 5:
+            return sext(a, 32) >> (b & 31) if f7 == 0x20 else a >> (b & 31)
+        if f3 == 6:
+            return a | b
+        return a & b
+
+    @staticmethod
+    def muldiv(f3, a, b):
+        (sa, sb) = (sext(a, 32), sext(b, 32))
+        if f3 == 0:
+            return a * b
+        if f3 == 1:
+            return (sa * sb) >> 32
+        if f3 == 2:
+            return (sa * b) >> 32
+        if f3 == 3:
+            return (a * b) >> 32
+        if f3 in (4, 6):                                            # div, rem
+            if sb == 0:
+                return MASK if f3 == 4 else a
+            q = abs(sa) // abs(sb) * (-1 if (sa < 0) != (sb < 0) else 1)
+            return q if f3 == 4 else sa - q * sb
+        if b == 0:                                                  # divu, remu
+            return MASK if f3 == 5 else a
+        return a // b if f3 == 5 else a % b
+
+    # CSR access: CSRRS/CSRRC (and -I) of rs1=x0 (uimm=0) do not write
+    def csr(self, insn, f3, rs1, a):
+        csr = insn >> 20
+        old = self.read_csr(csr, insn)
+        src = rs1 if f3 & 4 else a
+        if (f3 & 3) == 1 or rs1 != 0:
+            self.write_csr(csr, [None, src, old | src, old & ~src][f3 & 3], insn)
+        return old
+
+    def read_csr(self, csr, insn):
+        if csr == CX_STATUS:
+            return self.cx_status
+        if csr == MCX_SELECTOR:
+            return self.mcx_selector
+        if csr in (MCYCLE, CYCLE):
+            return self.cycles & MASK
+        if csr in (MINSTRET, INSTRET):
+            return self.instret & MASK
+        raise Trap(ILLEGAL_INSN, self.pc, insn)
+
+    def write_csr(self, csr, value, insn):
+        if csr == CX_STATUS:
+            self.cx_status = value & 0x7F
+        elif csr == MCX_SELECTOR:
+            self.mcx_selector = value & MASK
+            if value >> 29 > 1:
+                self.cx_status |= IV
+        elif csr in (MCYCLE, MINSTRET):
+            pass
+        else:
+            raise Trap(ILLEGAL_INSN, self.pc, insn)
+
+    # custom-[012]: issue a CXU request, await its response; returns (rd value, cycles)
+    async def custom(self, insn, opcode, f3, a, b):
+        (version, cxe) = (self.mcx_selector >> 29, (self.mcx_selector >> 28) & 1)
+        if cxe or version == 0 or self.port is None:
+            raise Trap(ILLEGAL_INSN, self.pc, insn)                 # (no built-in custom instructions)
+        if version > 1:
+            self.cx_status |= IV
+            return (0, CYCLES["cx"])
+        (cxu, state) = (self.mcx_selector & 0xFF, (self.mcx_selector >> 16) & 0xFF)
+        if cxu >= self.port.n_cxus:
+            self.cx_status |= IC
+            return (0, CYCLES["cx"])
+        if opcode == CUSTOM1:
+            (func, data1) = (f3, sext(insn >> 20, 12) & MASK)
+        else:
+            (func, data1) = (((insn >> 25) << 3) | f3, b)
+        (status, data, cycles) = await self.port.request(cxu, state, func, insn, a, data1)
+        self.cx_requests += 1
+        self.cx_cycles += cycles
+        if status != Status.CXU_OK:
+            self.cx_status |= STATUS_BITS.get(status, OP)
+            if status in (Status.CXU_ERROR_CXU, Status.CXU_ERROR_STATE):
+                data = 0
+        return (None if opcode == CUSTOM2 else data, max(CYCLES["cx"], cycles))
+
+
+# a CXU-L0..L2 dut, driven from cocotb, one request at a time, resp_ready asserted
+class DutPort:
+    def __init__(self, dut, level, n_cxus=1):
+        self.dut = dut
+        self.level = level
+        self.n_cxus = n_cxus
+
+    async def start(self):
+        from cocotb.clock import Clock
+        from cocotb.triggers import RisingEdge
+        dut = self.dut
+        dut.req_valid.value = 0
+        if self.level == Level.l0_comb:
+            return
+        import cocotb
+        cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+        if self.level >= Level.l2_stream:
+            dut.resp_ready.value = 1
+        dut.clk_en.value = 1
+        dut.rst.value = 1
+        for _ in range(2):
+            await RisingEdge(dut.clk)
+        dut.rst.value = 0
+
+    # drive a request field, truncated to its width
+    @staticmethod
+    def drive(handle, value):
+        handle.value = value & ((1 << len(handle)) - 1)
+
+    # issue a request; returns (status, data, cycles from request until response)
+    async def request(self, cxu, state, func, insn, data0, data1):
+        from cocotb.triggers import RisingEdge, Timer
+        dut = self.dut
+        for (handle, value) in [(dut.req_cxu, cxu), (dut.req_func, func), (dut.req_data0, data0),
+                                (dut.req_data1, data1)]:
+            self.drive(handle, value)
+        if self.level >= Level.l1_pipe:
+            self.drive(dut.req_state, state)
+        if self.level >= Level.l2_stream:
+            self.drive(dut.req_insn, insn)
+        dut.req_valid.value = 1
+        if self.level == Level.l0_comb:
+            await Timer(1, units="ns")
+            dut.req_valid.value = 0
+            return (Status(dut.resp_status.value.integer), dut.resp_data.value.integer, 1)
+
+        # the request is handshaken on the first posedge clk at which req_ready (CXU-L2)
+        (cycles, issued) = (0, False)
+        while True:
+            await RisingEdge(dut.clk)
+            cycles += 1
+            if not issued and (self.level < Level.l2_stream or dut.req_ready.value == 1):
+                issued = True
+                dut.req_valid.value = 0
+            if issued and dut.resp_valid.value == 1:
+                return (Status(dut.resp_status.value.integer), dut.resp_data.value.integer, cycles)
+
+# a CXU-L0..L2 dut's cycle-accurate model (see tlm.py), as DutPort
+class ModelPort:
+    def __init__(self, level, model, n_cxus=1):
+        self.level = level
+        self.model = model
+        self.n_cxus = n_cxus
+
+    async def request(self, cxu, state, func, insn, data0, data1):
+        req = (cxu, state, func, data0, data1)
+        if self.level == Level.l0_comb:
+            (status, data) = self.model(req)
+            return (Status(status), data, 1)
+        (cycles, resp) = (0, None)
+        while resp is None:
+            cycles += 1
+            if self.level == Level.l1_pipe:
+                resp = self.model.step(req)
+                req = None
+            else:
+                (req_hs, resp) = self.model.step(req, True)
+                req = None if req_hs else req
+        return (Status(resp[0]), resp[1], cycles)
+
+
+# a minimal RV32IM assembler, with custom-[012] CX instructions and labels; e.g.
+#   asm.lw("t0", 0, "a1"); asm.and_("t0", "t0", "t1"); asm.bne("a3", "zero", "loop"); asm.cx_reg(1, "a0", "t0", "t1")
+ABI = ["zero", "ra", "sp", "gp", "tp", "t0", "t1", "t2", "s0", "s1"] + [f"a{k}" for k in range(8)] + \
+      [f"s{k}" for k in range(2, 12)] + [f"t{k}" for k in range(3, 7)]
+R_TYPE = { "add":(0,0), "sub":(0,0x20), "sll":(1,0), "slt":(2,0), "sltu":(3,0), "xor":(4,0), "srl":(5,0),
+           "sra":(5,0x20), "or":(6,0), "and":(7,0), "mul":(0,1), "mulh":(1,1), "mulhsu":(2,1),
+           "mulhu":(3,1), "div":(4,1), "divu":(5,1), "rem":(6,1), "remu":(7,1) }
+I_TYPE = { "addi":(0x13,0), "slti":(0x13,2), "sltiu":(0x13,3), "xori":(0x13,4), "ori":(0x13,6),
+           "andi":(0x13,7), "jalr":(0x67,0) }
+SHIFTS = { "slli":(1,0), "srli":(5,0), "srai":(5,0x20) }
+LOADS  = { "lb":0, "lh":1, "lw":2, "lbu":4, "lhu":5 }
+STORES = { "sb":0, "sh":1, "sw":2 }
+BRANCHES = { "beq":0, "bne":1, "blt":4, "bge":5, "bltu":6, "bgeu":7 }
+CSRS = { "csrrw":1, "csrrs":2, "csrrc":3 }
+
+def reg(r):
+    return ABI.index(r) if isinstance(r, str) else r
+
+class Asm:
+    def __init__(self):
+        self.insns = []
+        self.labels = {}
+        self.fixups = []            # (index, label, encoder)
+
+    def emit(self, insn):
+        self.insns.append(insn & MASK)
+
+    def label(self, name):
+        self.labels[name] = 4 * len(self.insns)
+
+    # the assembled words, with branches and jumps to labels resolved
+    def words(self):
+        words = list(self.insns)
+        for (k, name, encode) in self.fixups:
+            words[k] = encode(self.labels[name] - 4*k)
+        return words
+
+    def r(self, opcode, f3, f7, rd, rs1, rs2):
+        self.emit((f7 << 25) | (reg(rs2) << 20) | (reg(rs1) << 15) | (f3 << 12) | (reg(rd) << 7) | opcode)
+
+    def i(self, opcode, f3, rd, rs1, imm):
+        assert -2048 <= imm < 2048, f"asm: immediate {imm} out of range"
+        self.emit(((imm & 0xFFF) << 20) | (reg(rs1) << 15) | (f3 << 12) | (reg(rd) << 7) | opcode)
+
+    def __getattr__(self, name):
+        name = name.rstrip("_")                                     # and_, or_
+        if name in R_TYPE:
+            return lambda rd, rs1, rs2: self.r(0x33, *R_TYPE[name], rd, rs1, rs2)
+        if name in I_TYPE:
+            return lambda rd, rs1, imm: self.i(*I_TYPE[name], rd, rs1, imm)
+        if name in SHIFTS:
+            return lambda rd, rs1, shamt: self.r(0x13, SHIFTS[name][0], SHIFTS[name][1], rd, rs1, shamt)
+        if name in LOADS:
+            return lambda rd, imm, rs1: self.i(0x03, LOADS[name], rd, rs1, imm)
+        if name in STORES:
+            return lambda rs2, imm, rs1: self.emit((((imm >> 5) & 0x7F) << 25) | (reg(rs2) << 20) |
+                (reg(rs1) << 15) | (STORES[name] << 12) | ((imm & 31) << 7) | 0x23)
+        if name in BRANCHES:
+            return lambda rs1, rs2, label: self.branch(BRANCHES[name], rs1, rs2, label)
+        if name in CSRS:
+            return lambda rd, csr, rs1: self.i(0x73, CSRS[name], rd, rs1, sext(csr, 12))
+        raise AttributeError(name)
+
+    def branch(self, f3, rs1, rs2, label):
+        base = (reg(rs2) << 20) | (reg(rs1) << 15) | (f3 << 12) | 0x63
+        def encode(off):
+            return base | (((off >> 12) & 1) << 31) | (((off >> 5) & 0x3F) << 25) | (((off >> 1) & 0xF) << 8) | \
+                   (((off >> 11) & 1) << 7)
+        self.fixups.append((len(self.insns), label, encode))
+        self.emit(0)
+
+    def jal(self, rd, label):
+        base = (reg(rd) << 7) | 0x6F
+        def encode(off):
+            return base | (((off >> 20) & 1) << 31) | (((off >> 1) & 0x3FF) << 21) | (((off >> 11) & 1) << 20) | \
+                   (((off >> 12) & 0xFF) << 12)
+        self.fixups.append((len(self.insns), label, encode))
+        self.emit(0)
+
+    def lui(self, rd, imm20):
+        self.emit(((imm20 & 0xFFFFF) << 12) | (reg(rd) << 7) | 0x37)
+
+    # pseudo-instructions
+    def li(self, rd, value):
+        value = sext(value, 32)
+        if -2048 <= value < 2048:
+            self.addi(rd, "zero", value)
+            return
+        (hi, lo) = ((value + 0x800) >> 12, sext(value, 12))
+        self.lui(rd, hi)
+        if lo:
+            self.addi(rd, rd, lo)
+
+    def mv(self, rd, rs):
+        self.addi(rd, rs, 0)
+
+    def j(self, label):
+        self.jal("zero", label)
+
+    def csrw(self, csr, rs):
+        self.csrrw("zero", csr, rs)
+
+    def csrr(self, rd, csr):
+        self.csrrs(rd, csr, "zero")
+
+    def ebreak(self):
+        self.emit(0x00100073)
+
+    # CX custom function instructions
+    def cx_reg(self, cf_id, rd, rs1, rs2):
+        self.r(CUSTOM0, cf_id & 7, cf_id >> 3, rd, rs1, rs2)
+
+    def cx_imm(self, cf_id, rd, rs1, imm):
+        self.i(CUSTOM1, cf_id & 7, rd, rs1, imm)
+
+    def cx_flex(self, cf_id, rs1, rs2):
+        self.r(CUSTOM2, cf_id & 7, cf_id >> 3, 0, rs1, rs2)
+
+
+# kernels: (software-only Asm, CX Asm, data [(addr, words)], expected a0); each CX version
+# selects CXU 0 state context 0, clears cx_status, and leaves cx_status in a1
+DATA = 0x4000
+
+def cx_prologue(asm):
+    asm.li("t6", selector(0, 0))
+    asm.csrw(MCX_SELECTOR, "t6")
+    asm.csrw(CX_STATUS, "zero")
+
+def cx_epilogue(asm):
+    asm.csrr("a1", CX_STATUS)
+    asm.ebreak()
+
+# sum(a[i]*b[i]) mod 2**32 of int32 a, b; CX: IMulAcc (write_state(0), then mulacc)
+def dotprod(n, seed):
+    rng = random.Random(seed)
+    (a, b) = ([rng.getrandbits(32) for _ in range(n)], [rng.getrandbits(32) for _ in range(n)])
+    programs = []
+    for cx in [False, True]:
+        asm = Asm()
+        if cx:
+            cx_prologue(asm)
+            asm.cx_reg(IStateContext.write_state, "a0", "zero", "zero")
+        else:
+            asm.li("a0", 0)
+        asm.li("a2", DATA)
+        asm.li("a3", DATA + 4*n)
+        asm.li("a4", n)
+        asm.label("loop")
+        asm.lw("t0", 0, "a2")
+        asm.lw("t1", 0, "a3")
+        if cx:
+            asm.cx_reg(1, "a0", "t0", "t1")                        # IMulAcc.mulacc
+        else:
+            asm.mul("t0", "t0", "t1")
+            asm.add("a0", "a0", "t0")
+        asm.addi("a2", "a2", 4)
+        asm.addi("a3", "a3", 4)
+        asm.addi("a4", "a4", -1)
+        asm.bne("a4", "zero", "loop")
+        cx_epilogue(asm) if cx else asm.ebreak()
+        programs.append(asm)
+    return (*programs, [(DATA, a), (DATA + 4*n, b)], sum(x*y for (x, y) in zip(a, b)) & MASK)
+
+# sum(a[i]*b[i]) mod 2**32 of uint8 a, b (n a multiple of 4); CX: IDotProd, 4 lanes per word
+def dotprod8(n, seed):
+    rng = random.Random(seed)
+    n -= n % 4
+    (a, b) = (bytes(rng.getrandbits(8) for _ in range(n)), bytes(rng.getrandbits(8) for _ in range(n)))
+    programs = []
+    for cx in [False, True]:
+        asm = Asm()
+        if cx:
+            cx_prologue(asm)
+            asm.cx_reg(IStateContext.write_state, "a0", "zero", "zero")
+        else:
+            asm.li("a0", 0)
+        asm.li("a2", DATA)
+        asm.li("a3", DATA + n)
+        asm.li("a4", n // 4 if cx else n)
+        asm.label("loop")
+        if cx:
+            asm.lw("t0", 0, "a2")
+            asm.lw("t1", 0, "a3")
+            asm.cx_reg(1, "a0", "t0", "t1")                        # IDotProd.dotprodacc
+        else:
+            asm.lbu("t0", 0, "a2")
+            asm.lbu("t1", 0, "a3")
+            asm.mul("t0", "t0", "t1")
+            asm.add("a0", "a0", "t0")
+        step = 4 if cx else 1
+        asm.addi("a2", "a2", step)
+        asm.addi("a3", "a3", step)
+        asm.addi("a4", "a4", -1)
+        asm.bne("a4", "zero", "loop")
+        cx_epilogue(asm) if cx else asm.ebreak()
+        programs.append(asm)
+    words = lambda bs: list(struct.unpack(f"<{len(bs)//4}I", bs))
+    return (*programs, [(DATA, words(a)), (DATA + n, words(b))], sum(x*y for (x, y) in zip(a, b)) & MASK)
+
+# binarized layer: n neurons' (n <= 32) output bits, neuron j's set if its weights w[j], k words,
+# agree with input x in at least half their bits, i.e. popcount(xnor(x,w[j])) >= 16*k;
+# CX: bnn_cxu's popcount(xnor(data0,data1)); software: SWAR popcount
+def bnn(n, seed, k=8):
+    if not 0 < n <= 32:
+        raise ValueError(f"iss: bnn n={n}: 1..32 neurons (one output word)")
+    rng = random.Random(seed)
+    x = [rng.getrandbits(32) for _ in range(k)]
+    w = [[rng.getrandbits(32) for _ in range(k)] for _ in range(n)]
+    expected = sum(1 << j for j in range(n)
+                   if sum(bin(~(xi ^ wi) & MASK).count("1") for (xi, wi) in zip(x, w[j])) >= 16*k)
+    programs = []
+    for cx in [False, True]:
+        asm = Asm()
+        if cx:
+            cx_prologue(asm)
+        else:
+            asm.li("s2", 0x55555555)
+            asm.li("s3", 0x33333333)
+            asm.li("s4", 0x0F0F0F0F)
+            asm.li("s5", 0x01010101)
+        asm.li("a0", 0)
+        asm.li("a3", DATA + 4*k)                                    # w[j]
+        asm.li("s6", 16*k)                                          # threshold
+        asm.li("a5", 0)                                             # j
+        asm.li("s7", n)
+        asm.label("neuron")
+        asm.li("a6", 0)                                             # popcount
+        asm.li("a2", DATA)                                          # x
+        asm.li("a4", k)
+        asm.label("word")
+        asm.lw("t0", 0, "a2")
+        asm.lw("t1", 0, "a3")
+        if cx:
+            asm.cx_reg(0, "t0", "t0", "t1")
+        else:
+            asm.xor("t0", "t0", "t1")
+            asm.xori("t0", "t0", -1)
+            asm.srli("t1", "t0", 1)
+            asm.and_("t1", "t1", "s2")
+            asm.sub("t0", "t0", "t1")
+            asm.srli("t1", "t0", 2)
+            asm.and_("t1", "t1", "s3")
+            asm.and_("t0", "t0", "s3")
+            asm.add("t0", "t0", "t1")
+            asm.srli("t1", "t0", 4)
+            asm.add("t0", "t0", "t1")
+            asm.and_("t0", "t0", "s4")
+            asm.mul("t0", "t0", "s5")
+            asm.srli("t0", "t0", 24)
+        asm.add("a6", "a6", "t0")
+        asm.addi("a2", "a2", 4)
+        asm.addi("a3", "a3", 4)
+        asm.addi("a4", "a4", -1)
+        asm.bne("a4", "zero", "word")
+        asm.slt("t0", "a6", "s6")                                   # output bit: popcount >= threshold
+        asm.xori("t0", "t0", 1)
+        asm.sll("t0", "t0", "a5")
+        asm.or_("a0", "a0", "t0")
+        asm.addi("a5", "a5", 1)
+        asm.bne("a5", "s7", "neuron")
+        cx_epilogue(asm) if cx else asm.ebreak()
+        programs.append(asm)
+    return (*programs, [(DATA, x), (DATA + 4*k, [wi for wj in w for wi in wj])], expected)
+
+# kernel => (builder, default size, a CXU with the custom function it uses, for the CLI)
+KERNELS = {
+    "dotprod":  (dotprod,  256, "mulacc_l2_cxu"),
+    "dotprod8": (dotprod8, 256, "dotprod_cxu"),
+    "bnn":      (bnn,      32,  "bnn_l1_l2_cxu"),
+}
+
+# run a kernel's software-only and CX versions, the latter's custom instructions on port;
+# check each one's result; returns their report
+async def cosim(kernel, port, n=None, seed=0):
+    (build, default_n, _) = KERNELS[kernel]
+    (sw, cx, data, expected) = build(n or default_n, seed)
+    report = { "kernel":kernel, "n":n or default_n }
+    for (version, asm, p) in [("software", sw, None), ("cx", cx, port)]:
+        hart = Hart(p)
+        hart.load(0, asm.words())
+        for (addr, words) in data:
+            hart.load(addr, words)
+        await hart.run()
+        assert hart.x[reg("a0")] == expected, \
+            f"iss: {kernel} {version} result {hart.x[reg('a0')]:08x} != {expected:08x}"
+        assert version == "software" or hart.x[reg("a1")] == 0, \
+            f"iss: {kernel} cx_status {hart.x[reg('a1')]:02x}"
+        report[version] = { "instructions":hart.instret, "cycles":hart.cycles,
+                            "cpi":hart.cycles / hart.instret, "cx_requests":hart.cx_requests,
+                            "cx_cycles":hart.cx_cycles }
+    report["speedup"] = report["software"]["cycles"] / report["cx"]["cycles"]
+    return report
+
+def summary(report) -> str:
+    (sw, cx) = (report["software"], report["cx"])
+    speedup = report["speedup"]
+    return "iss: {0} (n={1}): software {2} instructions {3} cycles; cx {4} instructions {5} cycles " \
+           "({6} custom, {7} cycles); {8} {9:.2f}x".format(
+        report["kernel"], report["n"], sw["instructions"], sw["cycles"], cx["instructions"], cx["cycles"],
+        cx["cx_requests"], cx["cx_cycles"], *(("speedup", speedup) if speedup >= 1 else ("slowdown", 1 / speedup)))
+
+FILE = "cosim.json"
+
+# drop-in for simcache.run(): with CXU_BACKEND=tlm, run the kernel (extra_env CXU_KERNEL) in
+# process, its custom instructions issued to the dut's model, rather than simulating the dut
+def run(toplevel, parameters=None, extra_env=None, **kwargs):
+    import simcache, tlm
+    if not tlm.enabled():
+        return simcache.run(toplevel=toplevel, parameters=parameters, extra_env=extra_env, **kwargs)
+    env = extra_env or {}
+    port = ModelPort(*tlm.model(toplevel, parameters or {}))
+    report = asyncio.run(cosim(env["CXU_KERNEL"], port, int(env.get("CXU_KERNEL_N", 0)) or None))
+    print(summary(report))
+
+def main():
+    import tlm
+    parser = argparse.ArgumentParser(description="Run kernels on an RV32IM ISS, software-only and with CXUs")
+    parser.add_argument('kernels', nargs='*', default=list(KERNELS), help="kernels (default all)")
+    parser.add_argument('-n', '--size', type=int, help="problem size (default per kernel; bnn: <= 32)")
+    parser.add_argument('-l', '--latency', type=int, default=1, help="CXU_LATENCY")
+    args = parser.parse_args()
+    if args.size is not None and "bnn" in args.kernels and not 0 < args.size <= 32:
+        parser.error(f"bnn: -n {args.size}: 1..32 neurons")
+    for kernel in args.kernels:
+        dut = KERNELS[kernel][2]
+        port = ModelPort(*tlm.model(dut, { "CXU_LATENCY":args.latency }))
+        report = asyncio.run(cosim(kernel, port, args.size))
+        print(summary(report) + f" on {dut}")
+        perf.write(report, FILE)
+
+if __name__ == "__main__":
+    main()
@@ -19,19 +19,27 @@ limitations under the License.
 import cocotb
 from cocotb.handle import SimHandleBase
 from cocotb.queue import Queue
-from cocotb.triggers import RisingEdge, Timer
+from cocotb.triggers import Edge, RisingEdge, Timer
+from cocotb.utils import get_sim_time
 
+from collections import Counter, deque
 from enum import IntEnum
-from typing import Any, Dict
+from typing import Any, Callable, Dict, List
 
-# Monitor: collect bus signals when valid, and ready (if not None), are asserted on posedge(clk).
+# Monitor: collect bus signals when valid, and ready (if not None), are asserted on posedge(clk);
+# if trace (a traces.Writer) is not None, also record them there. If probe (a probe.Probe) is
+# not None, sample valid, ready, and the bus signals from it instead, in one read; or if it
+# latches and counts handshakes, await each handshake rather than every posedge(clk).
 class Monitor:
-    def __init__(self, clk:SimHandleBase, valid: SimHandleBase, ready: SimHandleBase, datas: Dict[str, SimHandleBase]):
+    def __init__(self, clk:SimHandleBase, valid: SimHandleBase, ready: SimHandleBase, datas: Dict[str, SimHandleBase],
+                 trace: Any = None, probe: Any = None):
         self.values = Queue[Dict[str,int]]()
+        self.trace = trace
         self._clk = clk
         self._datas = datas
         self._valid = valid
         self._ready = ready
+        self._probe = probe
         self._coro = None
 
     def start(self) -> None:
@@ -46,10 +54,128 @@ class Monitor:
         self._coro = None
 
     async def _run(self) -> None:
+        if self.evented():
+            while True:
+                self._put(await self._probe.handshake())
         while True:
             await RisingEdge(self._clk)
-            if self._valid == 1 and (self._ready is None or self._ready == 1):
-                self.values.put_nowait(self._sample())
+            self.tick()
+
+    def evented(self) -> bool:
+        return self._probe is not None and self._probe.evented()
+
+    # await the next handshake (if evented)
+    async def handshake(self) -> None:
+        await Edge(self._probe.hs_n)
+
+    # sample bus signals at this posedge(clk), if valid (and ready); also a CycleEngine hook
+    def tick(self) -> None:
+        if self._probe is not None:
+            sample = self._probe.sample()
+        elif self._valid == 1 and (self._ready is None or self._ready == 1):
+            sample = self._sample()
+        else:
+            sample = None
+        if sample is not None:
+            self._put(sample)
+
+    def _put(self, sample: Any) -> None:
+        self.values.put_nowait(sample)
+        if self.trace is not None:
+            # (TB clocks at 1 ns, so ns are cycles)
+            self.trace.write(int(get_sim_time(units="ns")),
+                { name: value if isinstance(value, int) else value.integer if value.is_resolvable else 0
+                  for name, value in sample.items() })
 
     def _sample(self) -> Dict[str, Any]:
         return { name: handle.value for name, handle in self._datas.items() }
+
+
+# Scoreboard: CXU-L3 outstanding requests' entries (e.g. expected responses), indexed by
+# request id, each allocated from up to n_ids free ids, in O(1); responses may complete in
+# any order. Also tracks reorder depth: how many requests' issue order each response
+# completes ahead of the oldest outstanding request.
+class Scoreboard:
+    def __init__(self, n_ids: int):
+        self.n_ids = n_ids
+        self.depths = Counter()         # reorder depth => no. of responses
+        self._entries: List[Any] = [None] * n_ids
+        self._free = deque(range(n_ids))
+        self._seq = 0                   # sequence no. of next request
+        self._oldest = 0                # sequence no. of oldest outstanding request
+        self._done = set()              # completed sequence nos. after _oldest
+
+    def full(self) -> bool:
+        return not self._free
+
+    def outstanding(self) -> int:
+        return self.n_ids - len(self._free)
+
+    # allocate an id for a request's entry
+    def issue(self, entry: Any) -> int:
+        id = self._free.popleft()
+        self._entries[id] = (self._seq, entry)
+        self._seq += 1
+        return id
+
+    # complete the request with this id, returning its entry
+    def complete(self, id: int) -> Any:
+        if not (0 <= id < self.n_ids and self._entries[id] is not None):
+            raise KeyError(f"response id {id} is not outstanding")
+        (seq, entry) = self._entries[id]
+        self._entries[id] = None
+        self._free.append(id)
+        self.depths[seq - self._oldest] += 1
+        self._done.add(seq)
+        while self._oldest in self._done:
+            self._done.remove(self._oldest)
+            self._oldest += 1
+        return entry
+
+    def summary(self) -> str:
+        n = sum(self.depths.values())
+        reordered = n - self.depths[0]
+        return "scoreboard: {0} responses, {1} out of order, max reorder depth {2}".format(
+            n, reordered, max(self.depths) if n else 0)
+
+
+# CycleEngine: await posedge(clk) once per cycle, in one coroutine, then run each
+# registered hook (e.g. monitor sampling, checking, flow control, driving) in the order
+# added. Each hook run replaces a separate coroutine wake-up and GPI callback.
+class CycleEngine:
+    def __init__(self, clk:SimHandleBase):
+        self.cycles = 0                 # cycles run
+        self.hook_runs = 0              # hook runs, each otherwise a separate edge callback
+        self._clk = clk
+        self._hooks: List[Callable[[], None]] = []
+        self._coro = None
+
+    def add(self, hook: Callable[[], None]) -> None:
+        self._hooks.append(hook)
+
+    def remove(self, hook: Callable[[], None]) -> None:
+        self._hooks.remove(hook)
+
+    def start(self) -> None:
+        if self._coro is not None:
+            raise RuntimeError("engine started")
+        self._coro = cocotb.start_soon(self._run())
+
+    def stop(self) -> None:
+        if self._coro is None:
+            raise RuntimeError("engine not started")
+        self._coro.kill()
+        self._coro = None
+
+    # no. of GPI callbacks saved vs. one edge callback per hook per cycle
+    def saved(self) -> int:
+        return self.hook_runs - self.cycles
+
+    async def _run(self) -> None:
+        while True:
+            await RisingEdge(self._clk)
+            self.cycles += 1
+            hooks = list(self._hooks)   # hooks may remove themselves
+            for hook in hooks:
+                hook()
+            self.hook_runs += len(hooks)
@@ -47,7 +47,7 @@ module mulacc_cxu
     end
     wire _unused_ok = &{1'b0,req_cxu,1'b0};
 `ifdef MULACC_CXU_VCD
-    initial begin $dumpfile("mulacc_cxu.vcd"); $dumpvars(0, mulacc_cxu); end
+    `CXU_WAVES(mulacc_cxu, "mulacc_cxu.vcd")
 `endif
     typedef enum logic[$bits(cfid_t)-1:0] {
         cfid_mul    = 0,                // acc = data0*data1
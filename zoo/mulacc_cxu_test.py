@@ -37,14 +37,15 @@ async def mulacc_cxu_tb(dut):
     await tb.start()
     await IStateContext_tests(tb)
     await IMulAcc_tests(tb)
-    await tb.idle()
+    await IStateContext_virtual_tests(tb)
+    await tb.stop()
 
 
 # cocotb-test, follows Alex Forencich's helpful examples to sweep over dut module parameters
 
 import os
 import pytest
-from cocotb_test.simulator import run
+from vectors import run
 
 @pytest.mark.parametrize("latency", [0,1,2])
 @pytest.mark.parametrize("states", [1,2,3])
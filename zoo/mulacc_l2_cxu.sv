@@ -16,7 +16,7 @@
 // limitations under the License.
 
 // mulacc_l2_cxu: 32/64-bit multiply-accumulate stateful CXU-L2 streaming CXU,
-// via composing a cvt12_cxu with a CXU-L1 mulacc_cxu.
+// via composing a cvt12_cxu with a CXU-L1 mulacc_cxu of latency CXU_LATENCY.
 module mulacc_l2_cxu
     import common_pkg::*, cxu_pkg::*;
 #(
@@ -28,12 +28,13 @@ module mulacc_l2_cxu
 );
     initial ignore(`CHECK_CXU_L2_PARAMS && check_param_pos("CXU_N_STATES", CXU_N_STATES));
 `ifdef MULACC_L2_CXU_VCD
-    initial begin $dumpfile("mulacc_l2_cxu.vcd"); $dumpvars(0, mulacc_l2_cxu); end
+    `CXU_WAVES(mulacc_l2_cxu, "mulacc_l2_cxu.vcd")
 `endif
 
     `CXU_L1_NETS(t_req, t_resp);
     cvt12_cxu #(`CXU_L2_PARAMS_MAP, .CXU_LATENCY(CXU_LATENCY), .CXU_FIFO_SIZE(CXU_FIFO_SIZE))
         cvt12(`CXU_CLK_L2_PORT_MAP(req,req, resp,resp),
               `CXU_L1_PORT_MAP(t_req,t_req, t_resp,t_resp));
-    mulacc_cxu #(`CXU_L1_PARAMS_MAP) mulacc(`CXU_CLK_L1_PORT_MAP(req,t_req, resp,t_resp)); 
+    mulacc_cxu #(`CXU_L1_PARAMS_MAP, .CXU_LATENCY(CXU_LATENCY))
+        mulacc(`CXU_CLK_L1_PORT_MAP(req,t_req, resp,t_resp));
 endmodule
@@ -26,7 +26,7 @@ module mux1_macs_cxu
 );
     initial ignore(`CHECK_CXU_L2_PARAMS);
 `ifdef MUX1_MACS_CXU_VCD
-    initial begin $dumpfile("mux1_macs_cxu.vcd"); $dumpvars(0, mux1_macs_cxu); end
+    `CXU_WAVES(mux1_macs_cxu, "mux1_macs_cxu.vcd")
 `endif
 
     `CXU_L2_NETS(t0_req, t0_resp);
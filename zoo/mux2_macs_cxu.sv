@@ -27,7 +27,7 @@ module mux2_macs_cxu
 );
     initial ignore(`CHECK_CXU_L2_PARAMS);
 `ifdef MUX2_MACS_CXU_VCD
-    initial begin $dumpfile("mux2_macs_cxu.vcd"); $dumpvars(0, mux2_macs_cxu); end
+    `CXU_WAVES(mux2_macs_cxu, "mux2_macs_cxu.vcd")
 `endif
 
     `CXU_L2_NETS(t0_req, t0_resp);
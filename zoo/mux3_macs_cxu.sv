@@ -28,7 +28,7 @@ module mux3_macs_cxu
 );
     initial ignore(`CHECK_CXU_L2_PARAMS);
 `ifdef MUX3_MACS_CXU_VCD
-    initial begin $dumpfile("mux3_macs_cxu.vcd"); $dumpvars(0, mux3_macs_cxu); end
+    `CXU_WAVES(mux3_macs_cxu, "mux3_macs_cxu.vcd")
 `endif
 
     `CXU_L2_NETS(t0_req, t0_resp);
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """
-generate an n-target mux_cxu
+generate an n-target mux_cxu (or, with --l3, mux_l3_cxu)
 
 Copyright (C) 2019-2023, Gray Research LLC.
 
@@ -28,6 +28,9 @@ from jinja2 import Template
 def main():
     parser = argparse.ArgumentParser(description=__doc__.strip())
     parser.add_argument('-p', '--ports',  type=int, default=[2], help="no. of ports")
+    parser.add_argument('--l3', action='store_true', help="generate muxN_l3_cxu: a CXU-L3 initiator, "
+                        "no head-of-line blocking, responses tagged with request ids")
+    parser.add_argument('--reorder', action='store_true', help="with --l3, default REORDER=1: responses in request order")
     args = parser.parse_args()
 
     try:
@@ -36,17 +39,17 @@ def main():
         print(ex)
         exit(1)
 
-def generate(ports=2):
+def generate(ports=2, l3=False, reorder=False):
     if type(ports) is int:
         n = ports
     else:
         n = ports[0]
 
-    name = f"mux{n}_cxu"
+    name = f"mux{n}_l3_cxu" if l3 else f"mux{n}_cxu"
     output = f"{name}.sv"
 
     t = Template(
-"""// {{name}}.sv: multiplex {{n}} target CXUs (CXU-L2)
+"""// {{name}}.sv: multiplex {{n}} target CXUs (CXU-{{L}})
 //
 // Copyright (C) 2019-2023, Gray Research LLC.
 // 
@@ -62,31 +65,43 @@ def generate(ports=2):
 // See the License for the specific language governing permissions and
 // limitations under the License.
 
-// {{name}}: multiplex {{n}} target CXUs (CXU-L2)
+// {{name}}: multiplex {{n}} target CXUs (CXU-{{L}})
+{%- if l3 %}
+// (a CXU-L3 initiator, CXU-L2 targets; see switch_l3_cxu_core)
+{%- endif %}
 module {{name}}
     import common_pkg::*, cxu_pkg::*;
 #(
+{%- if l3 %}
+    `CXU_L3_PARAMS(/*N_CXUS*/{{n}}, /*N_STATES*/0, /*REQ_ID_W*/4, /*FUNC_ID_W*/$bits(cfid_t), /*INSN_W*/0, /*DATA_W*/32),
+    parameter int N_REQS    = 16,   // max no. of in-flight requests per initiator and per target
+    parameter int REORDER   = {{reorder}}     // 0: responses out of order; 1: in request order
+{%- else %}
     `CXU_L2_PARAMS(/*N_CXUS*/{{n}}, /*N_STATES*/0, /*FUNC_ID_W*/$bits(cfid_t), /*INSN_W*/0, /*DATA_W*/32),
     parameter int N_REQS    = 16    // max no. of in-flight requests per initiator and per target
+{%- endif %}
 ) (
     `CXU_CLOCK_PORTS,
-    `CXU_L2_PORTS(input, output, req, resp),
+    `CXU_{{L}}_PORTS(input, output, req, resp),
 {%- for p in range(n) %}
     `CXU_L2_PORTS(output, input, t{{'%1d'%p}}_req, t{{'%1d'%p}}_resp){% if not loop.last %},{% endif %} {% endfor %}
 );
     initial ignore(
-        `CHECK_CXU_L2_PARAMS
+        `CHECK_CXU_{{L}}_PARAMS
     &&  check_param("CXU_FUNC_ID_W", CXU_FUNC_ID_W, $bits(cfid_t)));
 `ifdef MUX_CXU_VCD
-    initial begin $dumpfile("{{name}}.vcd"); $dumpvars(0, {{name}}); end
+    `CXU_WAVES({{name}}, "{{name}}.vcd")
 `endif
 
-    switch_cxu_core #(`CXU_L2_PARAMS_MAP, .N_INIS(1), .N_TGTS({{n}}), .N_REQS(N_REQS))
+    {{core}} #(`CXU_{{L}}_PARAMS_MAP, .N_INIS(1), .N_TGTS({{n}}), .N_REQS(N_REQS){% if l3 %}, .REORDER(REORDER){% endif %})
     core(
         .clk, .rst, .clk_en,
         // initiator
         .i_req_valids(req_valid),
         .i_req_readys(req_ready),
+{%- if l3 %}
+        .i_req_ids(req_id),
+{%- endif %}
         .i_req_cxus(req_cxu),
         .i_req_states(req_state),
         .i_req_funcs(req_func),
@@ -95,6 +110,9 @@ module {{name}}
         .i_req_data1s(req_data1),
         .i_resp_valids(resp_valid),
         .i_resp_readys(resp_ready),
+{%- if l3 %}
+        .i_resp_ids(resp_id),
+{%- endif %}
         .i_resp_statuss(resp_status),
         .i_resp_datas(resp_data),
         // targets
@@ -115,7 +133,8 @@ endmodule
 """)
 
     with open(output, 'w') as f:
-        f.write(t.render(n=n, name=name))
+        f.write(t.render(n=n, name=name, l3=l3, L="L3" if l3 else "L2", reorder=int(reorder),
+                         core="switch_l3_cxu_core" if l3 else "switch_cxu_core"))
         f.flush()
 
 if __name__ == "__main__":
@@ -44,12 +44,13 @@ async def mux_tb(dut):
             await IStateContext_tests(tb, cxu)
             await IMulAcc_tests(tb, cxu)
             await tb.idle()
+    await tb.stop()
 
 # cocotb-test, follows Alex Forencich's helpful examples to sweep over dut module parameters
 
 import os
 import pytest
-from cocotb_test.simulator import run
+from vectors import run
 
 @pytest.mark.parametrize("cxus", [1,2,3])
 @pytest.mark.parametrize("states", [1,2])
@@ -0,0 +1,167 @@
+## perf.py: cycle-level latency, throughput, and stall instrumentation for CXU testbenches
+
+'''
+Copyright (C) 2019-2023, Gray Research LLC.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+# With CXU_PERF=1, TB samples the request and response handshakes each cycle, and at stop()
+# reports request-to-response latency histograms, sustained throughput, and cycles stalled
+# on req_ready, stalled on resp_ready, or idle, in total and per (cxu,state), appending
+# the report to perf.json in the test's run directory.
+
+import cocotb
+from cocotb.handle import SimHandleBase
+from cocotb.triggers import RisingEdge
+
+from collections import Counter, deque
+import json
+from typing import Any, Dict, List
+
+from cxu_li import *
+
+FILE = "perf.json"
+
+# performance counters, overall or for one (cxu,state)
+class Stats:
+    def __init__(self):
+        self.requests = 0
+        self.responses = 0
+        self.req_stalls = 0             # cycles with request valid but not ready
+        self.resp_stalls = 0            # cycles with response valid but not ready
+        self.latencies = Counter()      # request-to-response latency (cycles) => count
+
+    def report(self) -> Dict[str, Any]:
+        n = sum(self.latencies.values())
+        return {
+            "requests": self.requests,
+            "responses": self.responses,
+            "req_ready_stalls": self.req_stalls,
+            "resp_ready_stalls": self.resp_stalls,
+            "latency": {
+                "min": min(self.latencies) if n else None,
+                "mean": sum(lat*count for (lat, count) in self.latencies.items()) / n if n else None,
+                "max": max(self.latencies) if n else None,
+                "histogram": { str(lat):count for (lat, count) in sorted(self.latencies.items()) } } }
+
+# PerfMonitor: on posedge(clk), sample the handshakes, match each response to its request
+# (in order, or by id at CXU-L3), and count latencies and stalls
+class PerfMonitor:
+    def __init__(self, dut:SimHandleBase, level:Level):
+        self.dut = dut
+        self.level = level
+        self.cycles = 0
+        self.idles = 0                  # cycles with no request valid and none outstanding
+        self.first = None               # cycle of first request
+        self.last = None                # cycle of last response
+        self.total = Stats()
+        self.by_key: Dict[Any, Stats] = {}
+        self._outstanding = {}          # (CXU-L3: id =>) deque of (cycle, cxu, state)
+        self._coro = None
+
+    def start(self) -> None:
+        if self._coro is not None:
+            raise RuntimeError("perf monitor started")
+        self._coro = cocotb.start_soon(self._run())
+
+    def stop(self) -> None:
+        if self._coro is not None:
+            self._coro.kill()
+            self._coro = None
+
+    async def _run(self) -> None:
+        while True:
+            await RisingEdge(self.dut.clk)
+            self.tick()
+
+    def stats(self, key) -> Stats:
+        if key not in self.by_key:
+            self.by_key[key] = Stats()
+        return self.by_key[key]
+
+    # sample this cycle's handshakes; also a CycleEngine hook
+    def tick(self) -> None:
+        dut = self.dut
+        cycle = self.cycles
+        self.cycles += 1
+        l2 = self.level >= Level.l2_stream
+        l3 = self.level == Level.l3_ooo
+
+        req_valid = dut.req_valid.value == 1
+        req_ready = not l2 or dut.req_ready.value == 1
+        resp_valid = dut.resp_valid.value == 1
+        resp_ready = not l2 or dut.resp_ready.value == 1
+
+        # (a request and its CXU-L1 zero latency response may handshake in the same cycle)
+        if req_valid:
+            key = (dut.req_cxu.value.integer, dut.req_state.value.integer)
+            stats = self.stats(key)
+            if req_ready:
+                self._outstanding.setdefault(dut.req_id.value.integer if l3 else None, deque()).append(
+                    (cycle,) + key)
+                for s in [self.total, stats]:
+                    s.requests += 1
+                if self.first is None:
+                    self.first = cycle
+            else:
+                self.total.req_stalls += 1
+                stats.req_stalls += 1
+        elif not any(self._outstanding.values()):
+            self.idles += 1
+
+        if resp_valid:
+            queue = self._outstanding.get(dut.resp_id.value.integer if l3 else None)
+            if queue:
+                (issued, cxu, state) = queue[0]
+                stats = self.stats((cxu, state))
+                if resp_ready:
+                    queue.popleft()
+                    for s in [self.total, stats]:
+                        s.responses += 1
+                        s.latencies[cycle - issued] += 1
+                    self.last = cycle
+                else:
+                    self.total.resp_stalls += 1
+                    stats.resp_stalls += 1
+
+    # report, as a dictionary suitable for JSON
+    def report(self) -> Dict[str, Any]:
+        active = self.last - self.first + 1 if self.first is not None and self.last is not None else 0
+        report = {
+            "level": int(self.level),
+            "cycles": self.cycles,
+            "active_cycles": active,
+            "idle_cycles": self.idles,
+            "throughput": self.total.responses / active if active else None }
+        report.update(self.total.report())
+        report["by_cxu_state"] = { f"{cxu},{state}":stats.report()
+                                   for ((cxu, state), stats) in sorted(self.by_key.items()) }
+        return report
+
+    def summary(self) -> str:
+        r = self.report()
+        return "perf: {0} responses in {1} active cycles, throughput {2}, latency {3}..{4}, " \
+               "stalls req_ready {5} resp_ready {6}, idle {7}".format(
+            r["responses"], r["active_cycles"], "-" if r["throughput"] is None else "{0:.3f}".format(r["throughput"]),
+            r["latency"]["min"], r["latency"]["max"], r["req_ready_stalls"], r["resp_ready_stalls"], r["idle_cycles"])
+
+_reports: Dict[str, List[Dict[str, Any]]] = {}
+
+# append report to the reports of this test run written to path, rewriting path;
+# also writes the other modules' reports, e.g. perf.write(report, funccov.FILE)
+def write(report: Dict[str, Any], path: str = FILE) -> None:
+    reports = _reports.setdefault(path, [])
+    reports.append(report)
+    with open(path, "w") as f:
+        json.dump(reports, f, indent=1)
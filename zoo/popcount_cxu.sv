@@ -33,7 +33,7 @@ module popcount_cxu
     initial ignore(`CHECK_CXU_L0_PARAMS);
     wire _unused_ok = &{1'b0,req_data1,req_func,req_cxu,req_valid,1'b0};
 `ifdef POPCOUNT_CXU_VCD
-    initial begin $dumpfile("popcount_cxu.vcd"); $dumpvars(0, popcount_cxu); end
+    `CXU_WAVES(popcount_cxu, "popcount_cxu.vcd")
 `endif
 
     if (ADDER_TREE != 0)
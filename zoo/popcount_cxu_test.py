@@ -20,45 +20,28 @@ import cocotb
 import random
 from cxu_li import *
 from tb import TB
+import funccov
+import refmodels
 
 # testbench
 @cocotb.test()
 async def popcount_cxu_tb(dut):
     tb = TB(dut, Level.l0_comb)
+    if tb.coverage is not None:
+        tb.coverage = funccov.Coverage(0, tb.n_bits, operands=("data0",))   # (unary)
     await tb.start()
     await sweep(tb)
     await tb.stop()
 
 async def sweep(tb):
-    for case in cases(tb.n_bits):
-        await tb.test(0, 0, case, 0, bin(case).count('1'))
-
-# generate test cases
-def cases(n_bits):
-    mask = (1<<n_bits) - 1
-
-    # first nonneg integers and complements
-    for i in range(256):
-        yield i
-        yield ~i & mask
-
-    # 1,2,3-bit patterns and complements
-    for i in range(n_bits):
-        for j in range(i, n_bits):
-            for k in range(j, n_bits):
-                t = (1<<i) | (1<<j) | (1<<k)
-                yield t
-                yield ~t & mask
-
-    # random
-    for _ in range(1000):
-        yield random.randrange(1<<n_bits)
+    (cases, counts) = refmodels.popcount_vectors(tb.n_bits, random.randrange(1<<32))
+    await tb.drive(refmodels.txns(0, 0, 0, cases, 0, counts))
 
 # cocotb-test, thanks @forencich
 
 import os
 import pytest
-from cocotb_test.simulator import run
+from vectors import run
 
 @pytest.mark.parametrize("width", [32, 64])
 @pytest.mark.parametrize("adder_tree", [0, 1])
@@ -0,0 +1,250 @@
+## probe.py: packed-bus probes of CXU-LI request and response payloads, for Monitor
+
+'''
+Copyright (C) 2019-2023, Gray Research LLC.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+# By default each Monitor reads its valid and ready handles, and then each payload handle of
+# cxu_li.req() or resp(), one at a time, each a GPI value fetch building a BinaryValue, into a
+# new dict per transaction. With CXU_PROBE=1, the dut (CXU-L1, -L2) is wrapped in a generated
+# probe wrapper, <dut>_probe, with the same ports, which also concatenates each bus's valid,
+# ready, and payload into one packed vector, req_probe and resp_probe; each Monitor then reads
+# its bus once per cycle, in one GPI call, and returns each transaction as a compact Txn of ints.
+#
+# With CXU_NATIVE_CLOCK=1, the wrapper also generates the clock itself, rather than TB's cocotb
+# Clock scheduling every edge from Python (under Verilator, built with --timing, see
+# vectors.timing()), and randomizes resp_ready itself, per resp_ready_pct, which TB sets
+# when its resp_ready_frac changes. It also latches each handshake's probe value,
+# to <bus>_hs, and counts handshakes, in <bus>_hs_n. Monitors then await changes of the counts,
+# and TB awaits them to present each next request and to drain, rather than await every
+# posedge(clk), so the Python side does not run on idle cycles: draining, backpressure, etc.
+
+from cocotb.binary import BinaryValue
+from cocotb.triggers import Edge
+from jinja2 import Template
+import os
+
+from cxu_li import *
+import vectors
+
+def enabled():
+    return os.environ.get("CXU_PROBE", "0") != "0" or native_clock()
+
+def native_clock():
+    return os.environ.get("CXU_NATIVE_CLOCK", "0") != "0"
+
+# a transaction: a bus's payload field values, by name, sharing its probe's field index
+class Txn:
+    __slots__ = ("fields", "values")
+
+    def __init__(self, fields, values):
+        self.fields = fields
+        self.values = values
+
+    def __getitem__(self, name):
+        return self.values[self.fields[name]]
+
+    def items(self):
+        return zip(self.fields, self.values)
+
+# TB side: one bus's packed probe, from MSB to LSB: valid, ready (if any), then datas' fields
+# in order, as concatenated by the probe wrapper; and, if the wrapper has them, its latched
+# handshake probe, hs, and handshake count, hs_n
+class Probe:
+    def __init__(self, handle, ready, datas, hs=None, hs_n=None):
+        self.handle = handle
+        self.hs = hs
+        self.hs_n = hs_n
+        self.fields = { name:k for (k, name) in enumerate(datas) }
+        shift = 0
+        self.layout = []
+        for (name, data) in reversed(list(datas.items())):
+            self.layout.insert(0, (shift, (1 << len(data)) - 1))
+            shift += len(data)
+        self.width = shift + 1 + (ready is not None)
+        self.ready = None if ready is None else 1 << shift
+        self.valid = 1 << (self.width - 1)
+
+    # the dut's <bus>_probe, if it has one matching the bus's handles, else None
+    @staticmethod
+    def of(dut, bus, valid, ready, datas):
+        try:
+            handle = getattr(dut, f"{bus}_probe")
+        except AttributeError:
+            return None
+        width = len(valid) + (0 if ready is None else len(ready)) + sum(len(data) for data in datas.values())
+        if len(handle) != width:
+            return None
+        try:
+            return Probe(handle, ready, datas, getattr(dut, f"{bus}_hs"), getattr(dut, f"{bus}_hs_n"))
+        except AttributeError:
+            return Probe(handle, ready, datas)
+
+    # are handshakes latched and counted, to await rather than sample every cycle?
+    def evented(self):
+        return self.hs_n is not None
+
+    # this cycle's transaction, if valid (and ready), else None
+    def sample(self):
+        return self.txn(self.handle.value)
+
+    # await the next handshake, returning its transaction
+    async def handshake(self):
+        await Edge(self.hs_n)
+        return self.txn(self.hs.value)
+
+    # a probe value's transaction, if valid (and ready), else None; its fields are ints, or
+    # if the value is not fully resolvable, BinaryValues, as if read from the handles
+    def txn(self, value):
+        try:
+            bits = value.integer
+        except ValueError:
+            return self.unresolved(value.binstr)
+        if not (bits & self.valid) or (self.ready is not None and not (bits & self.ready)):
+            return None
+        return Txn(self.fields, tuple((bits >> shift) & mask for (shift, mask) in self.layout))
+
+    def unresolved(self, binstr):
+        if binstr[0] != '1' or (self.ready is not None and binstr[1] != '1'):
+            return None
+        return Txn(self.fields, tuple(BinaryValue(binstr[self.width-shift-mask.bit_length():self.width-shift],
+                                                  n_bits=mask.bit_length())
+                                      for (shift, mask) in self.layout))
+
+# pytest side: run() arguments running the dut within its probe wrapper; unchanged if the dut
+# has no CXU-L1 or -L2 `CXU_L<n>_PARAMS() declaration in <dut>.sv
+def wrap(kwargs):
+    dut = kwargs["toplevel"]
+    sim_build = kwargs.get("sim_build", "sim_build")
+    try:
+        wrapper = generate(dut, f"{dut}.sv", kwargs.get("parameters", {}), sim_build, native_clock())
+    except (OSError, ValueError):
+        return kwargs
+    kwargs = dict(kwargs, toplevel=f"{dut}_probe", verilog_sources=list(kwargs["verilog_sources"]) + [wrapper])
+    return vectors.timing(kwargs) if native_clock() else kwargs
+
+# generate sim_build/<dut>_probe.sv, the dut's probe wrapper; if native, also generating
+# its clock and resp_ready, and latching and counting handshakes
+def generate(dut, source, parameters, sim_build=".", native=False):
+    (level, args, extra) = vectors.declaration(source, parameters)
+    if level not in (Level.l1_pipe, Level.l2_stream):
+        raise ValueError(f"{source}: probes support CXU-L1 and -L2")
+
+    # the dut's ports, as the wrapper's ports, except those it generates
+    ports = [("input ", "logic", "rst"), ("input ", "logic", "clk_en"),
+             ("input ", "logic", "req_valid")] + \
+            ([("output", "logic", "req_ready")] if level >= Level.l2_stream else []) + \
+            [("input ", "`V(CXU_CXU_ID_W)", "req_cxu"), ("input ", "`V(CXU_STATE_ID_W)", "req_state"),
+             ("input ", "`V(CXU_FUNC_ID_W)", "req_func")] + \
+            ([("input ", "`V(CXU_INSN_W)", "req_insn")] if level >= Level.l2_stream else []) + \
+            [("input ", "`V(CXU_DATA_W)", "req_data0"), ("input ", "`V(CXU_DATA_W)", "req_data1"),
+             ("output", "logic", "resp_valid")] + \
+            ([("input ", "logic", "resp_ready")] if level >= Level.l2_stream and not native else []) + \
+            [("output", "cxu_status_t", "resp_status"), ("output", "`V(CXU_DATA_W)", "resp_data")]
+
+    # each bus's signals, in Probe's order, and their widths (`V(W) is msb(W)+1 bits wide)
+    def v(w):
+        return f"(msb({w})+1)"
+    handshake = ["valid", "ready"] if level >= Level.l2_stream else ["valid"]
+    req  = [(f"req_{s}", "1") for s in handshake] + \
+           [("req_cxu", v("CXU_CXU_ID_W")), ("req_func", v("CXU_FUNC_ID_W")),
+            ("req_data0", v("CXU_DATA_W")), ("req_data1", v("CXU_DATA_W")), ("req_state", v("CXU_STATE_ID_W"))]
+    resp = [(f"resp_{s}", "1") for s in handshake] + \
+           [("resp_status", "CXU_STATUS_W"), ("resp_data", v("CXU_DATA_W"))]
+
+    name = f"{dut}_probe"
+    os.makedirs(sim_build, exist_ok=True)
+    output = os.path.join(sim_build, f"{name}.sv")
+    with open(output, 'w') as f:
+        f.write(TEMPLATE.render(name=name, dut=dut, level=level, args=args, extra=extra, ports=ports,
+                                native=native, parameters=list(parameters), buses=[("req", req), ("resp", resp)]))
+        f.flush()
+    return output
+
+TEMPLATE = Template(
+"""// {{name}}.sv: packed-bus probe wrapper for {{dut}} (CXU-L{{level}}), generated by probe.py
+//
+// Copyright (C) 2019-2023, Gray Research LLC.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//    http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+`include "cxu.svh"
+
+/* verilator lint_off DECLFILENAME */
+/* verilator lint_off UNUSED */
+
+// {{name}}: {{dut}}, with the same ports{% if native %} (less clk and resp_ready){% endif %},
+// plus each bus's handshake and payload signals concatenated into one packed vector, for
+// the testbench to sample in one access{% if native %}; also generates clk and resp_ready, and
+// latches and counts each bus's handshakes, for the testbench to await{% endif %}
+module {{name}}
+    import common_pkg::*, cxu_pkg::*;
+#(
+    `CXU_L{{level}}_PARAMS({{args}}){% if extra %},{% endif %}
+{%- for (p, value) in extra %}
+    parameter int {{p}} = {{value}}{% if not loop.last %},{% endif %}
+{%- endfor %}
+) (
+{%- if not native %}
+    input  logic                clk,
+{%- endif %}
+{%- for (dir, type, port) in ports %}
+    {{dir}} {{"%-20s"|format(type)}} {{port}}{% if not loop.last %},{% endif %}
+{%- endfor %}
+);
+{%- if native %}
+    logic           clk = 1'b0;
+    always #0.5 clk = ~clk;                 // 1 ns period, as TB's (Verilator: --timing)
+    wire            clk_native = 1'b1;      // (tells TB not to start its Clock)
+{%- if level >= 2 %}
+
+    // response flow control
+    logic [6:0]     resp_ready_pct = 7'd100;
+    logic           resp_ready = 1'b1;
+    always_ff @(posedge clk)
+        resp_ready <= ($urandom % 100) < resp_ready_pct;
+{%- endif %}
+{%- endif %}
+
+    {{dut}} #(
+{%- for p in parameters %}
+        .{{p}}({{p}}){% if not loop.last %},{% endif %}
+{%- endfor %}
+    ) {{dut}}(`CXU_CLK_L{{level}}_PORT_MAP(req,req, resp,resp));
+{% for (bus, signals) in buses %}
+    localparam int {{bus|upper}}_PROBE_W = {% for (s, w) in signals %}{{w}}{% if not loop.last %} + {% endif %}{% endfor %};
+    wire [{{bus|upper}}_PROBE_W-1:0] {{bus}}_probe = { {% for (s, w) in signals %}{{s}}{% if not loop.last %}, {% endif %}{% endfor %} };
+{%- if native %}
+    logic [{{bus|upper}}_PROBE_W-1:0] {{bus}}_hs = '0;
+    int             {{bus}}_hs_n = 0;
+    always_ff @(posedge clk)
+        if ({{bus}}_valid{% if level >= 2 %} && {{bus}}_ready{% endif %}) begin
+            {{bus}}_hs <= {{bus}}_probe;
+            {{bus}}_hs_n <= {{bus}}_hs_n + 1;
+        end
+{%- endif %}
+{% endfor %}
+endmodule
+""")
@@ -0,0 +1,132 @@
+## producer.py: out-of-process stimulus and reference model producer, via a shared memory ring
+
+'''
+Copyright (C) 2019-2023, Gray Research LLC.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+# By default a test's cases and their expected responses are computed on the simulator's
+# own Python thread, inline with driving and checking. With CXU_PRODUCER=1, txns(chunks)
+# instead forks a worker process that runs chunks(), a generator of column chunks of test
+# cases, e.g. refmodels.mulacc_chunks(), writing each chunk's rows into a ring buffer of
+# uint64 (cxu,state,func,data0,data1,model) rows in shared memory. TB.drive() and its
+# scoreboard consume the rows in place as they arrive, so the model computation overlaps
+# with simulation rather than serializing with it. Nothing is pickled: the worker is
+# forked, inheriting chunks() and the ring, and rows cross the process boundary as raw words.
+#
+#   CXU_PRODUCER=1          produce test cases in a worker process
+#   CXU_PRODUCER_SLOTS=n    ring buffer capacity, in test cases (default 16384)
+#
+# The ring is single producer, single consumer: the header holds the consumer's count of
+# rows read (head), the producer's count of rows written (tail), and the producer's status;
+# each side writes only its own count, and only after the rows it covers.
+
+from itertools import chain
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+import os
+import time
+import traceback
+
+import refmodels
+
+N_COLS = 6                              # cxu, state, func, data0, data1, model
+HEAD, TAIL, STATUS = range(3)           # header words
+RUNNING, DONE, FAILED = range(3)        # producer status
+POLL_S = 0.0001                         # while the ring is full or empty
+
+def enabled():
+    return os.environ.get("CXU_PRODUCER", "0") != "0"
+
+# TB.drive() test cases (cxu,state,func,data0,data1,model) from chunks(), a generator of
+# (cxu,state,func,data0,data1,model) arrays and/or scalars: in a worker process if enabled
+def txns(chunks):
+    if enabled():
+        return Producer(chunks)
+    return chain.from_iterable(refmodels.txns(*chunk) for chunk in chunks())
+
+class Producer:
+    def __init__(self, chunks, slots=None):
+        self.slots = slots or int(os.environ.get("CXU_PRODUCER_SLOTS", 16384))
+        self.shm = shared_memory.SharedMemory(create=True, size=8 * (4 + self.slots * N_COLS))
+        (self.header, self.rows) = self.views()
+        self.header[:] = 0
+        self.process = multiprocessing.get_context("fork").Process(target=self.produce, args=(chunks,),
+                                                                   daemon=True)
+        self.process.start()
+
+    def views(self):
+        header = np.ndarray((4,), dtype=np.uint64, buffer=self.shm.buf)
+        rows = np.ndarray((self.slots, N_COLS), dtype=np.uint64, buffer=self.shm.buf, offset=8 * 4)
+        return (header, rows)
+
+    # worker process: write each chunk's rows into the ring, as space allows
+    def produce(self, chunks):
+        (header, rows) = (self.header, self.rows)
+        try:
+            for chunk in chunks():
+                n = max(np.size(col) for col in chunk)
+                cols = [np.broadcast_to(np.asarray(col, dtype=np.uint64), (n,)) for col in chunk]
+                i = 0
+                while i < n:
+                    tail = int(header[TAIL])
+                    free = self.slots - (tail - int(header[HEAD]))
+                    if free == 0:
+                        time.sleep(POLL_S)
+                        continue
+                    at = tail % self.slots
+                    k = min(n - i, free, self.slots - at)
+                    for (j, col) in enumerate(cols):
+                        rows[at:at+k, j] = col[i:i+k]
+                    header[TAIL] = tail + k
+                    i += k
+            header[STATUS] = DONE
+        except BaseException:
+            traceback.print_exc()
+            header[STATUS] = FAILED
+
+    # consume the rows as they arrive, until the producer is done
+    def __iter__(self):
+        try:
+            while True:
+                head = int(self.header[HEAD])
+                status = int(self.header[STATUS])
+                tail = int(self.header[TAIL])
+                if tail > head:
+                    at = head % self.slots
+                    k = min(tail - head, self.slots - at)
+                    block = self.rows[at:at+k].tolist()
+                    self.header[HEAD] = head + k
+                    for row in block:
+                        yield tuple(row)
+                elif status == DONE:
+                    return
+                elif status == FAILED or not self.process.is_alive() and int(self.header[STATUS]) == RUNNING:
+                    raise RuntimeError("test case producer process failed")
+                else:
+                    time.sleep(POLL_S)
+        finally:
+            self.close()
+
+    def close(self):
+        if self.shm is None:
+            return
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        (self.header, self.rows) = (None, None)
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
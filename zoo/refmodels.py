@@ -0,0 +1,220 @@
+## refmodels.py: vectorized reference models and stimulus for the zoo CXUs
+
+'''
+Copyright (C) 2019-2023, Gray Research LLC.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+# Stimulus and expected responses are generated up front, as batches of uint64 arrays,
+# rather than one vector at a time on the simulator's Python thread. uint64 arithmetic
+# wraps modulo 2**64, so results are exact once masked to n_bits (32 or 64).
+
+import numpy as np
+
+U64 = np.uint64
+CHUNK = 1024                            # cases per chunk, of the *_chunks() generators
+
+def mask_of(n_bits):
+    return U64((1 << n_bits) - 1)
+
+# population count of each element
+def popcount(a):
+    a = np.asarray(a, dtype=U64)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(a).astype(U64)
+    bits = np.unpackbits(np.ascontiguousarray(a).reshape(-1, 1).view(np.uint8), axis=1)
+    return bits.sum(axis=1, dtype=U64).reshape(a.shape)
+
+# binary neural net dot product: popcount(xnor(a,b)) over n_bits
+def xnor_popcount(a, b, n_bits):
+    return popcount(~(a ^ b) & mask_of(n_bits))
+
+# elementwise dot product of the n_bits//elem_w elem_w-bit lanes of a and b, mod 2**n_bits
+def lane_dotprod(a, b, n_bits, elem_w):
+    shifts = np.arange(n_bits // elem_w, dtype=U64) * U64(elem_w)
+    elem_mask = mask_of(elem_w)
+    a_elems = (a[:, None] >> shifts) & elem_mask
+    b_elems = (b[:, None] >> shifts) & elem_mask
+    return np.sum(a_elems * b_elems, axis=1, dtype=U64) & mask_of(n_bits)
+
+# per-state accumulator scan: acc[state] = x + (0 if zero else acc[state]), mod 2**n_bits,
+# with every state's accumulator initially zero, or initially accs[state], in which case
+# accs is updated to the final accumulators; returns each step's updated accumulator
+def accumulate(zero, state, x, n_states, n_bits, accs=None):
+    acc = np.zeros_like(x)
+    for s in range(n_states):
+        idx = np.flatnonzero(state == s)
+        if len(idx) == 0:
+            continue
+        sums = np.cumsum(x[idx], dtype=U64)
+        # each step's run of accumulation starts after its most recent zeroing step k, at
+        # k+1, with base the sum before k; or with no zeroing step, at 0, with base -accs[s]
+        starts = np.maximum.accumulate(np.where(zero[idx] != 0, np.arange(1, len(idx)+1), 0))
+        initial = U64(0) if accs is None else U64(-int(accs[s]) & ((1 << 64) - 1))
+        bases = np.where(starts > 0, (sums - x[idx])[starts - 1], initial)
+        acc[idx] = (sums - bases) & mask_of(n_bits)
+        if accs is not None:
+            accs[s] = acc[idx[-1]]
+    return acc
+
+# n fibonacci sequence pairs (1,1), (1,2), (2,3), ... mod 2**n_bits
+def fibonacci_pairs(n, n_bits):
+    mask = (1 << n_bits) - 1
+    f = [1, 1]
+    while len(f) < n + 1:
+        f.append((f[-2] + f[-1]) & mask)
+    f = np.array(f[:n+1], dtype=U64)
+    return (f[:-1], f[1:])
+
+def randoms(rng, n, n_bits):
+    return rng.integers(0, 1 << n_bits, size=n, dtype=U64, endpoint=False)
+
+# interleave pairs of same-length arrays (or scalars): [(a0[0],b0[0]), (a1[0],b1[0]), ..., (a0[1],b0[1]), ...]
+def interleave(*pairs):
+    n = max(np.size(x) for pair in pairs for x in pair)
+    def column(k):
+        return np.stack([np.broadcast_to(np.asarray(pair[k], dtype=U64), (n,)) for pair in pairs],
+                        axis=-1).ravel()
+    return (column(0), column(1))
+
+
+# popcount_cxu: returns (data0, expected)
+def popcount_vectors(n_bits, seed=0):
+    rng = np.random.default_rng(seed)
+    mask = mask_of(n_bits)
+
+    # first nonneg integers and complements
+    i = np.arange(256, dtype=U64)
+    first = np.stack([i, ~i & mask], axis=-1).ravel()
+
+    # 1,2,3-bit patterns and complements
+    (i, j, k) = np.meshgrid(*[np.arange(n_bits, dtype=U64)] * 3, indexing='ij')
+    ordered = (i <= j) & (j <= k)
+    t = (U64(1) << i[ordered]) | (U64(1) << j[ordered]) | (U64(1) << k[ordered])
+    bits = np.stack([t, ~t & mask], axis=-1).ravel()
+
+    a = np.concatenate([first, bits, randoms(rng, 1000, n_bits)])
+    return (a, popcount(a))
+
+# bnn_cxu (and its L1/L2 adapters): returns (data0, data1, expected)
+def bnn_vectors(n_bits, seed=0):
+    rng = np.random.default_rng(seed)
+    mask = mask_of(n_bits)
+
+    i = np.arange(1024, dtype=U64)
+    (a0, b0) = interleave((i, 0), (mask, i), (i, i), (i, ~i & mask))
+
+    (i, j) = np.meshgrid(np.arange(n_bits, dtype=U64), np.arange(n_bits, dtype=U64), indexing='ij')
+    (i, j) = (U64(1) << i.ravel(), U64(1) << j.ravel())
+    (a1, b1) = interleave((i, j), (i, ~j & mask))
+
+    (a2, b2) = fibonacci_pairs(1000, n_bits)
+    a = np.concatenate([a0, a1, a2, randoms(rng, 1000, n_bits)])
+    b = np.concatenate([b0, b1, b2, randoms(rng, 1000, n_bits)])
+    return (a, b, xnor_popcount(a, b, n_bits))
+
+# mulacc_cxu subcases: returns (a, b)
+def mulacc_subcases(rng, n_bits):
+    mask = mask_of(n_bits)
+
+    i = np.arange(256, dtype=U64)
+    (a0, b0) = interleave((i, 0), (mask, i), (i, i), (i, ~i & mask))
+
+    (i, j) = np.meshgrid(np.arange(n_bits, dtype=U64), np.arange(0, n_bits, 3, dtype=U64), indexing='ij')
+    (i, j) = (U64(1) << i.ravel(), U64(1) << j.ravel())
+    (a1, b1) = interleave((i, j), (i, ~j & mask), (~i & mask, j), (~i & mask, ~j & mask))
+
+    (a2, b2) = fibonacci_pairs(1000, n_bits)
+    a = np.concatenate([a0, a1, a2, randoms(rng, 1000, n_bits)])
+    b = np.concatenate([b0, b1, b2, randoms(rng, 1000, n_bits)])
+    return (a, b)
+
+# dotprod_cxu subcases: returns (a, b)
+def dotprod_subcases(rng, n_bits, elem_w):
+    n_elems = n_bits // elem_w
+    mask = mask_of(n_bits)
+    elem_mask = mask_of(elem_w)
+
+    # element x placed in lane i
+    def e(x, i):
+        return ((x & elem_mask) << (i * U64(elem_w))) & mask
+
+    (i, x) = np.meshgrid(np.arange(n_elems, dtype=U64), np.arange(min(1024, 1 << elem_w), dtype=U64),
+                         indexing='ij')
+    (i, x) = (i.ravel(), x.ravel())
+    (a0, b0) = interleave((e(x, i), 0), (mask, e(x, i)), (e(x, i), e(x, i)), (e(x, i), e(~x, i)))
+
+    (i, j, k) = np.meshgrid(np.arange(n_elems, dtype=U64), np.arange(elem_w, dtype=U64),
+                            np.arange(elem_w, dtype=U64), indexing='ij')
+    (i, j, k) = (i.ravel(), U64(1) << j.ravel(), U64(1) << k.ravel())
+    (a1, b1) = interleave((e(j, i), e(k, i)), (e(j, i), e(~k, i)), (e(~j, i), e(k, i)), (e(~j, i), e(~j, i)))
+
+    (a2, b2) = fibonacci_pairs(1000, n_bits)
+    a = np.concatenate([a0, a1, a2, randoms(rng, 1000, n_bits)])
+    b = np.concatenate([b0, b1, b2, randoms(rng, 1000, n_bits)])
+    return (a, b)
+
+# accumulating CXU cases: all the subcases across random states, without resets,
+# then reset each state, then all the subcases again with some random resets;
+# returns (zero, state, a, b)
+def accumulate_cases(rng, n_states, subcases):
+    (a0, b0) = subcases()
+    (a1, b1) = subcases()
+    zeros = np.zeros(n_states, dtype=U64)
+    zero = np.concatenate([np.zeros(len(a0), dtype=U64), np.ones(n_states, dtype=U64),
+                           (rng.integers(0, 10, size=len(a1)) == 0).astype(U64)])
+    state = np.concatenate([rng.integers(0, n_states, size=len(a0), dtype=U64),
+                            np.arange(n_states, dtype=U64),
+                            rng.integers(0, n_states, size=len(a1), dtype=U64)])
+    return (zero, state, np.concatenate([a0, zeros, a1]), np.concatenate([b0, zeros, b1]))
+
+# mulacc_cxu: returns (zero, state, data0, data1, expected)
+def mulacc_vectors(n_states, n_bits, seed=0):
+    rng = np.random.default_rng(seed)
+    (zero, state, a, b) = accumulate_cases(rng, n_states, lambda: mulacc_subcases(rng, n_bits))
+    return (zero, state, a, b, accumulate(zero, state, a * b, n_states, n_bits))
+
+# dotprod_cxu: returns (zero, state, data0, data1, expected)
+def dotprod_vectors(n_states, n_bits, elem_w, seed=0):
+    rng = np.random.default_rng(seed)
+    (zero, state, a, b) = accumulate_cases(rng, n_states, lambda: dotprod_subcases(rng, n_bits, elem_w))
+    return (zero, state, a, b, accumulate(zero, state, lane_dotprod(a, b, n_bits, elem_w), n_states, n_bits))
+
+# the same cases as mulacc_vectors() and dotprod_vectors(), but with the expected responses
+# computed size cases at a time, e.g. by a producer process (see producer.py) streaming them
+# to the simulator while it simulates the previous ones; yields (zero, state, data0, data1, expected)
+def mulacc_chunks(n_states, n_bits, seed=0, size=CHUNK):
+    rng = np.random.default_rng(seed)
+    (zero, state, a, b) = accumulate_cases(rng, n_states, lambda: mulacc_subcases(rng, n_bits))
+    return accumulate_chunks(zero, state, a, b, lambda a, b: a * b, n_states, n_bits, size)
+
+def dotprod_chunks(n_states, n_bits, elem_w, seed=0, size=CHUNK):
+    rng = np.random.default_rng(seed)
+    (zero, state, a, b) = accumulate_cases(rng, n_states, lambda: dotprod_subcases(rng, n_bits, elem_w))
+    return accumulate_chunks(zero, state, a, b, lambda a, b: lane_dotprod(a, b, n_bits, elem_w),
+                             n_states, n_bits, size)
+
+def accumulate_chunks(zero, state, a, b, f, n_states, n_bits, size):
+    accs = np.zeros(n_states, dtype=U64)
+    for i in range(0, len(a), size):
+        s = slice(i, i + size)
+        yield (zero[s], state[s], a[s], b[s],
+               accumulate(zero[s], state[s], f(a[s], b[s]), n_states, n_bits, accs))
+
+# zip arrays and/or scalars into TB.drive() test cases (cxu,state,func,data0,data1,model) of ints
+def txns(cxu, state, func, data0, data1, model):
+    n = len(model)
+    cols = [np.broadcast_to(np.asarray(col, dtype=U64), (n,)).tolist()
+            for col in (cxu, state, func, data0, data1, model)]
+    return zip(*cols)
@@ -0,0 +1,204 @@
+## regress.py: longest-first regression runner over every zoo test and simulator
+
+'''
+Copyright (C) 2019-2023, Gray Research LLC.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+# Rather than run each test module's sweep under each simulator one `pytest -n auto` at a
+# time, each waiting on its own long tail, collect every parametrized test_* of every
+# *_test.py, under every simulator, into one pool of jobs, and run them longest first
+# (by their durations in the history file), each in its own pytest process, on -j workers.
+#
+# Each simulator's tests run in their own directory, sim_build/regress/<sim>, of links to
+# the zoo's files, so the same test under two simulators does not share a sim_build
+# directory; all share the compiled simulator cache. Each test's compile and sim time (see
+# simcache.py), and wall time, are recorded in the history file, regress_history.json.
+# With -t t, only t-wise covering arrays of each test's parameters run (see conftest.py), and
+# the combinations each test keeps and skips are listed before the run.
+#
+# usage: python3 regress.py [-j jobs] [-s icarus verilator] [-t tway] [-n] [modules...]
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import glob
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import simcache
+
+HISTORY = "regress_history.json"
+ALPHA = 0.5                             # weight of the latest duration in its running average
+
+# history: "<sim>:<nodeid>" => { "compile", "sim", "wall" (seconds, averaged), "runs", "passed" }
+class History:
+    def __init__(self, path=HISTORY):
+        self.path = path
+        self.lock = threading.Lock()
+        self.tests = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.tests = json.load(f)
+
+    # estimated wall time of a test: its average, else the longest of its module's, else
+    # the longest of all, so that tests without history are scheduled early
+    def estimate(self, key):
+        if key in self.tests:
+            return self.tests[key]["wall"]
+        module = key.split("::")[0]
+        known = [t["wall"] for (k, t) in self.tests.items() if k.split("::")[0] == module] or \
+                [t["wall"] for t in self.tests.values()]
+        return max(known, default=0.0)
+
+    def update(self, key, wall, timing, passed):
+        with self.lock:
+            t = self.tests.get(key)
+            if t is None:
+                t = self.tests[key] = { "compile":0.0, "sim":0.0, "wall":wall, "runs":0 }
+            def average(old, new):
+                return new if t["runs"] == 0 else ALPHA*new + (1-ALPHA)*old
+            t["wall"] = average(t["wall"], wall)
+            if timing is not None:
+                # (a cache hit's compile time is not representative of the test's)
+                if timing["compile"] > 0 or t["runs"] == 0:
+                    t["compile"] = average(t["compile"], timing["compile"])
+                t["sim"] = average(t["sim"], timing["sim"])
+            t["runs"] += 1
+            t["passed"] = passed
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.tests, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+
+# the node ids of the modules' tests
+def collect(modules, args=()):
+    out = subprocess.run([sys.executable, "-m", "pytest", "--collect-only", "-q", "-p", "no:cacheprovider"]
+                         + list(args) + modules,
+                         capture_output=True, text=True)
+    nodeids = [line.strip() for line in out.stdout.splitlines() if ".py::" in line and " " not in line.strip()]
+    if out.returncode != 0 or not nodeids:
+        sys.exit(out.stdout + out.stderr)
+    return nodeids
+
+# print, per test function, how many of its combinations a covering array kept, and which
+# it skipped: those of all the node ids not among the kept ones
+def tway_report(t, all, kept):
+    tests = {}
+    for nodeid in all:
+        (test, _, id) = nodeid.partition("[")
+        tests.setdefault(test, []).append((nodeid, id.rstrip("]")))
+    kept = set(kept)
+    print("regress: {0}-way covering arrays, {1} of {2} tests deselected".format(
+        t, len(set(all) - kept), len(all)))
+    for (test, nodes) in tests.items():
+        skipped = [id for (nodeid, id) in nodes if nodeid not in kept]
+        print("{0}: {1} of {2} combinations; skipped {3}".format(
+            test, len(nodes) - len(skipped), len(nodes), " ".join(skipped) if skipped else "none"))
+
+# sim_build/regress/<sim>: a directory of links to this directory's files
+def mirror(sim):
+    here = os.path.abspath(".")
+    dir = os.path.join(here, "sim_build", "regress", sim)
+    os.makedirs(dir, exist_ok=True)
+    for name in os.listdir(here):
+        src = os.path.join(here, name)
+        dst = os.path.join(dir, name)
+        if os.path.isfile(src) and not os.path.lexists(dst):
+            os.symlink(src, dst)
+    return dir
+
+# the test's sim_build directory, per the testbenches' naming convention
+def work_dir(dir, nodeid):
+    name = nodeid.split("::")[-1].replace('[', '-').replace(']', '')
+    return os.path.join(dir, "sim_build", name)
+
+# list scheduling's makespan on n workers, of durations in the given order
+def makespan(durations, n):
+    workers = [0.0] * max(1, n)
+    for d in durations:
+        workers[workers.index(min(workers))] += d
+    return max(workers)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run every zoo test, longest first")
+    parser.add_argument('modules', nargs='*', help="test modules (default *_test.py)")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help="no. of concurrent tests")
+    parser.add_argument('-s', '--sims', nargs='+', default=["icarus", "verilator"], help="simulators")
+    parser.add_argument('-n', '--dry-run', action='store_true', help="print the schedule only")
+    parser.add_argument('-t', '--tway', type=int, default=0, help="run t-wise covering arrays of parameters (see conftest.py)")
+    parser.add_argument('--history', default=HISTORY, help="history file")
+    args = parser.parse_args()
+
+    history = History(args.history)
+    modules = args.modules or sorted(glob.glob("*_test.py"))
+    nodeids = collect(modules, [f"--tway={args.tway}"])
+    if args.tway > 0:
+        tway_report(args.tway, collect(modules, ["--tway=0"]), nodeids)
+    jobs = sorted(((history.estimate(f"{sim}:{nodeid}"), sim, nodeid) for sim in args.sims for nodeid in nodeids),
+                  reverse=True)
+    estimate = makespan([d for (d, _, _) in jobs], args.jobs)
+    print("regress: {0} tests on {1} workers, estimated {2:.0f} s (serial {3:.0f} s)".format(
+        len(jobs), args.jobs, estimate, sum(d for (d, _, _) in jobs)))
+    if args.dry_run:
+        for (d, sim, nodeid) in jobs:
+            print("{0:8.1f} s  {1:10s} {2}".format(d, sim, nodeid))
+        return
+
+    dirs = { sim:mirror(sim) for sim in args.sims }
+    env = dict(os.environ, CXU_SIM_CACHE_DIR=os.path.abspath(simcache.cache_dir()))
+    failures = []
+    done = [0]
+    print_lock = threading.Lock()
+
+    def run(job):
+        (_, sim, nodeid) = job
+        dir = dirs[sim]
+        wdir = work_dir(dir, nodeid)
+        os.makedirs(wdir, exist_ok=True)
+        timing_path = os.path.join(wdir, simcache.TIMING)
+        if os.path.exists(timing_path):
+            os.remove(timing_path)
+        start = time.time()
+        with open(os.path.join(wdir, "regress.log"), "w") as log:
+            result = subprocess.run([sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider", nodeid],
+                                    cwd=dir, env=dict(env, SIM=sim), stdout=log, stderr=subprocess.STDOUT)
+        wall = time.time() - start
+        timing = None
+        if os.path.exists(timing_path):
+            with open(timing_path) as f:
+                timing = json.load(f)
+        passed = result.returncode == 0
+        history.update(f"{sim}:{nodeid}", wall, timing, passed)
+        with print_lock:
+            done[0] += 1
+            if not passed:
+                failures.append((sim, nodeid, os.path.join(wdir, "regress.log")))
+            print("[{0}/{1}] {2} {3:10s} {4} ({5:.1f} s)".format(
+                done[0], len(jobs), "PASS" if passed else "FAIL", sim, nodeid, wall), flush=True)
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        list(pool.map(run, jobs))       # (in submission order: longest first)
+    print("regress: {0} passed, {1} failed, in {2:.0f} s (estimated {3:.0f} s)".format(
+        len(jobs) - len(failures), len(failures), time.time() - start, estimate))
+    for (sim, nodeid, log) in failures:
+        print(f"FAIL {sim} {nodeid}: see {log}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+## simcache.py: content-hashed compiled simulator cache for cocotb-test runs
+
+'''
+Copyright (C) 2019-2023, Gray Research LLC.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+# run() is a drop-in replacement for cocotb_test.simulator.run(). Rather than compile
+# into a per-test sim_build directory, it compiles into sim_build/cache/<toplevel>-<key>,
+# where key hashes the contents of the sources (and the files they `include), the toplevel,
+# parameters, defines, and simulator and cocotb versions. A build is compiled once, under an
+# exclusive file lock, then reused by every later test, run, and xdist worker with the same key.
+#
+# Environment:
+#   CXU_SIM_CACHE=0                 disable the cache: compile into each test's own sim_build
+#   CXU_SIM_CACHE_DIR               cache directory (default ./sim_build/cache)
+#   CXU_SIM_CACHE_MAX_MB            evict least recently used builds beyond this size (default 4096)
+#   CXU_SIM_CACHE_MAX_AGE_DAYS      evict builds unused for this long (default 14)
+#
+# run() also drops waveform defines, but for failed runs' reruns (see waves.py).
+#
+# Each run records its compile and simulation wall times, and simulated time, in
+# <work_dir>/timing.json (compile is 0 for a cache hit; with the cache disabled, the total
+# is recorded as sim). A cached run's cocotb results file is <work_dir>/results.xml, rather
+# than a temporary file in the shared cache entry.
+
+import cocotb
+from cocotb_test import simulator as cocotb_test_sim
+import contextlib
+import fcntl
+import functools
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import time
+from xml.etree import ElementTree
+
+import waves
+
+STAMP = "cache.json"                    # present once the entry's build is complete
+LOCK  = "cache.lock"                    # exclusive to evict, shared to build or run
+BUILD_LOCK = "build.lock"               # exclusive to build
+TIMING = "timing.json"                  # per run: compile and sim seconds
+RESULTS = "results.xml"                 # per run: cocotb's results, in its work_dir
+
+def run(simulator=None, **kwargs):
+    # waveforms: by default, none, but for a rerun of a failed run (see waves.py)
+    sim = os.environ.get("SIM", simulator or "icarus")
+    work_dir = kwargs.get("work_dir") or kwargs.get("sim_build", "sim_build")
+    kwargs = dict(kwargs, work_dir=work_dir)
+    defines = list(kwargs.get("defines", []))
+    waves.clear(work_dir)
+    try:
+        return run_once(simulator, **dict(kwargs, defines=waves.defines(defines)))
+    except SystemExit:
+        rerun = waves.rerun_kwargs(sim, kwargs, defines) if waves.mode() == "fail" else None
+        if rerun is not None:
+            try:
+                run_once(simulator, **rerun)
+            except SystemExit:
+                pass                    # (fails again, as expected)
+            print(f"waveforms of the failure: {work_dir}")
+        raise
+
+def run_once(simulator=None, **kwargs):
+    timing = { "compile":0.0, "sim":0.0, "sim_time_ns":None }
+    start = time.time()
+    if not enabled():
+        try:
+            results = cocotb_test_sim.run(simulator=simulator, **kwargs)
+            timing["sim_time_ns"] = sim_time_ns(results)
+            return results
+        finally:
+            timing["sim"] = time.time() - start
+            write_timing(kwargs.get("work_dir") or kwargs.get("sim_build", "sim_build"), timing)
+
+    sim = os.environ.get("SIM", simulator or "icarus")
+    if "SIM" not in os.environ:
+        kwargs["simulator"] = sim
+
+    # run in the test's own directory, so its waveforms and other outputs are not shared
+    work_dir = kwargs.get("work_dir") or kwargs.get("sim_build", "sim_build")
+    os.makedirs(work_dir, exist_ok=True)
+    kwargs = dict(kwargs, work_dir=work_dir)
+
+    def build(entry):
+        started = time.time()
+        cocotb_test_sim.run(**dict(kwargs, sim_build=entry, compile_only=True, force_compile=True))
+        timing["compile"] = time.time() - started
+
+    try:
+        with results_file(work_dir), cached(sim, build, **kwargs) as entry:
+            kwargs = dict(kwargs, sim_build=entry)
+            started = time.time()
+            try:
+                if sim in PRECOMPILED:
+                    kwargs.pop("simulator", None)
+                    results = PRECOMPILED[sim](**kwargs).run()
+                else:
+                    results = cocotb_test_sim.run(**kwargs)
+                timing["sim_time_ns"] = sim_time_ns(results)
+                return results
+            finally:
+                timing["sim"] = time.time() - started
+    finally:
+        write_timing(work_dir, timing)
+
+# have cocotb-test write the results to <work_dir>/results.xml (unless COCOTB_RESULTS_FILE
+# is set), rather than to a new temporary file in the sim_build directory, the cache entry,
+# each build and run
+@contextlib.contextmanager
+def results_file(work_dir):
+    if os.environ.get("COCOTB_RESULTS_FILE"):
+        yield
+        return
+    path = os.path.join(os.path.abspath(work_dir), RESULTS)
+    if os.path.exists(path):
+        os.remove(path)                 # (else a crashed run would find the last one's)
+    os.environ["COCOTB_RESULTS_FILE"] = path
+    try:
+        yield
+    finally:
+        del os.environ["COCOTB_RESULTS_FILE"]
+
+# total simulated time of the testcases of a cocotb results file
+def sim_time_ns(results):
+    try:
+        tree = ElementTree.parse(results)
+    except (OSError, TypeError, ElementTree.ParseError):
+        return None
+    return sum(float(tc.get("sim_time_ns", 0)) for tc in tree.iter("testcase"))
+
+def write_timing(work_dir, timing):
+    os.makedirs(work_dir, exist_ok=True)
+    with open(os.path.join(work_dir, TIMING), "w") as f:
+        json.dump(timing, f)
+
+def enabled():
+    return os.environ.get("CXU_SIM_CACHE", "1") != "0"
+
+# the cache entry directory for a build, made by build(entry) if not yet cached,
+# and held (not evicted) for the duration of the with statement
+@contextlib.contextmanager
+def cached(sim, build, **kwargs):
+    key = build_key(sim, **kwargs)
+    entry = os.path.join(cache_dir(), "{0}-{1}".format(kwargs["toplevel"], key[:16]))
+
+    # hold a shared lock while building and running, so the build is not evicted from under us
+    with lock_entry(entry, fcntl.LOCK_SH):
+        stamp = os.path.join(entry, STAMP)
+        if os.path.exists(stamp):
+            os.utime(stamp)             # most recently used
+        else:
+            # one worker builds; the others wait for just the build, not for its simulation
+            with open(os.path.join(entry, BUILD_LOCK), "a") as build_lock:
+                fcntl.flock(build_lock, fcntl.LOCK_EX)
+                if not os.path.exists(stamp):
+                    build(entry)
+                    with open(stamp, "w") as f:
+                        json.dump({ "key":key, "sim":sim, "toplevel":kwargs["toplevel"],
+                                    "parameters":kwargs.get("parameters", {}),
+                                    "defines":kwargs.get("defines", []) }, f, indent=1)
+                    evict(keep=entry)
+        yield entry
+
+# open and flock an entry's lock file, (re)making the entry; an evict() may remove the entry
+# while we await the lock, unlinking the file we hold, so then make the entry anew and retry
+def lock_entry(entry, operation):
+    path = os.path.join(entry, LOCK)
+    while True:
+        os.makedirs(entry, exist_ok=True)
+        try:
+            lock = open(path, "a")
+        except FileNotFoundError:
+            continue                    # (evicted between makedirs and open)
+        fcntl.flock(lock, operation)
+        if linked(lock, path):
+            return lock
+        lock.close()
+
+# is open file f still the file at path?
+def linked(f, path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return False
+    fst = os.fstat(f.fileno())
+    return (st.st_dev, st.st_ino) == (fst.st_dev, fst.st_ino)
+
+def cache_dir():
+    return os.environ.get("CXU_SIM_CACHE_DIR", os.path.join(".", "sim_build", "cache"))
+
+# hash everything that determines the compiled simulation
+def build_key(sim, toplevel, verilog_sources=(), includes=(), parameters=None, defines=(),
+              compile_args=(), timescale=None, waves=None, **_):
+    h = hashlib.sha256()
+    def add(*items):
+        for item in items:
+            h.update(repr(item).encode())
+            h.update(b"\0")
+
+    add(sim, simulator_version(sim), cocotb.__version__, toplevel)
+    add(sorted((parameters or {}).items()), list(defines), list(compile_args), timescale, waves)
+    add(list(includes))
+    for path in sources_closure(verilog_sources, includes):
+        with open(path, "rb") as f:
+            add(os.path.basename(path), hashlib.sha256(f.read()).hexdigest())
+    return h.hexdigest()
+
+# verilog sources, and transitively each file they `include, in first-seen order
+def sources_closure(sources, includes):
+    seen = []
+    def visit(path):
+        if path in seen or not os.path.isfile(path):
+            return
+        seen.append(path)
+        with open(path, errors="replace") as f:
+            text = f.read()
+        for name in re.findall(r'^\s*`include\s+"([^"]+)"', text, re.MULTILINE):
+            for dir in [os.path.dirname(path)] + list(includes):
+                candidate = os.path.normpath(os.path.join(dir, name))
+                if os.path.isfile(candidate):
+                    visit(candidate)
+                    break
+    for source in sources:
+        visit(os.path.normpath(source))
+    return seen
+
+@functools.lru_cache(maxsize=None)
+def simulator_version(sim):
+    cmd = { "icarus":["iverilog", "-V"], "verilator":["verilator", "--version"],
+            "verilator-cpp":["verilator", "--version"] }.get(sim)
+    if cmd is None:
+        return None
+    try:
+        out = subprocess.run(cmd, capture_output=True, text=True).stdout
+    except OSError:
+        return None
+    return out.splitlines()[0] if out else None
+
+# evict builds unused for CXU_SIM_CACHE_MAX_AGE_DAYS, then least recently used builds until
+# the cache fits in CXU_SIM_CACHE_MAX_MB; skip builds being built or run
+def evict(keep=None):
+    max_bytes = float(os.environ.get("CXU_SIM_CACHE_MAX_MB", 4096)) * 2**20
+    max_age = float(os.environ.get("CXU_SIM_CACHE_MAX_AGE_DAYS", 14)) * 24*60*60
+    now = time.time()
+
+    entries = []
+    for name in os.listdir(cache_dir()):
+        entry = os.path.join(cache_dir(), name)
+        stamp = os.path.join(entry, STAMP)
+        if os.path.isfile(stamp) and os.path.abspath(entry) != os.path.abspath(keep or ""):
+            entries.append((os.path.getmtime(stamp), entry, dir_size(entry)))
+    total = sum(size for (_, _, size) in entries) + (dir_size(keep) if keep else 0)
+
+    for (used, entry, size) in sorted(entries):
+        if now - used <= max_age and total <= max_bytes:
+            break
+        path = os.path.join(entry, LOCK)
+        try:
+            lock = open(path, "a")
+        except FileNotFoundError:
+            continue                    # (another worker evicted it)
+        with lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue
+            if not linked(lock, path):
+                continue
+            os.remove(os.path.join(entry, STAMP))
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+def dir_size(dir):
+    return sum(os.path.getsize(os.path.join(root, f)) for (root, _, files) in os.walk(dir) for f in files)
+
+# simulators that run a cached build without recompiling it, regardless of source mtimes
+
+class Icarus(cocotb_test_sim.Icarus):
+    def outdated(self, output, dependencies):
+        return not os.path.isfile(output)
+
+class Verilator(cocotb_test_sim.Verilator):
+    def build_command(self):
+        return super().build_command()[-1:]     # just run the compiled executable
+
+PRECOMPILED = { "icarus":Icarus, "verilator":Verilator }
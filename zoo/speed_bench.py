@@ -0,0 +1,192 @@
+## speed_bench.py: simulation speed benchmarks of the zoo CXU testbenches, with baseline tracking
+
+'''
+Copyright (C) 2019-2023, Gray Research LLC.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+# Run one representative configuration of each zoo CXU testbench, under each simulator,
+# twice: with the cocotb TB driving and checking each request (mode cocotb), and with the
+# same test cases streamed by the native vector harness (mode vectors, see vectors.py), each
+# compiled afresh. For each, report compile and run wall times, simulated cycles (1 ns clock)
+# per run second, and test vectors per run second; the ratio of the two modes' run times
+# estimates the cocotb overhead.
+#
+# Results are written to speed_bench.json, and compared against the baseline,
+# speed_baseline.json, if any, flagging vectors/s or compile time regressions beyond a
+# tolerance; results the baseline has no entry for (e.g. a simulator not yet recorded) are
+# listed as unchecked. Record the baseline on a reference host with --save-baseline, which
+# replaces just its entries for the benchmarks run, and check it in.
+#
+# usage: python3 speed_bench.py [-s icarus verilator] [-m cocotb vectors] [-t 0.2] [--save-baseline] [bench...]
+
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import shutil
+import sys
+import types
+
+import cppdriver
+import simcache
+import vectors
+
+RESULTS  = "speed_bench.json"
+BASELINE = "speed_baseline.json"
+
+# name => (test module, test function, parameters)
+BENCHES = {
+    "popcount":     ("popcount_cxu_test",     "test_popcount",  dict(width=32, adder_tree=1)),
+    "bnn":          ("bnn_cxu_test",          "test_bnn",       dict(width=32)),
+    "mulacc":       ("mulacc_cxu_test",       "test_mulacc",    dict(latency=1, states=2, width=32)),
+    "dotprod":      ("dotprod_cxu_test",      "test_dotprod",   dict(latency=1, states=3, width=32, elem_w=8)),
+    "bnn_l1":       ("bnn_l1_cxu_test",       "test_bnn_l1",    dict(latency=1, width=32)),
+    "bnn_l2":       ("bnn_l2_cxu_test",       "test_bnn_l2",    dict(width=32)),
+    "bnn_l1_l2":    ("bnn_l1_l2_cxu_test",    "test_bnn_l1_l2", dict(latency=2, width=32)),
+    "mulacc_l2":    ("mulacc_l2_cxu_test",    "test_mulacc_l2", dict(latency=2, states=2, width=32)),
+    "mux_macs":     ("mux_macs_cxu_test",     "test_mux_macs",  dict(cxus=2, states=2, width=32)),
+}
+
+# the run() arguments of a test function's configuration, by calling it with run() replaced;
+# name: its pytest node name (default the function's), from which some derive their sim_build
+def run_kwargs(module, test, parameters, name=None):
+    m = importlib.import_module(module)
+    captured = {}
+    saved = m.run
+    m.run = lambda **kwargs: captured.update(kwargs)
+    try:
+        request = types.SimpleNamespace(node=types.SimpleNamespace(name=name or test))
+        getattr(m, test)(request=request, **parameters)
+    finally:
+        m.run = saved
+    return captured
+
+@contextlib.contextmanager
+def environ(**env):
+    saved = { name:os.environ.get(name) for name in env }
+    os.environ.update(env)
+    try:
+        yield
+    finally:
+        for (name, value) in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+# run one benchmark, compiled afresh, returning its measurements
+def bench(name, sim, mode, n_vectors):
+    (module, test, parameters) = BENCHES[name]
+    kwargs = run_kwargs(module, test, parameters)
+    sim_build = os.path.join(".", "sim_build", "speed_bench", f"{name}-{sim}-{mode}")
+    shutil.rmtree(sim_build, ignore_errors=True)
+    os.makedirs(sim_build)
+    with environ(SIM=sim, CXU_VECTORS="1" if mode == "vectors" else "0", CXU_BACKEND="cocotb",
+                 CXU_SIM_CACHE="1", CXU_SIM_CACHE_DIR=os.path.join(sim_build, "cache")):
+        vectors.run(**dict(kwargs, sim_build=sim_build))
+    with open(os.path.join(sim_build, simcache.TIMING)) as f:
+        timing = json.load(f)
+    cycles = timing["sim_time_ns"] or 0
+    return { "bench":name, "sim":sim, "mode":mode, "vectors":n_vectors, "cycles":cycles,
+             "compile_s":timing["compile"], "run_s":timing["sim"],
+             "cycles_per_s":cycles / timing["sim"] if timing["sim"] else None,
+             "vectors_per_s":n_vectors / timing["sim"] if timing["sim"] else None }
+
+# no. of test vectors (requests) a test function's configuration issues
+def count_vectors(name):
+    (module, test, parameters) = BENCHES[name]
+    recs = cppdriver.record(module, run_kwargs(module, test, parameters).get("extra_env", {}))
+    return int((recs[:,0] == vectors.REQ).sum())
+
+# the results' regressions vs. baseline: (result, metric, baseline value, value), and the
+# results the baseline has no entry for, which cannot be checked
+def compare(results, baseline, tolerance):
+    base = { (b["bench"], b["sim"], b["mode"]):b for b in baseline }
+    (regressions, unchecked) = ([], [])
+    for r in results:
+        b = base.get((r["bench"], r["sim"], r["mode"]))
+        if b is None:
+            unchecked.append(r)
+            continue
+        if b["vectors_per_s"] and r["vectors_per_s"] is not None and \
+           r["vectors_per_s"] < (1 - tolerance) * b["vectors_per_s"]:
+            regressions.append((r, "vectors_per_s", b["vectors_per_s"], r["vectors_per_s"]))
+        if b["compile_s"] and r["compile_s"] > (1 + tolerance) * b["compile_s"]:
+            regressions.append((r, "compile_s", b["compile_s"], r["compile_s"]))
+    return (regressions, unchecked)
+
+def report(results):
+    print("{0:12s} {1:10s} {2:8s} {3:>8s} {4:>10s} {5:>9s} {6:>9s} {7:>12s} {8:>12s}".format(
+        "bench", "sim", "mode", "vectors", "cycles", "compile_s", "run_s", "cycles/s", "vectors/s"))
+    for r in results:
+        print("{0:12s} {1:10s} {2:8s} {3:8d} {4:10.0f} {5:9.2f} {6:9.2f} {7:12.0f} {8:12.0f}".format(
+            r["bench"], r["sim"], r["mode"], r["vectors"], r["cycles"], r["compile_s"], r["run_s"],
+            r["cycles_per_s"] or 0, r["vectors_per_s"] or 0))
+    # cocotb overhead: the share of the cocotb mode's run time the vector harness does not need
+    runs = { (r["bench"], r["sim"], r["mode"]):r["run_s"] for r in results }
+    for ((name, sim, mode), run_s) in runs.items():
+        native = runs.get((name, sim, "vectors"))
+        if mode == "cocotb" and native is not None and run_s:
+            print("{0:12s} {1:10s} cocotb overhead {2:.0%} of run time".format(name, sim, 1 - native / run_s))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark simulation speed of the zoo CXU testbenches")
+    parser.add_argument('benches', nargs='*', default=list(BENCHES), help="benchmarks (default all)")
+    parser.add_argument('-s', '--sims', nargs='+', default=["icarus", "verilator"], help="simulators")
+    parser.add_argument('-m', '--modes', nargs='+', default=["cocotb", "vectors"], choices=["cocotb", "vectors"])
+    parser.add_argument('-t', '--tolerance', type=float, default=0.2, help="regression tolerance")
+    parser.add_argument('--baseline', default=BASELINE, help="baseline file")
+    parser.add_argument('--save-baseline', action='store_true', help="save the results as the baseline")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.benches:
+        n_vectors = count_vectors(name)
+        for sim in args.sims:
+            for mode in args.modes:
+                results.append(bench(name, sim, mode, n_vectors))
+    report(results)
+    with open(RESULTS, "w") as f:
+        json.dump(results, f, indent=1)
+
+    baseline = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    if args.save_baseline:
+        # replace the baseline's entries for these results, keeping the rest (e.g. other simulators')
+        keys = { (r["bench"], r["sim"], r["mode"]) for r in results }
+        with open(args.baseline, "w") as f:
+            json.dump([b for b in baseline if (b["bench"], b["sim"], b["mode"]) not in keys] + results, f, indent=1)
+        print(f"saved baseline {args.baseline}")
+        return
+    if not baseline:
+        print(f"no baseline {args.baseline}; save one with --save-baseline")
+        return
+    (regressions, unchecked) = compare(results, baseline, args.tolerance)
+    for (r, metric, was, now) in regressions:
+        print("REGRESSION {0} {1} {2}: {3} {4:.2f} => {5:.2f}".format(r["bench"], r["sim"], r["mode"], metric, was, now))
+    for sim in sorted({ r["sim"] for r in unchecked }):
+        n = sum(r["sim"] == sim for r in unchecked)
+        print("NO BASELINE {0}: {1} of {2} results unchecked ({3}); save one with -s {0} --save-baseline".format(
+            sim, n, sum(r["sim"] == sim for r in results),
+            ", ".join("{0} {1}".format(r["bench"], r["mode"]) for r in unchecked if r["sim"] == sim)))
+    print("{0} regressions vs. {1} (tolerance {2:.0%}), {3} of {4} results unchecked".format(
+        len(regressions), args.baseline, args.tolerance, len(unchecked), len(results)))
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -64,7 +64,7 @@ module switch_cxu_core
     &&  check_param_pos("N_INIS", N_INIS)
     &&  check_param_pos("N_TGTS", N_TGTS));
 `ifdef SWITCH_CXU_CORE_VCD
-    initial begin $dumpfile("switch_cxu_core.vcd"); $dumpvars(0, switch_cxu_core); end
+    `CXU_WAVES(switch_cxu_core, "switch_cxu_core.vcd")
 `endif
 
     localparam int INI_W        = $clog2(N_INIS);
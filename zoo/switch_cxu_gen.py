@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """
-generate an m-initiator n-target switch_cxu
+generate an m-initiator n-target switch_cxu (or, with --l3, switch_l3_cxu)
 
 Copyright (C) 2019-2023, Gray Research LLC.
 
@@ -24,10 +24,15 @@ which is Copyright (c) 2014-2018 Alex Forencich (MIT license); see
 
 import argparse
 from jinja2 import Template
+import os
 
 def main():
     parser = argparse.ArgumentParser(description=__doc__.strip())
     parser.add_argument('-p', '--ports',  type=int, default=[2], nargs='+', help="no. of ports")
+    parser.add_argument('--macs', action='store_true', help="also generate switchMxN_macs_cxu")
+    parser.add_argument('--l3', action='store_true', help="generate switchMxN_l3_cxu: CXU-L3 initiators, "
+                        "no head-of-line blocking, responses tagged with request ids")
+    parser.add_argument('--reorder', action='store_true', help="with --l3, default REORDER=1: responses in request order")
     args = parser.parse_args()
 
     try:
@@ -36,7 +41,7 @@ def main():
         print(ex)
         exit(1)
 
-def generate(ports = 2):
+def generate(ports = 2, macs = False, dir = ".", l3 = False, reorder = False):
     if type(ports) is int:
         m = n = ports
     elif len(ports) == 1:
@@ -44,11 +49,11 @@ def generate(ports = 2):
     else:
         m, n = ports
 
-    name = "switch{0}x{1}_cxu".format(m, n)
-    output = f"{name}.sv"
+    name = "switch{0}x{1}{2}_cxu".format(m, n, "_l3" if l3 else "")
+    output = os.path.join(dir, f"{name}.sv")
 
     t = Template(
-"""// {{name}}.sv: connect {{m}} initiator(s) to {{n}} target CXUs (CXU-L2)
+"""// {{name}}.sv: connect {{m}} initiator(s) to {{n}} target CXUs (CXU-{{L}})
 //
 // Copyright (C) 2019-2023, Gray Research LLC.
 // 
@@ -64,32 +69,47 @@ def generate(ports = 2):
 // See the License for the specific language governing permissions and
 // limitations under the License.
 
-// {{name}}: connect {{m}} initiator(s) to {{n}} target CXUs (CXU-L2)
+// {{name}}: connect {{m}} initiator(s) to {{n}} target CXUs (CXU-{{L}})
+{%- if l3 %}
+// (CXU-L3 initiators, CXU-L2 targets; see switch_l3_cxu_core)
+{%- endif %}
 module {{name}}
     import common_pkg::*, cxu_pkg::*;
 #(
+{%- if l3 %}
+    `CXU_L3_PARAMS(/*N_CXUS*/1, /*N_STATES*/1, /*REQ_ID_W*/4, /*FUNC_ID_W*/$bits(cfid_t), /*INSN_W*/0, /*DATA_W*/32),
+    parameter int N_REQS    = 16,   // max no. of in-flight requests per initiator and per target
+    parameter int REORDER   = {{reorder}}     // 0: responses out of order; 1: in request order
+{%- else %}
     `CXU_L2_PARAMS(/*N_CXUS*/1, /*N_STATES*/1, /*FUNC_ID_W*/$bits(cfid_t), /*INSN_W*/0, /*DATA_W*/32),
     parameter int N_REQS    = 16    // max no. of in-flight requests per initiator and per target
+{%- endif %}
 ) (
     `CXU_CLOCK_PORTS,
 {%- for p in range(m) %}
-    `CXU_L2_PORTS(input, output, i{{'%01d'%p}}_req, i{{'%01d'%p}}_resp), {% endfor %}
+    `CXU_{{L}}_PORTS(input, output, i{{'%01d'%p}}_req, i{{'%01d'%p}}_resp), {% endfor %}
 {%- for p in range(n) %}
     `CXU_L2_PORTS(output, input, t{{'%01d'%p}}_req, t{{'%01d'%p}}_resp){% if not loop.last %},{% endif %} {% endfor %}
 );
     initial ignore(
-        `CHECK_CXU_L2_PARAMS
+        `CHECK_CXU_{{L}}_PARAMS
     &&  check_param("CXU_FUNC_ID_W", CXU_FUNC_ID_W, $bits(cfid_t)));
 `ifdef SWITCH_CXU_VCD
-    initial begin $dumpfile("{{name}}.vcd"); $dumpvars(0, {{name}}); end
+    `CXU_WAVES({{name}}, "{{name}}.vcd")
 `endif
-
-    switch_cxu_core #(`CXU_L2_PARAMS_MAP, .N_INIS(N_INIS), .N_TGTS(N_TGTS), .N_REQS(N_REQS))
+{% if l3 %}
+    switch_l3_cxu_core #(`CXU_L3_PARAMS_MAP, .N_INIS({{m}}), .N_TGTS({{n}}), .N_REQS(N_REQS), .REORDER(REORDER))
+{%- else %}
+    switch_cxu_core #(`CXU_L2_PARAMS_MAP, .N_INIS({{m}}), .N_TGTS({{n}}), .N_REQS(N_REQS))
+{%- endif %}
     core(
         .clk, .rst, .clk_en,
         // initiators
         .i_req_valids({ {% for p in range(m-1,-1,-1) %}i{{'%1d'%p}}_req_valid{% if not loop.last %}, {% endif %}{% endfor %} }),
         .i_req_readys({ {% for p in range(m-1,-1,-1) %}i{{'%1d'%p}}_req_ready{% if not loop.last %}, {% endif %}{% endfor %} }),
+{%- if l3 %}
+        .i_req_ids({ {% for p in range(m-1,-1,-1) %}i{{'%1d'%p}}_req_id{% if not loop.last %}, {% endif %}{% endfor %} }),
+{%- endif %}
         .i_req_cxus({ {% for p in range(m-1,-1,-1) %}i{{'%1d'%p}}_req_cxu{% if not loop.last %}, {% endif %}{% endfor %} }),
         .i_req_states({ {% for p in range(m-1,-1,-1) %}i{{'%1d'%p}}_req_state{% if not loop.last %}, {% endif %}{% endfor %} }),
         .i_req_funcs({ {% for p in range(m-1,-1,-1) %}i{{'%1d'%p}}_req_func{% if not loop.last %}, {% endif %}{% endfor %} }),
@@ -98,6 +118,9 @@ module {{name}}
         .i_req_data1s({ {% for p in range(m-1,-1,-1) %}i{{'%1d'%p}}_req_data1{% if not loop.last %}, {% endif %}{% endfor %} }),
         .i_resp_valids({ {% for p in range(m-1,-1,-1) %}i{{'%1d'%p}}_resp_valid{% if not loop.last %}, {% endif %}{% endfor %} }),
         .i_resp_readys({ {% for p in range(m-1,-1,-1) %}i{{'%1d'%p}}_resp_ready{% if not loop.last %}, {% endif %}{% endfor %} }),
+{%- if l3 %}
+        .i_resp_ids({ {% for p in range(m-1,-1,-1) %}i{{'%1d'%p}}_resp_id{% if not loop.last %}, {% endif %}{% endfor %} }),
+{%- endif %}
         .i_resp_statuss({ {% for p in range(m-1,-1,-1) %}i{{'%1d'%p}}_resp_status{% if not loop.last %}, {% endif %}{% endfor %} }),
         .i_resp_datas({ {% for p in range(m-1,-1,-1) %}i{{'%1d'%p}}_resp_data{% if not loop.last %}, {% endif %}{% endfor %} }),
         // targets
@@ -109,7 +132,7 @@ module {{name}}
         .t_req_insns({ {% for p in range(n-1,-1,-1) %}t{{'%1d'%p}}_req_insn{% if not loop.last %}, {% endif %}{% endfor %} }),
         .t_req_data0s({ {% for p in range(n-1,-1,-1) %}t{{'%1d'%p}}_req_data0{% if not loop.last %}, {% endif %}{% endfor %} }),
         .t_req_data1s({ {% for p in range(n-1,-1,-1) %}t{{'%1d'%p}}_req_data1{% if not loop.last %}, {% endif %}{% endfor %} }),
-        .t_resp_valids({ {% for p in range(n-1,-1,-1) %}t{{'%1d'%p}}_resp_vaid{% if not loop.last %}, {% endif %}{% endfor %} }),
+        .t_resp_valids({ {% for p in range(n-1,-1,-1) %}t{{'%1d'%p}}_resp_valid{% if not loop.last %}, {% endif %}{% endfor %} }),
         .t_resp_readys({ {% for p in range(n-1,-1,-1) %}t{{'%1d'%p}}_resp_ready{% if not loop.last %}, {% endif %}{% endfor %} }),
         .t_resp_statuss({ {% for p in range(n-1,-1,-1) %}t{{'%1d'%p}}_resp_status{% if not loop.last %}, {% endif %}{% endfor %} }),
         .t_resp_datas({ {% for p in range(n-1,-1,-1) %}t{{'%1d'%p}}_resp_data{% if not loop.last %}, {% endif %}{% endfor %} })
@@ -118,8 +141,80 @@ endmodule
 """)
 
     with open(output, 'w') as f:
-        f.write(t.render(m=m, n=n, name=name))
+        f.write(t.render(m=m, n=n, name=name, l3=l3, L="L3" if l3 else "L2", reorder=int(reorder)))
+        f.flush()
+    if macs:
+        generate_macs(m, n, dir, l3, reorder)
+    return output
+
+# generate switchMxN_macs_cxu (or switchMxN_l3_macs_cxu): an M initiator switch to N
+# mulacc_l2_cxu targets, with M state contexts each, and diverse latencies LATENCY, LATENCY+2, ...,
+# or LATENCY + offsets[p]
+def generate_macs(m, n, dir = ".", l3 = False, reorder = False, offsets = None):
+    sw = "_l3" if l3 else ""
+    name = "switch{0}x{1}{2}_macs_cxu".format(m, n, sw)
+    output = os.path.join(dir, f"{name}.sv")
+
+    t = Template(
+"""// {{name}}.sv: connect {{m}} initiator(s) to {{n}} mulacc_l2_cxu targets (CXU-{{L}})
+//
+// Copyright (C) 2019-2023, Gray Research LLC.
+// 
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+// 
+//    http://www.apache.org/licenses/LICENSE-2.0
+// 
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+// {{name}} composes a switch{{m}}x{{n}}{{sw}}_cxu and {{n}} mulacc_l2_cxus.
+module {{name}}
+    import common_pkg::*, cxu_pkg::*;
+#(
+{%- if l3 %}
+    `CXU_L3_PARAMS(/*N_CXUS*/{{n}}, /*N_STATES*/{{m}}, /*REQ_ID_W*/4, /*FUNC_ID_W*/$bits(cfid_t), /*INSN_W*/0, /*DATA_W*/32),
+    parameter int N_REQS    = 16,   // max no. of in-flight requests per initiator and per target
+    parameter int REORDER   = {{reorder}},    // 0: responses out of order; 1: in request order
+{%- else %}
+    `CXU_L2_PARAMS(/*N_CXUS*/{{n}}, /*N_STATES*/{{m}}, /*FUNC_ID_W*/$bits(cfid_t), /*INSN_W*/0, /*DATA_W*/32),
+    parameter int N_REQS    = 16,   // max no. of in-flight requests per initiator and per target
+{%- endif %}
+    parameter int LATENCY   = 1     // CXU_LATENCYs:{% for p in range(n) %} mac{{p}} LATENCY+{{offsets[p]}}{% if not loop.last %},{% endif %}{% endfor %}
+) (
+    `CXU_CLOCK_PORTS,
+{%- for p in range(m) %}
+    `CXU_{{L}}_PORTS(input, output, i{{'%01d'%p}}_req, i{{'%01d'%p}}_resp){% if not loop.last %},{% endif %} {% endfor %}
+);
+    initial ignore(`CHECK_CXU_{{L}}_PARAMS);
+`ifdef SWITCH_MACS_CXU_VCD
+    `CXU_WAVES({{name}}, "{{name}}.vcd")
+`endif
+{% for p in range(n) %}
+    `CXU_L2_NETS(t{{'%01d'%p}}_req, t{{'%01d'%p}}_resp);{% endfor %}
+
+    switch{{m}}x{{n}}{{sw}}_cxu #(`CXU_{{L}}_PARAMS_MAP, .N_REQS(N_REQS){% if l3 %}, .REORDER(REORDER){% endif %})
+        switch_(`CXU_CLK_PORT_MAP,
+{%- for p in range(m) %}
+            `CXU_{{L}}_PORT_MAP(i{{'%01d'%p}}_req,i{{'%01d'%p}}_req, i{{'%01d'%p}}_resp,i{{'%01d'%p}}_resp),{% endfor %}
+{%- for p in range(n) %}
+            `CXU_L2_PORT_MAP(t{{'%01d'%p}}_req,t{{'%01d'%p}}_req, t{{'%01d'%p}}_resp,t{{'%01d'%p}}_resp){% if not loop.last %},{% else %});{% endif %}{% endfor %}
+{% for p in range(n) %}
+    mulacc_l2_cxu #(`CXU_L2_PARAMS_MAP, .CXU_LATENCY(LATENCY + {{offsets[p]}}))
+        mac{{'%01d'%p}}(`CXU_CLK_L2_PORT_MAP(req,t{{'%01d'%p}}_req, resp,t{{'%01d'%p}}_resp));
+{% endfor -%}
+endmodule
+""")
+
+    with open(output, 'w') as f:
+        f.write(t.render(m=m, n=n, name=name, sw=sw, l3=l3, L="L3" if l3 else "L2", reorder=int(reorder),
+                         offsets=offsets or [2*p for p in range(n)]))
         f.flush()
+    return output
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,371 @@
+// switch_l3_cxu_core.sv: connect CXU-L3 initiators to CXU-L2 target CXUs, without head-of-line blocking
+//
+// Copyright (C) 2019-2023, Gray Research LLC.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//    http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+`include "cxu.svh"
+
+/* verilator lint_off DECLFILENAME */
+
+// switch_l3_cxu_core: connect CXU-L3 initiators to CXU-L2 target CXUs,
+// wherein each port is a vector of the corresponding initiator or target CXU port signals
+module switch_l3_cxu_core
+    import common_pkg::*, cxu_pkg::*;
+#(
+    `CXU_L3_PARAMS(/*N_CXUS*/1, /*N_STATES*/1, /*REQ_ID_W*/4, /*FUNC_ID_W*/10, /*INSN_W*/0, /*DATA_W*/32),
+    parameter int N_INIS    = 1,            // no. of initiators
+    parameter int N_TGTS    = CXU_N_CXUS,   // no. of targets
+    parameter int N_REQS    = 16,           // max no. of in-flight requests per initiator or target
+    parameter int REORDER   = 0             // 0: responses out of order; 1: in request order
+) (
+    input  logic                        clk,
+    input  logic                        rst,
+    input  logic                        clk_en,
+
+    input  `V(N_INIS)                   i_req_valids,
+    output `V(N_INIS)                   i_req_readys,
+    input  `NV(N_INIS, CXU_REQ_ID_W)    i_req_ids,
+    input  `NV(N_INIS, CXU_CXU_ID_W)    i_req_cxus,
+    input  `NV(N_INIS, CXU_STATE_ID_W)  i_req_states,
+    input  `NV(N_INIS, CXU_FUNC_ID_W)   i_req_funcs,
+    input  `NV(N_INIS, CXU_INSN_W)      i_req_insns,
+    input  `NV(N_INIS, CXU_DATA_W)      i_req_data0s,
+    input  `NV(N_INIS, CXU_DATA_W)      i_req_data1s,
+    output `V(N_INIS)                   i_resp_valids,
+    input  `V(N_INIS)                   i_resp_readys,
+    output `NV(N_INIS, CXU_REQ_ID_W)    i_resp_ids,
+    output `NV(N_INIS, CXU_STATUS_W)    i_resp_statuss,
+    output `NV(N_INIS, CXU_DATA_W)      i_resp_datas,
+
+    output `V(N_TGTS)                   t_req_valids,
+    input  `V(N_TGTS)                   t_req_readys,
+    output `NV(N_TGTS, CXU_CXU_ID_W)    t_req_cxus,
+    output `NV(N_TGTS, CXU_STATE_ID_W)  t_req_states,
+    output `NV(N_TGTS, CXU_FUNC_ID_W)   t_req_funcs,
+    output `NV(N_TGTS, CXU_INSN_W)      t_req_insns,
+    output `NV(N_TGTS, CXU_DATA_W)      t_req_data0s,
+    output `NV(N_TGTS, CXU_DATA_W)      t_req_data1s,
+    input  `V(N_TGTS)                   t_resp_valids,
+    output `V(N_TGTS)                   t_resp_readys,
+    input  `NV(N_TGTS, CXU_STATUS_W)    t_resp_statuss,
+    input  `NV(N_TGTS, CXU_DATA_W)      t_resp_datas
+);
+    initial ignore(
+        `CHECK_CXU_L3_PARAMS
+    &&  check_param("CXU_FUNC_ID_W", CXU_FUNC_ID_W, $bits(cfid_t))
+    &&  check_param_pos("CXU_REQ_ID_W", CXU_REQ_ID_W)
+    &&  check_param_pos("N_INIS", N_INIS)
+    &&  check_param_pos("N_TGTS", N_TGTS)
+    &&  check_param_pos2exp("N_REQS", N_REQS)
+    &&  check_param_2("REORDER", REORDER, 0, 1));
+`ifdef SWITCH_L3_CXU_CORE_VCD
+    `CXU_WAVES(switch_l3_cxu_core, "switch_l3_cxu_core.vcd")
+`endif
+
+    localparam int INI_W        = $clog2(N_INIS);
+    localparam int TGT_W        = $clog2(N_TGTS);
+    localparam int SLOT_W       = $clog2(N_REQS);
+    typedef `V(CXU_CXU_ID_W)    cxu_id_t;
+    typedef `V(N_INIS)          ini_mask_t;
+    typedef `V(N_TGTS)          tgt_mask_t;
+    typedef `V(INI_W)           ini_t;
+    typedef `V(TGT_W)           tgt_t;
+    typedef `V(CXU_REQ_ID_W)    id_t;
+    typedef `V(SLOT_W)          slot_t;
+    typedef `V($clog2(N_REQS+1)) n_req_t;
+
+    // Unlike switch_cxu_core, an initiator's request is eligible to transfer to its target
+    // whenever the initiator has fewer than N_REQS requests in flight, on any targets, so a
+    // request to a fast target need not await the responses of earlier requests to a slow one.
+    // Each target's responses are in order of its requests, so a per-target queue of the
+    // (initiator, request id, reorder slot) of each request in flight upon it tags each target
+    // response. Each cycle, each initiator accepts one tagged response (round robin across
+    // its targets), and with REORDER=0 returns it, with its resp_id, out of request order; or
+    // with REORDER=1, writes it to its slot of the initiator's N_REQS entry reorder buffer,
+    // allocated in request order, from which responses return in request order (a cycle later).
+
+    typedef struct packed {
+        ini_t   ini;
+        id_t    id;
+        slot_t  slot;
+    } tag_t;                            // a target request's initiator, request id, reorder slot
+
+    // state
+    `NV(N_INIS, $clog2(N_REQS+1)) i_n_reqs;   // initiators' #s of requests in flight
+    `NV(N_INIS, SLOT_W)     i_tails;    // initiators' next reorder slots
+    `NV(N_INIS, TGT_W)      i_tgts;     // initiators' latest response targets
+    `NV(N_TGTS, INI_W)      t_inis;     // targets' latest initiators
+    `NV(N_TGTS, $clog2(N_REQS+1)) t_n_reqs;   // targets' #s of requests in flight (tags queued)
+
+    function bit i_eligible(int i);
+        return i_n_reqs[i] != n_req_t'(N_REQS);
+    endfunction
+
+    // comb
+    `V(N_TGTS)          t_xfers;        // targets' request transfer enables
+    `NV(N_TGTS, INI_W)  t_inis_nxt;     // targets' next initiators
+    `V(N_INIS)          i_accs;         // initiators' target response accepts
+    `NV(N_INIS, TGT_W)  i_tgts_nxt;     // initiators' accepted response targets
+    `V(N_TGTS)          t_readys;       // which targets' tag queues have room for new requests?
+    `V(N_TGTS)          t_tag_valids;   // targets' tag queues' heads valid?
+    tag_t               t_tags[N_TGTS]; // targets' tag queues' heads
+
+    // valid-ready handshakes
+    `V(N_INIS)          i_req_hss;      // initiators' request  handshakes
+    `V(N_INIS)          i_resp_hss;     // initiators' response handshakes
+    `V(N_TGTS)          t_resp_hss;     // targets'    response handshakes
+    `V(N_INIS)          i_resp_avails;  // initiators' response availables
+    `V(N_TGTS)          t_req_avails;   // targets'    request  availables
+    always_comb begin
+        i_req_hss     =  i_req_valids  & i_req_readys;
+        i_resp_hss    =  i_resp_valids & i_resp_readys;
+        t_resp_hss    =  t_resp_valids & t_resp_readys;
+        i_resp_avails = ~i_resp_valids | i_resp_readys;
+        t_req_avails  = ~t_req_valids  | t_req_readys;
+    end
+
+    // maintain initiator #-reqs and reorder slot state, and target #-reqs
+    always_ff @(posedge clk) begin
+        if (rst) begin
+            i_n_reqs <= '0;
+            i_tails  <= '0;
+            t_n_reqs <= '0;
+        end
+        else if (clk_en) begin
+            for (int i = 0; i < N_INIS; ++i) begin
+                if (i_req_hss[i] != i_resp_hss[i])
+                    i_n_reqs[i] <= i_req_hss[i] ? (i_n_reqs[i] + 1'b1) : (i_n_reqs[i] - 1'b1);
+                if (i_req_hss[i])
+                    i_tails[i] <= slot_t'((int'(i_tails[i]) + 1) % N_REQS);
+            end
+            for (int t = 0; t < N_TGTS; ++t)
+                if (t_xfers[t] != t_resp_hss[t])
+                    t_n_reqs[t] <= t_xfers[t] ? (t_n_reqs[t] + 1'b1) : (t_n_reqs[t] - 1'b1);
+        end
+    end
+
+    // per-target tag queues, enqueued as requests transfer to their target request ports.
+    // A queue has room if it is not full or is dequeuing, as its i_ready; but count its tags
+    // in t_n_reqs rather than use i_ready, upon which t_xfers, its i_valid, would depend.
+    always_comb begin
+        for (int t = 0; t < N_TGTS; ++t)
+            t_readys[t] = t_n_reqs[t] != n_req_t'(N_REQS) || t_resp_hss[t];
+    end
+    `V(N_TGTS)          q_readys;       // (unused)
+    wire _unused_ok = &{1'b0,q_readys,1'b0};
+    for (genvar t = 0; t < N_TGTS; ++t) begin : qs
+        tag_t   tag;
+        always_comb begin
+            tag.ini  = t_inis_nxt[t];
+            tag.id   = i_req_ids[t_inis_nxt[t]];
+            tag.slot = i_tails[t_inis_nxt[t]];
+        end
+        queue #(.W($bits(tag_t)), .N(N_REQS))
+        q(.clk, .rst, .clk_en, .i_valid(t_xfers[t]), .i_ready(q_readys[t]), .i(tag),
+          .o_valid(t_tag_valids[t]), .o_ready(t_resp_hss[t]), .o(t_tags[t]));
+    end
+
+    // round robin priority encode first set bit in {vector[last+1..W-1],vector[0..last]}
+    function automatic ini_t i_pri_enc(ini_mask_t vector, ini_t last);
+        ini_t ini = 0;
+        bit found = 0;
+        for (int pass = 0; pass < 2; ++pass) begin
+            for (int i = 0; i < N_INIS; ++i) begin
+                if (!found && (((i > last) || pass == 1) && vector[i])) begin
+                    found = 1;
+                    ini = ini_t'(i);
+                end
+            end
+        end
+        return ini;
+    endfunction
+
+    function automatic tgt_t t_pri_enc(tgt_mask_t vector, tgt_t last);
+        tgt_t tgt = 0;
+        bit found = 0;
+        for (int pass = 0; pass < 2; ++pass) begin
+            for (int t = 0; t < N_TGTS; ++t) begin
+                if (!found && (((t > last) || pass == 1) && vector[t])) begin
+                    found = 1;
+                    tgt = tgt_t'(t);
+                end
+            end
+        end
+        return tgt;
+    endfunction
+
+    // downstream: arbitrate initiator requests for target request ports
+    always_comb begin
+        i_req_readys = '0;
+        t_xfers      = '0;
+        t_inis_nxt   = '0;
+
+        // for each available target request port, use fair (round-robin) arbitration to
+        // select a valid eligible initiator request destined for that port
+        for (int t = 0; t < N_TGTS; ++t) begin
+            ini_mask_t  i_req_mask;
+            ini_t       ini;
+
+            i_req_mask = '0;
+            for (int i = 0; i < N_INIS; ++i)
+                if (i_req_valids[i] && i_req_cxus[i] == cxu_id_t'(t) && i_eligible(i))
+                    i_req_mask[i] = 1;
+            ini = i_pri_enc(i_req_mask, t_inis[t]);
+            t_inis_nxt[t] = ini;
+            if (i_req_mask != 0 && t_req_avails[t] && t_readys[t]) begin
+                t_xfers[t] = 1;
+                i_req_readys[ini] = 1;
+            end
+        end
+    end
+    // downstream: send arbitrated initiator requests to target request ports
+    always_ff @(posedge clk) begin
+        if (rst) begin
+            t_inis       <= '0;
+            t_req_valids <= '0;         // necessary
+            t_req_cxus   <= '0;         // rest optional
+            t_req_states <= '0;
+            t_req_funcs  <= '0;
+            t_req_insns  <= '0;
+            t_req_data0s <= '0;
+            t_req_data1s <= '0;
+        end
+        else if (clk_en) begin
+            for (int t = 0; t < N_TGTS; ++t) begin
+                if (t_xfers[t]) begin
+                    // transfer initiator request to target output port
+                    t_inis[t]       <= ini_t'(t_inis_nxt[t]);
+                    t_req_valids[t] <= 1;
+                    t_req_cxus[t]   <= '0; // remap to singleton leaf CXU (FIXME)
+                    t_req_states[t] <= i_req_states[t_inis_nxt[t]];
+                    t_req_funcs[t]  <= i_req_funcs [t_inis_nxt[t]];
+                    t_req_insns[t]  <= i_req_insns [t_inis_nxt[t]];
+                    t_req_data0s[t] <= i_req_data0s[t_inis_nxt[t]];
+                    t_req_data1s[t] <= i_req_data1s[t_inis_nxt[t]];
+                end
+                else if (t_req_readys[t]) begin
+                    t_req_valids[t] <= 0;
+                end
+            end
+        end
+    end
+
+    // upstream: each initiator able to take a response accepts one valid tagged target
+    // response for it, round robin across its targets
+    `V(N_INIS)          i_takes;        // initiators' able to take a target response?
+    always_comb begin
+        i_accs        = '0;
+        i_tgts_nxt    = '0;
+        t_resp_readys = '0;
+        for (int i = 0; i < N_INIS; ++i) begin
+            tgt_mask_t  t_resp_mask;
+            tgt_t       tgt;
+
+            t_resp_mask = '0;
+            for (int t = 0; t < N_TGTS; ++t)
+                if (t_resp_valids[t] && t_tag_valids[t] && t_tags[t].ini == ini_t'(i))
+                    t_resp_mask[t] = 1;
+            tgt = t_pri_enc(t_resp_mask, i_tgts[i]);
+            i_tgts_nxt[i] = tgt;
+            if (t_resp_mask != 0 && i_takes[i]) begin
+                i_accs[i] = 1;
+                t_resp_readys[tgt] = 1;
+            end
+        end
+    end
+    always_ff @(posedge clk) begin
+        if (rst)
+            i_tgts <= '0;
+        else if (clk_en) begin
+            for (int i = 0; i < N_INIS; ++i)
+                if (i_accs[i])
+                    i_tgts[i] <= i_tgts_nxt[i];
+        end
+    end
+
+    if (REORDER == 0) begin : ooo
+        // return accepted responses directly, tagged with their request ids
+        assign i_takes = i_resp_avails;
+
+        always_ff @(posedge clk) begin
+            if (rst) begin
+                i_resp_valids  <= '0;   // necessary
+                i_resp_ids     <= '0;   // rest optional
+                i_resp_statuss <= '0;
+                i_resp_datas   <= '0;
+            end
+            else if (clk_en) begin
+                for (int i = 0; i < N_INIS; ++i) begin
+                    if (i_accs[i]) begin
+                        i_resp_valids[i]  <= 1;
+                        i_resp_ids[i]     <= t_tags[i_tgts_nxt[i]].id;
+                        i_resp_statuss[i] <= t_resp_statuss[i_tgts_nxt[i]];
+                        i_resp_datas[i]   <= t_resp_datas[i_tgts_nxt[i]];
+                    end
+                    else if (i_resp_readys[i])
+                        i_resp_valids[i] <= 0;
+                end
+            end
+        end
+    end
+    else begin : rob
+        // reorder buffers: initiator i's slot s is entry i*N_REQS+s; an accepted response
+        // is written to its request's slot; each initiator's head slot's response, once
+        // written, returns in request order
+        localparam int N_ENTRIES = N_INIS * N_REQS;
+        logic               valids[N_ENTRIES];
+        id_t                ids[N_ENTRIES];
+        `V(CXU_STATUS_W)    statuss[N_ENTRIES];
+        `V(CXU_DATA_W)      datas[N_ENTRIES];
+        `NV(N_INIS, SLOT_W) heads;      // initiators' oldest reorder slots
+
+        assign i_takes = '1;            // (a request's slot is allocated as it transfers)
+
+        always_ff @(posedge clk) begin
+            if (rst) begin
+                for (int e = 0; e < N_ENTRIES; ++e)
+                    valids[e] <= 0;
+                heads          <= '0;
+                i_resp_valids  <= '0;   // necessary
+                i_resp_ids     <= '0;   // rest optional
+                i_resp_statuss <= '0;
+                i_resp_datas   <= '0;
+            end
+            else if (clk_en) begin
+                for (int i = 0; i < N_INIS; ++i) begin
+                    int h;
+                    h = i*N_REQS + int'(heads[i]);
+                    if (valids[h] && i_resp_avails[i]) begin
+                        valids[h]         <= 0;
+                        heads[i]          <= slot_t'((int'(heads[i]) + 1) % N_REQS);
+                        i_resp_valids[i]  <= 1;
+                        i_resp_ids[i]     <= ids[h];
+                        i_resp_statuss[i] <= statuss[h];
+                        i_resp_datas[i]   <= datas[h];
+                    end
+                    else if (i_resp_readys[i])
+                        i_resp_valids[i] <= 0;
+                    if (i_accs[i]) begin
+                        int e;
+                        e = i*N_REQS + int'(t_tags[i_tgts_nxt[i]].slot);
+                        valids[e]  <= 1;
+                        ids[e]     <= t_tags[i_tgts_nxt[i]].id;
+                        statuss[e] <= t_resp_statuss[i_tgts_nxt[i]];
+                        datas[e]   <= t_resp_datas[i_tgts_nxt[i]];
+                    end
+                end
+            end
+        end
+    end
+endmodule
@@ -0,0 +1,81 @@
+## switch_l3_macs_cxu_test.py: switchMxN_l3_macs_cxu (CXU-L3 switch, CXU-L2 mulacc targets) testbench
+
+'''
+Copyright (C) 2019-2023, Gray Research LLC.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+import cocotb
+
+import os
+import random
+
+from cxu_li import *
+from initiators import Initiators
+from switch_macs_cxu_test import contention_txns
+
+# testbench: every initiator concurrently issues IMulAcc requests to every target, in short
+# runs to the same target, using its own state context (state = initiator no.) in each; each
+# initiator's responses are checked by request id, in or out of order
+@cocotb.test()
+async def switch_l3_tb(dut):
+    inis = Initiators(dut, Level.l3_ooo, int(os.environ.get("CXU_N_INIS")))
+    await inis.start()
+    for frac in [1.0,0.9,0.1]:
+        await inis.reset()
+        inis.set_resp_ready_frac(frac)
+        await inis.drive([contention_txns(tb, p, random.randrange(1<<32), mean_run=2) for (p, tb) in enumerate(inis.tbs)])
+        await inis.idle()
+    await inis.stop()
+
+# cocotb-test, follows Alex Forencich's helpful examples to sweep over dut module parameters
+
+import pytest
+from simcache import run                # (vector mode and the C++ driver are single initiator)
+import switch_cxu_gen
+
+@pytest.mark.parametrize("inis", [1,2,3])
+@pytest.mark.parametrize("tgts", [1,2,3])
+@pytest.mark.parametrize("reorder", [0,1])
+@pytest.mark.parametrize("width", [32,64])
+
+def test_switch_l3_macs(inis, request, tgts, reorder, width):
+    dut = f"switch{inis}x{tgts}_l3_macs_cxu"
+    module = os.path.splitext(os.path.basename(__file__))[0]
+    parameters = {}
+    parameters['CXU_N_CXUS'] = tgts
+    parameters['CXU_N_STATES'] = inis
+    parameters['CXU_STATE_ID_W'] = (inis-1).bit_length()
+    parameters['CXU_REQ_ID_W'] = 4
+    parameters['REORDER'] = reorder
+    parameters['CXU_DATA_W'] = width
+    sim_build = os.path.join(".", "sim_build",
+        request.node.name.replace('[', '-').replace(']', ''))
+    os.makedirs(sim_build, exist_ok=True)
+    switch_cxu_gen.generate([inis, tgts], macs=True, dir=sim_build, l3=True)
+
+    run(
+        includes=["."],
+        verilog_sources=["common.svh", "cxu.svh", os.path.join(sim_build, f"{dut}.sv"),
+                         os.path.join(sim_build, f"switch{inis}x{tgts}_l3_cxu.sv"), "switch_l3_cxu_core.sv",
+                         "mulacc_l2_cxu.sv", "cvt12_cxu.sv", "mulacc_cxu.sv", "shared.sv"],
+        toplevel=dut,
+        module=module,
+        parameters=parameters,
+        defines=["SWITCH_MACS_CXU_VCD"],
+        extra_env={ 'CXU_N_INIS':str(inis), 'CXU_N_CXUS':str(tgts), 'CXU_N_STATES':str(inis),
+                    'CXU_REQ_ID_W':str(4), 'CXU_DATA_W':str(width),
+                    'CXU_VECTORS':"0", 'CXU_BACKEND':"cocotb" },
+        sim_build=sim_build
+    )
@@ -20,38 +20,100 @@ import cocotb
 from cocotb.clock import Clock
 from cocotb.handle import SimHandleBase
 from cocotb.queue import Queue
-from cocotb.triggers import FallingEdge, RisingEdge, Timer
+from cocotb.triggers import Event, FallingEdge, RisingEdge, Timer
+from cocotb.utils import get_sim_time
 import os
 import random
 
 from cxu_li import *
-from monitors import Monitor
+from monitors import CycleEngine, Monitor, Scoreboard
+import funccov
+import perf
+from probe import Probe
+import traces
+import vectors
+import waves
 
-# CXU testbench for CXU -L0, -L1 (so far)
+# CXU testbench for CXU -L0, -L1, -L2, -L3;
+# optionally drives one initiator port, e.g. port="i1_", of a multi-initiator dut,
+# with clock=False if another TB already clocks the dut
 class TB:
-    def __init__(self, dut, level):
-        self.dut      = dut
+    def __init__(self, dut, level, port="", clock=True):
+        self.dut      = Port(dut, port) if port else dut
+        self.port     = port
         self.level    = level
         self.n_cxus   = int(os.environ.get("CXU_N_CXUS", 1)) 
         self.n_bits   = int(os.environ.get("CXU_DATA_W")) 
         self.latency  = int(os.environ.get("CXU_LATENCY"))  if level == Level.l1_pipe else 0
         self.n_states = int(os.environ.get("CXU_N_STATES")) if level >  Level.l0_comb else 0
+        self.resp_ready_pct = None
         self.resp_ready_frac = 1.0
+        self.engine = None
+        self.reset_trace = None
+        self.cxu = 0
+        self.coverage = funccov.Coverage(self.n_states, self.n_bits) if funccov.enabled() else None
+
+        # vector mode: record test cases, later run by a self-checking harness wrapping the dut
+        self.vectors = vectors.Vectors(dut, level) if vectors.enabled() else None
+        if self.vectors is not None:
+            return                      # (the harness generates its own clock)
 
         # for combinational CXUs (CXU-L0) tests issue at 1 ns timesteps;
-        # for synchronous CXUs (>L0), requests and responses are monitored on posedge(clk)
+        # for synchronous CXUs (>L0), requests and responses are monitored on posedge(clk);
+        # a CXU_NATIVE_CLOCK=1 probe wrapper may generate clk and resp_ready (see probe.py)
         if level >= Level.l1_pipe:
-            cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+            dut = self.dut
+            if clock and not hasattr(dut, "clk_native"):
+                cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+            if level >= Level.l2_stream and hasattr(dut, "resp_ready_pct"):
+                self.resp_ready_pct = dut.resp_ready_pct
+                self.resp_ready_frac = self.resp_ready_frac    # (sets resp_ready_pct)
             req_ready  = dut.req_ready  if level >= Level.l2_stream else None
             resp_ready = dut.resp_ready if level >= Level.l2_stream else None
-            self.req_mon  = Monitor(clk=dut.clk, valid=dut.req_valid,  ready=req_ready,  datas=req(dut, level))
-            self.resp_mon = Monitor(clk=dut.clk, valid=dut.resp_valid, ready=resp_ready, datas=resp(dut, level))
+            trace = os.environ.get("CXU_TRACE", "0") != "0"
+            (req_datas, resp_datas) = (req(dut, level), resp(dut, level))
+            self.req_mon  = Monitor(clk=dut.clk, valid=dut.req_valid,  ready=req_ready,  datas=req_datas,
+                                    trace=traces.writer(f"{port}req.trace") if trace else None,
+                                    probe=Probe.of(dut, "req", dut.req_valid, req_ready, req_datas))
+            self.resp_mon = Monitor(clk=dut.clk, valid=dut.resp_valid, ready=resp_ready, datas=resp_datas,
+                                    trace=traces.writer(f"{port}resp.trace") if trace else None,
+                                    probe=Probe.of(dut, "resp", dut.resp_valid, resp_ready, resp_datas))
+            if trace:
+                self.reset_trace = traces.writer(f"{port}reset.trace")  # (for tlm.py crosscheck)
             self.models = Queue[(int,int)]()
-            cocotb.start_soon(self.check())
+
+            # CXU-L3: expected responses by request id, up to CXU_MAX_IDS outstanding
+            if level == Level.l3_ooo:
+                n_ids = 1 << int(os.environ.get("CXU_REQ_ID_W"))
+                self.scoreboard = Scoreboard(min(n_ids, int(os.environ.get("CXU_MAX_IDS", n_ids))))
+            self.perf = perf.PerfMonitor(dut, level) if os.environ.get("CXU_PERF", "0") != "0" else None
+
+            # opt-in: sample, check, flow control, and drive from one posedge(clk) callback per cycle
+            if os.environ.get("CXU_CYCLE_ENGINE", "0") != "0":
+                self.engine = CycleEngine(dut.clk)
+                self.drained = Event()
+            else:
+                if self.req_mon.evented():
+                    self.drained = Event()
+                cocotb.start_soon(self.check())
+
+    # CXU-L2+: the fraction of cycles resp_ready is asserted
+    @property
+    def resp_ready_frac(self):
+        return self._resp_ready_frac
+
+    @resp_ready_frac.setter
+    def resp_ready_frac(self, frac):
+        self._resp_ready_frac = frac
+        if self.resp_ready_pct is not None:
+            self.resp_ready_pct.value = round(frac * 100)
 
 
     async def start(self):
         random.seed(0) # repeatable random numbers
+        if self.vectors is not None:
+            self.vectors.reset()
+            return
 
         # setup some default request signals
         self.dut.req_valid.value = 0
@@ -61,44 +123,108 @@ class TB:
         self.dut.req_func.value = 0
         if self.level >= Level.l2_stream:
             self.dut.req_insn.value = 0
+        if self.level == Level.l3_ooo:
+            self.dut.req_id.value = 0
         self.dut.req_data0.value = 0
         self.dut.req_data1.value = 0
 
         if self.level > Level.l0_comb:
             # reset dut, start monitoring requests/responses
             await self.reset()
-            self.req_mon.start()
-            self.resp_mon.start()
+            if self.engine is not None:
+                self.engine.add(self.req_mon.tick)
+                self.engine.add(self.resp_mon.tick)
+                self.engine.add(self.check_samples)
+                if self.perf is not None:
+                    self.engine.add(self.perf.tick)
+                if self.level >= Level.l2_stream and self.resp_ready_pct is None:
+                    self.flow_control()
+                    self.engine.add(self.flow_control)
+                self.engine.start()
+            else:
+                self.req_mon.start()
+                self.resp_mon.start()
+                if self.perf is not None:
+                    self.perf.start()
 
-            if self.level >= Level.l2_stream:
-                cocotb.start_soon(self.resp_flow_control())
+                if self.level >= Level.l2_stream and self.resp_ready_pct is None:
+                    cocotb.start_soon(self.resp_flow_control())
         self.dut.req_valid.value = 1
 
     async def reset(self):
+        if self.coverage is not None:
+            self.coverage.reset()
+        if self.vectors is not None:
+            self.vectors.reset()
+            return
         self.dut.req_valid.value = 0
         self.dut.clk_en.value = 1
         self.dut.rst.value = 1
         for _ in range(2):
             await RisingEdge(self.dut.clk)
+        if self.reset_trace is not None:
+            self.reset_trace.write(int(get_sim_time(units="ns")), {})
         self.dut.rst.value = 0
         self.dut.req_valid.value = 1
 
     async def stop(self):
-        if self.level > Level.l0_comb:
+        if self.vectors is not None:
+            await self.vectors.run()
+        elif self.level > Level.l0_comb:
             await self.idle();
+            for trace in [self.req_mon.trace, self.resp_mon.trace, self.reset_trace]:
+                if trace is not None:
+                    trace.flush()
+            if self.perf is not None:
+                if self.engine is not None:
+                    self.engine.remove(self.perf.tick)
+                self.perf.stop()
+                self.dut._log.info(self.port + self.perf.summary())
+                report = self.perf.report()
+                if self.port:
+                    report["port"] = self.port
+                perf.write(report)
+            if self.level == Level.l3_ooo:
+                self.dut._log.info(self.port + self.scoreboard.summary())
+            if self.engine is not None:
+                self.dut._log.info("cycle engine: {0} cycles, {1} hook runs, saved {2} GPI callbacks".format(
+                    self.engine.cycles, self.engine.hook_runs, self.engine.saved()))
+        # (after the drain above, as responses are sampled as they are checked)
+        if self.coverage is not None and cocotb.SIM_NAME:     # (not when recording, see cppdriver.py)
+            self.dut._log.info(self.port + self.coverage.summary())
+            perf.write(self.coverage.report(), funccov.FILE)
 
     async def idle(self):
+        if self.vectors is not None:
+            return                      # (the harness drains responses before each reset)
         self.dut.req_valid.value = 0
-        while not self.models.empty():
-            await RisingEdge(self.dut.clk)
+        if self.engine is not None or self.req_mon.evented():
+            if self.pending():
+                self.drained.clear()
+                await self.drained.wait()
+        else:
+            while self.pending():
+                await RisingEdge(self.dut.clk)
+
+    # are any responses still to be checked?
+    def pending(self):
+        if self.level == Level.l3_ooo:
+            return self.scoreboard.outstanding() > 0
+        return not self.models.empty()
 
     # issue one test case to a specific CXU; response should match model
     async def test_cxu(self, cxu, state, func, data0, data1, model):
-        self.dut.req_cxu.value = cxu
+        self.cxu = cxu
+        if self.vectors is None:
+            self.dut.req_cxu.value = cxu
         await self.test(state, func, data0, data1, model)
 
     # issue one test case; response should match model
     async def test(self, state, func, data0, data1, model):
+        if self.vectors is not None:
+            await self.record(self.cxu, state, func, data0, data1, model)
+            return
+
         self.dut.req_func.value = func
         self.dut.req_data0.value = data0
         self.dut.req_data1.value = data1
@@ -106,13 +232,18 @@ class TB:
         if self.level == Level.l0_comb:
             # check answer immediately
             await Timer(1, units="ns")
+            if not (self.dut.resp_status == Status.CXU_OK and self.dut.resp_data == model):
+                waves.failed()
+            elif self.coverage is not None:
+                self.coverage.sample(0, func, data0, data1, Status.CXU_OK, model)
             assert (self.dut.resp_status == Status.CXU_OK and self.dut.resp_data == model), \
                 "test({0:1d},{1:08x},{2:08x}) => {3:08x} != {4:08x}".format( \
                     func, data0, data1, self.dut.resp_data.integer, model)
         else:
             # monitoring captures request and response, later checked in self.check()
-            self.dut.req_state.value = state
-            self.models.put_nowait((0, model))
+            if self.level == Level.l3_ooo:
+                await self.free_id()
+            self.present(self.cxu, state, func, data0, data1, model)
 
             # CXU-L2+: await req_ready (sampled on negedge clk)
             if self.level >= Level.l2_stream:
@@ -123,22 +254,191 @@ class TB:
 
             await RisingEdge(self.dut.clk)
 
+    # issue a stream of test cases back-to-back, one per cycle whenever req_ready allows;
+    # txns is an iterable, or a Queue terminated by None, of (cxu,state,func,data0,data1,model)
+    async def drive(self, txns):
+        if self.coverage is not None and not isinstance(txns, Queue):
+            txns = self.coverage.until(txns, funccov.target())
+        if self.vectors is not None:
+            async for txn in self.stream(txns):
+                await self.record(*txn)
+            return
+
+        if self.level == Level.l0_comb:
+            async for (cxu, state, func, data0, data1, model) in self.stream(txns):
+                await self.test_cxu(cxu, state, func, data0, data1, model)
+            return
+
+        if self.engine is not None:
+            # CycleEngine: drive_tick() presents each next test case
+            self.txns = txns if isinstance(txns, Queue) else iter(txns)
+            if self.next_txn():
+                self.driven = Event()
+                self.engine.add(self.drive_tick)
+                await self.driven.wait()
+            return
+
+        async for txn in self.stream(txns):
+            if self.level == Level.l3_ooo:
+                await self.free_id()
+            self.present(*txn)
+
+            # request is handshaken on the first posedge clk at which req_ready (CXU-L2+)
+            if self.req_mon.evented():
+                await self.req_mon.handshake()
+                continue
+            await RisingEdge(self.dut.clk)
+            if self.level >= Level.l2_stream:
+                while self.dut.req_ready.value != 1:
+                    await RisingEdge(self.dut.clk)
+        # (rather than reissue the last request, e.g. while other initiators are still driving)
+        self.dut.req_valid.value = 0
+
+    # vector mode: record one test case, running the harness whenever the records are full
+    async def record(self, cxu, state, func, data0, data1, model):
+        if self.coverage is not None:
+            self.coverage.sample(state, func, data0, data1, Status.CXU_OK, model)
+        self.vectors.request(cxu, state, func, data0, data1, Status.CXU_OK, model, self.resp_ready_frac)
+        if self.vectors.full():
+            await self.vectors.run()
+
+    # present one test case's request
+    def present(self, cxu, state, func, data0, data1, model):
+        self.dut.req_valid.value = 1
+        self.dut.req_cxu.value = cxu
+        self.dut.req_state.value = state
+        self.dut.req_func.value = func
+        self.dut.req_data0.value = data0
+        self.dut.req_data1.value = data1
+        if self.level == Level.l3_ooo:
+            req = { 'state':state, 'func':func, 'data0':data0, 'data1':data1 }
+            self.dut.req_id.value = self.scoreboard.issue((req, 0, model))
+        else:
+            self.models.put_nowait((0, model))
+
+    # CXU-L3: await a free request id, negating req_valid meanwhile
+    async def free_id(self):
+        while self.scoreboard.full():
+            self.dut.req_valid.value = 0
+            await RisingEdge(self.dut.clk)
+
+    # CycleEngine: present the next test case from self.txns, if any; False at end of stream
+    def next_txn(self):
+        if isinstance(self.txns, Queue):
+            if self.txns.empty():
+                self.dut.req_valid.value = 0
+                self.presented = False
+                return True
+            txn = self.txns.get_nowait()
+        else:
+            txn = next(self.txns, None)
+        if txn is None:
+            return False
+        self.present(*txn)
+        self.presented = True
+        return True
+
+    # CycleEngine hook: once the presented request is handshaken, present the next one
+    def drive_tick(self):
+        if self.presented and self.level >= Level.l2_stream and self.dut.req_ready.value != 1:
+            return
+        if self.level == Level.l3_ooo and self.scoreboard.full():
+            self.dut.req_valid.value = 0
+            self.presented = False
+            return
+        if not self.next_txn():
+            self.dut.req_valid.value = 0
+            self.engine.remove(self.drive_tick)
+            self.driven.set()
+
+    # yield test cases from an iterable, or from a Queue until None;
+    # while a Queue is empty, negate req_valid rather than reissue the last request
+    async def stream(self, txns):
+        if isinstance(txns, Queue):
+            while True:
+                if txns.empty() and self.level > Level.l0_comb and self.vectors is None:
+                    self.dut.req_valid.value = 0
+                txn = await txns.get()
+                if txn is None:
+                    return
+                yield txn
+        else:
+            for txn in txns:
+                yield txn
+
     # check actual requests/responses match model responses
     async def check(self):
         while True:
+            if self.level == Level.l3_ooo:
+                self.check_ooo(await self.resp_mon.values.get())
+                continue
             req = await self.req_mon.values.get()
             resp = await self.resp_mon.values.get()
-            state = req['state'].integer if self.level > Level.l0_comb else 0
             (status,data) = await self.models.get()
+            self.check_one(req, resp, status, data)
+            if self.req_mon.evented() and not self.pending():
+                self.drained.set()
+
+    # CycleEngine hook: check each request/response pair completed this cycle
+    def check_samples(self):
+        while not self.resp_mon.values.empty():
+            if self.level == Level.l3_ooo:
+                self.check_ooo(self.resp_mon.values.get_nowait())
+                continue
+            req = self.req_mon.values.get_nowait()
+            resp = self.resp_mon.values.get_nowait()
+            (status,data) = self.models.get_nowait()
+            self.check_one(req, resp, status, data)
+        if not self.pending():
+            self.drained.set()
 
-            assert (resp['status'] == status and resp['data'] == data), \
-                "test({0},{1:2d},{2:08x},{3:08x}) => {4:1d}:{5:08x} != {6:1d}:{7:08x}".format( \
-                    state, req['func'].integer, req['data0'].integer, req['data1'].integer, \
-                    resp['status'].integer, resp['data'].integer, status, data)
+    # CXU-L3: check a response against its request id's model response
+    def check_ooo(self, resp):
+        while not self.req_mon.values.empty():
+            self.req_mon.values.get_nowait()    # (requests are kept in the scoreboard instead)
+        try:
+            (req, status, data) = self.scoreboard.complete(resp['id'].integer)
+        except KeyError as e:
+            waves.failed()
+            assert False, str(e)
+        self.check_one(req, resp, status, data)
+
+    # check one actual request/response matches its model response
+    def check_one(self, req, resp, status, data):
+        def integer(value):             # (monitored values, or probe or CXU-L3 scoreboard ints)
+            return value if isinstance(value, int) else value.integer
+        state = integer(req['state']) if self.level > Level.l0_comb else 0
+        if not (resp['status'] == status and resp['data'] == data):
+            waves.failed()
+        elif self.coverage is not None:
+            self.coverage.sample(state, integer(req['func']), integer(req['data0']), integer(req['data1']),
+                                 status, data)
+        assert (resp['status'] == status and resp['data'] == data), \
+            "test({0},{1:2d},{2:08x},{3:08x}) => {4:1d}:{5:08x} != {6:1d}:{7:08x}".format( \
+                state, integer(req['func']), integer(req['data0']), integer(req['data1']), \
+                integer(resp['status']), integer(resp['data']), status, data)
 
     # CXU-L2+: initiator performs response flow control, randomly adjusting self.dut.resp_ready,
     # per self.resp_ready_frac
     async def resp_flow_control(self):
         while True:
-            self.dut.resp_ready.value = int(random.random() < self.resp_ready_frac)
+            self.flow_control()
             await RisingEdge(self.dut.clk)
+
+    # (also a CycleEngine hook)
+    def flow_control(self):
+        self.dut.resp_ready.value = int(random.random() < self.resp_ready_frac)
+
+# Port: one initiator port of a multi-initiator dut, as a dut: its signals are those of
+# the dut prefixed by the port prefix, except the shared clock and reset signals
+class Port:
+    SHARED = { "clk", "clk_en", "rst" }
+
+    def __init__(self, dut, prefix):
+        self._dut = dut
+        self._prefix = prefix
+
+    def __getattr__(self, name):
+        if name in Port.SHARED or name.startswith("_"):
+            return getattr(self._dut, name)
+        return getattr(self._dut, self._prefix + name)
@@ -0,0 +1,735 @@
+## tlm.py: cycle-accurate Python transaction-level models of the zoo CXUs
+
+'''
+Copyright (C) 2019-2023, Gray Research LLC.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+# Each model mirrors its RTL register for register, stepping one clock cycle per call, so its
+# responses match the RTL's in value and in cycle: mulacc_cxu and dotprod_cxu (CXU_LATENCY
+# pipelines, state contexts), cvt01/02/12_cxu (cvt12's CXU_FIFO_SIZE response queue and
+# req_ready backpressure), queue, switch_cxu_core (the eligibility rule, round robin
+# arbitration, and per-target initiator queues), and switch_l3_cxu_core (per-target request
+# id tag queues and reorder buffers), and their compositions, e.g. mulacc_l2_cxu,
+# bnn_l1_l2_cxu, muxN_macs_cxu, switchMxN_macs_cxu, switchMxN_l3_macs_cxu. A composition's
+# models take the parameters its RTL instances are given: e.g. `CXU_L1_PARAMS_MAP does not map
+# CXU_LATENCY, so bnn_l1_l2_cxu's cvt01_cxu has latency 0, and its CXU_LATENCY only sizes its
+# cvt12_cxu's queue. tlm_test.py checks the models against CXU_TRACE=1 RTL runs (see
+# crosscheck() below). Models compose as their RTL modules do:
+#
+#   CXU-L0: a function of a request (cxu,state,func,data0,data1) => response (status,data)
+#   CXU-L1: step(req) => this cycle's response, or None; req is None when req_valid is negated
+#   CXU-L2: step(req, resp_ready) => (request handshaken?, this cycle's response handshake or
+#           None); and, for an enclosing model, resp, this cycle's (registered) response, or
+#           None, and req_ready(resp_ready)
+#   CXU-L3: as CXU-L2, with requests (cxu,state,func,data0,data1,id), responses (status,data,id)
+#
+# With CXU_BACKEND=tlm, a test_*() runs its module's testbenches' recorded test cases (as for
+# CXU_BACKEND=cpp, see cppdriver.py) through its dut's model instead of an HDL simulator, driven
+# as the C++ driver drives them, with the same xorshift resp_ready backpressure, so each
+# response's cycle should also match the C++ driver's; then checks them as cppdriver.py does.
+#
+# usage: python3 tlm.py bench [bench ...]      run speed_bench.py's configurations' test cases
+#        python3 tlm.py switch [-p 2 2] [-l latency] [-d depths] [-f resp_ready fractions]
+#                                              explore switchMxN_macs_cxu configurations
+#        python3 tlm.py crosscheck <nodeid> [-d dir]
+#                                              replay a CXU_TRACE=1 run's request trace through
+#                                              the model, comparing responses and their cycles
+
+import argparse
+from collections import deque
+import numpy as np
+import os
+import re
+import sys
+import time
+from types import SimpleNamespace
+
+from cxu_li import *
+import cppdriver
+import traces
+import vectors
+
+def enabled():
+    return os.environ.get("CXU_BACKEND", "cocotb") == "tlm"
+
+def clog2(n):
+    return (n - 1).bit_length() if n > 1 else 0
+
+OK, ERROR_STATE, ERROR_OFF, ERROR_FUNC = (int(s) for s in (Status.CXU_OK, Status.CXU_ERROR_STATE,
+                                                          Status.CXU_ERROR_OFF, Status.CXU_ERROR_FUNC))
+WRITE_STATE, READ_STATE, WRITE_STATUS, READ_STATUS = (int(f) for f in IStateContext)
+OFF, INIT, CLEAN, DIRTY = (int(cs) for cs in CS)
+CSW = 1 << 2                            # (IStateContext: 1 word of state, no custom error)
+
+
+# CXU-L0 popcount_cxu
+def popcount(n_bits):
+    mask = (1 << n_bits) - 1
+    return lambda req: (OK, (req[3] & mask).bit_count())
+
+# CXU-L0 bnn_cxu: popcount(xnor(data0,data1))
+def bnn(n_bits):
+    mask = (1 << n_bits) - 1
+    return lambda req: (OK, (~(req[3] ^ req[4]) & mask).bit_count())
+
+
+# queue: an N entry FIFO, or when N==1, a stream register; o is registered, i_ready forwards o_ready
+class Queue:
+    def __init__(self, n):
+        self.n = n
+        self.items = deque()
+
+    def reset(self):
+        self.items.clear()
+
+    # o (when o_valid), else None
+    @property
+    def head(self):
+        return self.items[0] if self.items else None
+
+    def ready(self, o_ready):
+        return len(self.items) < self.n or o_ready
+
+    # enqueue i (unless None, and only if ready(o_ready)); dequeue the head if o_ready
+    def step(self, i, o_ready):
+        if o_ready and self.items:
+            self.items.popleft()
+        if i is not None:
+            self.items.append(i)
+
+
+# CXU-L1 mulacc_cxu: IMulAcc and IStateContext, with CXU_N_STATES state contexts, and
+# CXU_LATENCY pipeline stages between the product and the state update and response
+class MulAcc:
+    def __init__(self, n_states=1, n_bits=32, latency=0):
+        self.n_states = n_states
+        self.mask = (1 << n_bits) - 1
+        self.latency = latency
+        self.reset()
+
+    # (reset clears the pipeline too, as draining it before each reset does)
+    def reset(self):
+        self.pipe = deque([None] * self.latency)
+        self.css = [INIT] * self.n_states
+        self.zaccs = [True] * self.n_states
+        self.accs = [0] * self.n_states
+
+    # the pipelined product; for IStateContext writes, data0*1
+    def op(self, func, data0, data1):
+        if func == WRITE_STATUS or func == WRITE_STATE:
+            return data0
+        return (data0 * data1) & self.mask
+
+    def step(self, req):
+        entry = None
+        if req is not None:
+            (_, state, func, data0, data1) = req
+            data0 &= self.mask
+            entry = (func, state, self.op(func, data0, data1 & self.mask), data0)
+        if self.latency:
+            self.pipe.append(entry)
+            entry = self.pipe.popleft()
+        return None if entry is None else self.respond(*entry)
+
+    # respond to a request emerging from the pipeline, updating its state context
+    def respond(self, func, state_raw, x, wr_data):
+        state = state_raw if state_raw < self.n_states else 0
+        cs = self.css[state]
+        acc = 0 if self.zaccs[state] else self.accs[state]
+        (status, wr) = (OK, True)
+        if func == 0:
+            data = x
+        elif func == 1:
+            data = (acc + x) & self.mask
+        elif func == READ_STATUS:
+            (data, wr) = (CSW | cs, False)
+        elif func == WRITE_STATUS:
+            data = CSW | cs
+        elif func == READ_STATE:
+            (data, wr) = (acc, False)
+        elif func == WRITE_STATE:
+            data = wr_data
+        else:
+            (data, status, wr) = (x, ERROR_FUNC, False)
+
+        if state_raw >= self.n_states:
+            (status, wr) = (ERROR_STATE, False)
+        elif cs == OFF and func != READ_STATUS and func != WRITE_STATUS:
+            (status, wr) = (ERROR_OFF, False)
+
+        if wr:
+            if func == WRITE_STATUS:
+                cs = wr_data & 3
+                self.css[state] = cs
+                if cs == OFF or cs == INIT:
+                    self.zaccs[state] = True
+            else:
+                self.css[state] = DIRTY
+                self.zaccs[state] = False
+                self.accs[state] = data
+        return (status, data)
+
+# CXU-L1 dotprod_cxu: IDotProd, as MulAcc, of the elementwise dot product of ELEM_W-bit
+# lanes, summed in DOTP_W bits
+class DotProd(MulAcc):
+    def __init__(self, n_states=1, n_bits=32, latency=0, elem_w=8):
+        super().__init__(n_states, n_bits, latency)
+        self.elem_w = elem_w
+        self.elem_mask = (1 << elem_w) - 1
+        self.shifts = range(0, n_bits, elem_w)
+        self.dotp_mask = (1 << min(2*elem_w + clog2(n_bits // elem_w), n_bits)) - 1
+
+    def op(self, func, data0, data1):
+        m = self.elem_mask
+        return sum(((data0 >> s) & m) * ((data1 >> s) & m) for s in self.shifts) & self.dotp_mask
+
+
+# CXU-L1 cvt01_cxu: a CXU-L0 target, its response delayed CXU_LATENCY cycles
+class Cvt01:
+    def __init__(self, target, latency=0):
+        self.target = target
+        self.latency = latency
+        self.reset()
+
+    def reset(self):
+        self.pipe = deque([None] * self.latency)
+
+    def step(self, req):
+        resp = None if req is None else self.target(req)
+        if self.latency:
+            self.pipe.append(resp)
+            resp = self.pipe.popleft()
+        return resp
+
+# CXU-L2 cvt02_cxu: a CXU-L0 target, its response registered
+class Cvt02:
+    def __init__(self, target):
+        self.target = target
+        self.reset()
+
+    def reset(self):
+        self.resp = None
+
+    def req_ready(self, resp_ready):
+        return self.resp is None or resp_ready
+
+    def step(self, req, resp_ready):
+        resp = self.resp
+        req_hs = req is not None and (resp is None or resp_ready)
+        resp_hs = resp if resp_ready else None
+        if req_hs:
+            self.resp = self.target(req)
+        elif resp_ready:
+            self.resp = None
+        return (req_hs, resp_hs)
+
+# CXU-L2 cvt12_cxu: a CXU-L1 target, its responses queued in a CXU_FIFO_SIZE entry queue;
+# req_ready negated while CXU_FIFO_SIZE requests are pending
+class Cvt12:
+    def __init__(self, target, latency=0, fifo_size=None):
+        self.target = target
+        self.fifo_size = fifo_size or max(1, 1 << clog2(latency))
+        self.q = Queue(self.fifo_size)
+        self.reset()
+
+    def reset(self):
+        self.target.reset()
+        self.q.reset()
+        self.count = 0
+
+    @property
+    def resp(self):
+        return self.q.head
+
+    def req_ready(self, resp_ready):
+        return self.count != self.fifo_size
+
+    def step(self, req, resp_ready):
+        req_hs = req is not None and self.count != self.fifo_size
+        resp_hs = self.q.head if resp_ready else None
+        self.q.step(self.target.step(req if req_hs else None), resp_ready)
+        self.count += req_hs - (resp_hs is not None)
+        return (req_hs, resp_hs)
+
+# CXU-L2 mulacc_l2_cxu: cvt12_cxu + mulacc_cxu, both of CXU_LATENCY
+def mulacc_l2(n_states=1, n_bits=32, latency=0, fifo_size=None):
+    return Cvt12(MulAcc(n_states, n_bits, latency), latency, fifo_size or 1 << clog2(1 + latency))
+
+
+# switch_cxu_core, and its CXU-L2 targets: N_INIS initiators' requests switched to the
+# targets by req_cxu, N_REQS in flight per initiator, and their responses returned in order;
+#   step(reqs, resp_readys) => ([request handshaken?], [response handshake or None]), per initiator
+class Switch:
+    def __init__(self, targets, n_inis=1, n_reqs=16):
+        self.targets = targets
+        self.n_inis = n_inis
+        self.n_reqs = n_reqs
+        self.n_reqs_mod = 1 << max(clog2(n_reqs), 1)    # (i_n_reqs[i] is `V(N_REQS_W) bits)
+        self.reset()
+
+    def reset(self):
+        (n, m) = (self.n_inis, len(self.targets))
+        self.i_n_reqs = [0] * n         # initiators' #s of requests in flight
+        self.i_tgts = [0] * n           # initiators' latest targets
+        self.i_resps = [None] * n       # initiators' registered responses
+        self.t_inis = [0] * m           # targets' latest initiators
+        self.t_reqs = [None] * m        # targets' registered requests
+        self.qs = [Queue(self.n_reqs) for _ in range(m)] if n > 1 else None
+        for target in self.targets:
+            target.reset()
+
+    def eligible(self, i, t):
+        n = self.i_n_reqs[i]
+        return n == 0 or (n != (self.n_reqs - 1) % self.n_reqs_mod and self.i_tgts[i] == t)
+
+    # round robin: the first of the initiators after last, else the first
+    @staticmethod
+    def arbitrate(inis, last):
+        return next((i for i in inis if i > last), inis[0])
+
+    def step(self, reqs, resp_readys):
+        (targets, qs, n_inis) = (self.targets, self.qs, self.n_inis)
+        resp_hss = [resp if ready else None for (resp, ready) in zip(self.i_resps, resp_readys)]
+
+        # upstream: accept a valid target response if its initiator is available and the
+        # response is that initiator's
+        t_resps = [target.resp for target in targets]
+        t_resp_readys = [False] * len(targets)
+        i_xfers = [None] * n_inis
+        for i in range(n_inis):
+            t = self.i_tgts[i]
+            if (self.i_resps[i] is None or resp_readys[i]) and (qs is None or qs[t].head == i) \
+               and t_resps[t] is not None:
+                i_xfers[i] = t_resps[t]
+                t_resp_readys[t] = True
+        t_readys = [True] * len(targets) if qs is None else \
+                   [q.ready(t_resps[t] is not None and t_resp_readys[t]) for (t, q) in enumerate(qs)]
+
+        # downstream: arbitrate valid eligible initiator requests for available target ports
+        req_hss = [False] * n_inis
+        t_xfers = {}
+        for (t, target) in enumerate(targets):
+            if not (self.t_reqs[t] is None or target.req_ready(t_resp_readys[t])) or not t_readys[t]:
+                continue
+            inis = [i for i in range(n_inis)
+                    if reqs[i] is not None and reqs[i][0] == t and self.eligible(i, t)]
+            if inis:
+                ini = self.arbitrate(inis, self.t_inis[t])
+                req_hss[ini] = True
+                t_xfers[t] = ini
+
+        # step the targets, then update state
+        for (t, target) in enumerate(targets):
+            (t_req_hs, _) = target.step(self.t_reqs[t], t_resp_readys[t])
+            if qs is not None:
+                qs[t].step(self.t_inis[t] if t_req_hs else None, t_resp_readys[t])
+            if t in t_xfers:
+                ini = t_xfers[t]
+                self.t_inis[t] = ini
+                self.t_reqs[t] = (0,) + tuple(reqs[ini][1:])   # (remapped to singleton leaf CXU)
+            elif t_req_hs:
+                self.t_reqs[t] = None
+        for i in range(n_inis):
+            if req_hss[i] != (resp_hss[i] is not None):
+                self.i_n_reqs[i] = (self.i_n_reqs[i] + (1 if req_hss[i] else -1)) % self.n_reqs_mod
+            if req_hss[i]:
+                self.i_tgts[i] = reqs[i][0]
+            if i_xfers[i] is not None:
+                self.i_resps[i] = i_xfers[i]
+            elif resp_readys[i]:
+                self.i_resps[i] = None
+        return (req_hss, resp_hss)
+
+# switchMxN_macs_cxu: switch_cxu_core to N mulacc_l2_cxus of M state contexts, target p's
+# CXU_LATENCY LATENCY + 2*p
+def switch_macs(n_inis, n_tgts, n_bits=32, latency=1, n_reqs=16):
+    return Switch([mulacc_l2(n_inis, n_bits, latency + 2*p) for p in range(n_tgts)], n_inis, n_reqs)
+
+# switch_l3_cxu_core, and its CXU-L2 targets: N_INIS CXU-L3 initiators' requests, each
+# (cxu,state,func,data0,data1,id), switched to the targets by req_cxu, N_REQS in flight per
+# initiator on any targets, and their responses, each (status,data,id), returned out of order,
+# or, with reorder, in request order through per-initiator reorder buffers;
+#   step(reqs, resp_readys) => ([request handshaken?], [response handshake or None]), per initiator
+class SwitchL3(Switch):
+    def __init__(self, targets, n_inis=1, n_reqs=16, reorder=False):
+        self.reorder = reorder
+        super().__init__(targets, n_inis, n_reqs)
+
+    def reset(self):
+        super().reset()
+        (n, m) = (self.n_inis, len(self.targets))
+        self.i_tails = [0] * n          # initiators' next reorder slots
+        self.i_tgts = [0] * n           # initiators' latest response targets
+        self.qs = [Queue(self.n_reqs) for _ in range(m)]    # targets' (ini, id, slot) tags
+        self.robs = [[None] * self.n_reqs for _ in range(n)]
+        self.heads = [0] * n            # initiators' oldest reorder slots
+
+    def eligible(self, i, t):
+        return self.i_n_reqs[i] != self.n_reqs
+
+    def step(self, reqs, resp_readys):
+        (targets, qs, n_inis) = (self.targets, self.qs, self.n_inis)
+        resp_hss = [resp if ready else None for (resp, ready) in zip(self.i_resps, resp_readys)]
+        avails = [resp is None or ready for (resp, ready) in zip(self.i_resps, resp_readys)]
+
+        # upstream: each initiator able to take a response accepts one valid tagged target
+        # response for it, round robin across its targets
+        t_resps = [target.resp for target in targets]
+        t_resp_readys = [False] * len(targets)
+        i_accs = [None] * n_inis
+        for i in range(n_inis):
+            tgts = [t for (t, q) in enumerate(qs) if t_resps[t] is not None and q.head is not None and q.head[0] == i]
+            if tgts and (self.reorder or avails[i]):
+                i_accs[i] = self.arbitrate(tgts, self.i_tgts[i])
+                t_resp_readys[i_accs[i]] = True
+        t_readys = [q.ready(t_resp_readys[t]) for (t, q) in enumerate(qs)]
+
+        # downstream: arbitrate valid eligible initiator requests for available target ports
+        req_hss = [False] * n_inis
+        t_xfers = {}
+        for (t, target) in enumerate(targets):
+            if not (self.t_reqs[t] is None or target.req_ready(t_resp_readys[t])) or not t_readys[t]:
+                continue
+            inis = [i for i in range(n_inis)
+                    if reqs[i] is not None and reqs[i][0] == t and self.eligible(i, t)]
+            if inis:
+                ini = self.arbitrate(inis, self.t_inis[t])
+                req_hss[ini] = True
+                t_xfers[t] = ini
+
+        # step the targets, then update state
+        accepts = []
+        for (t, target) in enumerate(targets):
+            (t_req_hs, _) = target.step(self.t_reqs[t], t_resp_readys[t])
+            tag = None
+            if t in t_xfers:
+                ini = t_xfers[t]
+                tag = (ini, reqs[ini][5], self.i_tails[ini])
+                self.t_inis[t] = ini
+                self.t_reqs[t] = (0,) + tuple(reqs[ini][1:5])   # (remapped to singleton leaf CXU)
+            elif t_req_hs:
+                self.t_reqs[t] = None
+            if t_resp_readys[t]:
+                accepts.append((qs[t].head, t_resps[t]))
+            qs[t].step(tag, t_resp_readys[t])
+        for i in range(n_inis):
+            if req_hss[i] != (resp_hss[i] is not None):
+                self.i_n_reqs[i] += 1 if req_hss[i] else -1
+            if req_hss[i]:
+                self.i_tails[i] = (self.i_tails[i] + 1) % self.n_reqs
+            if i_accs[i] is not None:
+                self.i_tgts[i] = i_accs[i]
+            head = self.robs[i][self.heads[i]] if self.reorder else None
+            if head is not None and avails[i]:
+                self.i_resps[i] = head
+                self.robs[i][self.heads[i]] = None
+                self.heads[i] = (self.heads[i] + 1) % self.n_reqs
+            elif resp_readys[i]:
+                self.i_resps[i] = None
+        for ((ini, id, slot), (status, data)) in accepts:
+            if self.reorder:
+                self.robs[ini][slot] = (status, data, id)
+            else:
+                self.i_resps[ini] = (status, data, id)
+        return (req_hss, resp_hss)
+
+# switchMxN_l3_macs_cxu: switch_l3_cxu_core to N mulacc_l2_cxus of M state contexts, target
+# p's CXU_LATENCY LATENCY + 2*p, or latencies[p]
+def switch_l3_macs(n_inis, n_tgts, n_bits=32, latency=1, n_reqs=16, reorder=False, latencies=None):
+    latencies = latencies or [latency + 2*p for p in range(n_tgts)]
+    return SwitchL3([mulacc_l2(n_inis, n_bits, lat) for lat in latencies], n_inis, n_reqs, reorder)
+
+# mux{N}_cxu: switch_cxu_core with one initiator, as a CXU-L2 model
+class Mux(Switch):
+    def __init__(self, targets, n_reqs=16):
+        super().__init__(targets, 1, n_reqs)
+
+    def step(self, req, resp_ready):
+        (req_hss, resp_hss) = super().step([req], [resp_ready])
+        return (req_hss[0], resp_hss[0])
+
+# mux{N}_macs_cxu in source: mux{N}_cxu to N mulacc_l2_cxus, of the CXU_LATENCYs of its instances
+def mux_macs(source, parameters, n_states=1, n_bits=32):
+    params = rtl_parameters(source, parameters)
+    with open(source) as f:
+        latencies = re.findall(r"mulacc_l2_cxu\s*#\([^;]*?\.CXU_LATENCY\((\w+)\)", f.read())
+    return Mux([mulacc_l2(n_states, n_bits, params[lat] if lat in params else int(lat)) for lat in latencies])
+
+# a module's int parameters: their default values in source, overridden by parameters
+def rtl_parameters(source, parameters):
+    with open(source) as f:
+        defaults = re.findall(r"parameter\s+int\s+(\w+)\s*=\s*(\d+)", f.read())
+    return dict({ name:int(value) for (name, value) in defaults },
+                **{ name:int(value) for (name, value) in parameters.items() })
+
+
+# the CXU-LI level and model of a dut with these RTL parameters
+def model(toplevel, parameters):
+    def p(name, default):
+        return int(parameters.get(name, default))
+    (n_bits, n_states, latency) = (p("CXU_DATA_W", 32), p("CXU_N_STATES", 1), p("CXU_LATENCY", 0))
+    models = {
+        "popcount_cxu":     lambda: (Level.l0_comb,   popcount(n_bits)),
+        "bnn_cxu":          lambda: (Level.l0_comb,   bnn(n_bits)),
+        "mulacc_cxu":       lambda: (Level.l1_pipe,   MulAcc(n_states, n_bits, latency)),
+        "dotprod_cxu":      lambda: (Level.l1_pipe,   DotProd(n_states, n_bits, latency, p("ELEM_W", 8))),
+        "bnn_l1_cxu":       lambda: (Level.l1_pipe,   Cvt01(bnn(n_bits), latency)),
+        "bnn_l2_cxu":       lambda: (Level.l2_stream, Cvt02(bnn(n_bits))),
+        "bnn_l1_l2_cxu":    lambda: (Level.l2_stream, Cvt12(Cvt01(bnn(n_bits)), latency)),  # (cvt01: 0)
+        "mulacc_l2_cxu":    lambda: (Level.l2_stream, mulacc_l2(n_states, n_bits, latency,
+                                                                 p("CXU_FIFO_SIZE", 0) or None)),
+    }
+    if toplevel in models:
+        return models[toplevel]()
+    m = re.fullmatch(r"switch(\d+)x(\d+)_macs_cxu", toplevel)
+    if m:
+        return (Level.l2_stream, switch_macs(int(m[1]), int(m[2]), n_bits, p("LATENCY", 1), p("N_REQS", 16)))
+    m = re.fullmatch(r"switch(\d+)x(\d+)_l3_macs_cxu", toplevel)
+    if m:
+        return (Level.l3_ooo, switch_l3_macs(int(m[1]), int(m[2]), n_bits, p("LATENCY", 1), p("N_REQS", 16),
+                                             bool(p("REORDER", 0))))
+    if re.fullmatch(r"mux\d+_macs_cxu", toplevel):
+        return (Level.l2_stream, mux_macs(f"{toplevel}.sv", parameters, n_states, n_bits))
+    raise ValueError(f"{toplevel}: no transaction-level model")
+
+
+# xorshift64 pseudo-random numbers, as the C++ driver's, for resp_ready backpressure
+def xorshift(seed=1):
+    x = seed
+    while True:
+        x ^= (x << 13) & 0xFFFFFFFFFFFFFFFF
+        x ^= x >> 7
+        x ^= (x << 17) & 0xFFFFFFFFFFFFFFFF
+        yield x
+
+TIMEOUT = 100000                        # no. of cycles without progress until hung
+
+# drive a single initiator model with recorded test cases (see vectors.py), as the C++ driver
+# drives the dut; returns its responses, (cycle, status, data) per REQ record, and no. of cycles
+def drive(level, model, recs, seed=1):
+    recs = recs.tolist() if isinstance(recs, np.ndarray) else list(recs)
+    n = len(recs)
+    rng = xorshift(seed)
+    resps = []
+    (i, n_out, rst_cnt, pct, cycle, idle) = (0, 0, 0, 100, 0, 0)
+    while i < n or n_out > 0 or rst_cnt > 0:
+        r = recs[i] if i < n else recs[0]
+
+        # perform a control record, once every outstanding response is received
+        if rst_cnt == 0 and i < n and r[0] != vectors.REQ and n_out == 0:
+            if r[0] == vectors.RESET and level >= Level.l1_pipe:
+                rst_cnt = 2
+            if r[0] == vectors.FLOW and level >= Level.l2_stream:
+                pct = r[4]
+            i += 1
+            continue
+
+        valid = rst_cnt == 0 and i < n and r[0] == vectors.REQ
+        req = (r[1], r[2], r[3], r[4], r[5]) if valid else None
+        resp_ready = next(rng) % 100 < pct if level >= Level.l2_stream else True
+        if rst_cnt != 0:
+            model.reset()
+            (req_hs, resp) = (False, None)
+            rst_cnt -= 1
+        elif level == Level.l0_comb:
+            (req_hs, resp) = (valid, model(req) if valid else None)
+        elif level == Level.l1_pipe:
+            (req_hs, resp) = (valid, model.step(req))
+        else:
+            (req_hs, resp) = model.step(req, resp_ready)
+        if resp is not None:
+            resps.append((cycle,) + resp)
+
+        i += req_hs
+        n_out += req_hs - (resp is not None)
+        idle = 0 if req_hs or resp is not None else idle + 1
+        cycle += 1
+        if idle >= TIMEOUT:
+            raise RuntimeError(f"tlm: no progress in {TIMEOUT} cycles, at record {i} of {n}")
+    return (np.array(resps, dtype=np.uint64).reshape(-1, 3), cycle)
+
+# drop-in for simcache.run(): run the module's recorded test cases through the dut's model
+def run(toplevel, module, parameters=None, extra_env=None, **_):
+    parameters = parameters or {}
+    recs = cppdriver.record(module, extra_env or {})
+    mask = np.uint64((1 << parameters.get("CXU_DATA_W", 32)) - 1)
+    recs[:, [4,5,7]] &= mask
+    (level, m) = model(toplevel, parameters)
+    start = time.time()
+    (resps, _) = drive(level, m, recs)
+    cppdriver.check(recs, resps, time.time() - start, "tlm")
+
+
+# drive each initiator of a Switch with its own stream of test cases (cxu,state,func,data0,
+# data1,model), at resp_ready percentage pct; returns each initiator's no. of responses,
+# the no. of mismatches, and the no. of cycles until the last response; a SwitchL3's
+# initiators each issue up to n_ids request ids, and check responses by id
+def drive_switch(switch, txnss, pct=100, seed=1, n_ids=16):
+    rng = xorshift(seed)
+    streams = [iter(txns) for txns in txnss]
+    n = len(streams)
+    currents = [next(stream, None) for stream in streams]
+    l3 = isinstance(switch, SwitchL3)
+    expected = [{} if l3 else deque() for _ in range(n)]
+    frees = [deque(range(n_ids)) for _ in range(n)]
+    (n_resps, n_errors, cycle, idle) = ([0] * n, 0, 0, 0)
+    while any(txn is not None for txn in currents) or any(expected):
+        if l3:
+            reqs = [None if txn is None or not free else txn[:5] + (free[0],) for (txn, free) in zip(currents, frees)]
+        else:
+            reqs = [None if txn is None else txn[:5] for txn in currents]
+        (req_hss, resp_hss) = switch.step(reqs, [next(rng) % 100 < pct for _ in range(n)])
+        for i in range(n):
+            if req_hss[i]:
+                if l3:
+                    expected[i][frees[i].popleft()] = currents[i][5]
+                else:
+                    expected[i].append(currents[i][5])
+                currents[i] = next(streams[i], None)
+            if resp_hss[i] is not None:
+                n_resps[i] += 1
+                if l3:
+                    (status, data, id) = resp_hss[i]
+                    n_errors += id not in expected[i] or (status, data) != (OK, expected[i].pop(id))
+                    frees[i].append(id)
+                else:
+                    n_errors += resp_hss[i] != (OK, expected[i].popleft())
+        idle = 0 if any(req_hss) or any(resp is not None for resp in resp_hss) else idle + 1
+        cycle += 1
+        if idle >= TIMEOUT:
+            raise RuntimeError(f"tlm: no progress in {TIMEOUT} cycles")
+    return (n_resps, n_errors, cycle)
+
+
+# replay a single initiator CXU-L1 or -L2 run's req.trace (and reset.trace) through the model,
+# with resp_ready asserted in the cycles of resp.trace's handshakes, so that the model's
+# response handshakes should match resp.trace's, cycle for cycle; returns the differences
+def crosscheck(dir, level, model, n_diffs=10):
+    reqs = traces.load(os.path.join(dir, "req.trace"))
+    resps = traces.load(os.path.join(dir, "resp.trace"))
+    path = os.path.join(dir, "reset.trace")
+    resets = set(traces.load(path)['cycle'].tolist()) if os.path.exists(path) else set()
+    ready_cycles = set(resps['cycle'].tolist())
+    expected = resps[['cycle', 'status', 'data']].tolist()
+    by_cycle = { rec[0]:rec[1:6] for rec in reqs[['cycle', 'cxu', 'state', 'func', 'data0', 'data1']].tolist() }
+    first = min(list(by_cycle) + list(resets), default=0)
+    last = max(list(by_cycle) + list(ready_cycles), default=-1)
+
+    diffs = []
+    k = 0
+    for cycle in range(first, last + 1):
+        if cycle in resets:
+            model.reset()
+            continue
+        req = by_cycle.get(cycle)
+        if level == Level.l1_pipe:
+            (req_hs, resp) = (req is not None, model.step(req))
+        else:
+            (req_hs, resp) = model.step(req, cycle in ready_cycles)
+        if req is not None and not req_hs:
+            diffs.append(f"@{cycle}: request {req} not accepted by model")
+        if resp is not None:
+            actual = (cycle,) + resp
+            if k >= len(expected):
+                diffs.append("@{0}: model response {1}:{2:08x} not in trace".format(*actual))
+            elif actual != tuple(expected[k]):
+                diffs.append("response {0}: trace @{1} {2}:{3:08x} != model @{4} {5}:{6:08x}".format(
+                    k, *expected[k], *actual))
+            k += 1
+        if len(diffs) >= n_diffs:
+            break
+    if len(diffs) < n_diffs and k < len(expected):
+        diffs.append(f"{len(expected) - k} trace responses not produced by model")
+    return diffs
+
+
+def bench(names):
+    from speed_bench import BENCHES, run_kwargs
+    print("{0:12s} {1:>8s} {2:>10s} {3:>9s} {4:>12s} {5:>12s}".format(
+        "bench", "vectors", "cycles", "run_s", "cycles/s", "vectors/s"))
+    for name in names or BENCHES:
+        (module, test, parameters) = BENCHES[name]
+        kwargs = run_kwargs(module, test, parameters)
+        recs = cppdriver.record(module, kwargs.get("extra_env", {}))
+        recs[:, [4,5,7]] &= np.uint64((1 << kwargs["parameters"].get("CXU_DATA_W", 32)) - 1)
+        try:
+            (level, m) = model(kwargs["toplevel"], kwargs["parameters"])
+        except ValueError as e:
+            print(f"{name:12s} {e}")
+            continue
+        start = time.time()
+        (resps, cycles) = drive(level, m, recs)
+        run_s = time.time() - start
+        n_vectors = int((recs[:,0] == vectors.REQ).sum())
+        cppdriver.check(recs, resps, run_s, "tlm")
+        print("{0:12s} {1:8d} {2:10d} {3:9.2f} {4:12.0f} {5:12.0f}".format(
+            name, n_vectors, cycles, run_s, cycles / run_s, n_vectors / run_s))
+
+def explore_switch(inis, tgts, latencies, depths, fracs, n_txns):
+    import random
+    from switch_macs_cxu_test import contention_txns
+    tb = SimpleNamespace(n_cxus=tgts, n_bits=32)
+    print("{0:>8s} {1:>6s} {2:>6s} {3:>10s} {4:>8s} {5:>11s}".format(
+        "latency", "depth", "frac", "responses", "cycles", "throughput"))
+    for latency in latencies:
+        for depth in depths:
+            for frac in fracs:
+                random.seed(0)
+                txnss = [contention_txns(tb, p, random.randrange(1<<32), n_txns) for p in range(inis)]
+                switch = switch_macs(inis, tgts, 32, latency, depth)
+                (n_resps, n_errors, cycles) = drive_switch(switch, txnss, round(frac * 100))
+                assert n_errors == 0, f"tlm: switch{inis}x{tgts}_macs_cxu: {n_errors} errors"
+                print("{0:8d} {1:6d} {2:6.2f} {3:10d} {4:8d} {5:11.3f}".format(
+                    latency, depth, frac, sum(n_resps), cycles, sum(n_resps) / cycles))
+
+def main():
+    parser = argparse.ArgumentParser(description="Run zoo tests through cycle-accurate Python models of their CXUs")
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    b = sub.add_parser('bench', help="run speed_bench.py's configurations through the models")
+    b.add_argument('benches', nargs='*', help="benches (default all)")
+    s = sub.add_parser('switch', help="measure switchMxN_macs_cxu throughput across configurations")
+    s.add_argument('-p', '--ports', type=int, nargs=2, default=[2, 2], metavar=('M', 'N'), help="initiators, targets")
+    s.add_argument('-l', '--latencies', type=int, nargs='+', default=[1], help="LATENCY")
+    s.add_argument('-d', '--depths', type=int, nargs='+', default=[2, 4, 8, 16], help="N_REQS")
+    s.add_argument('-f', '--fracs', type=float, nargs='+', default=[1.0, 0.9, 0.5], help="resp_ready fractions")
+    s.add_argument('-n', '--txns', type=int, default=2000, help="no. of requests per initiator")
+    c = sub.add_parser('crosscheck', help="replay a CXU_TRACE=1 run's traces through the model")
+    c.add_argument('nodeid', help="the test, e.g. mulacc_cxu_test.py::test_mulacc[32-2-1]")
+    c.add_argument('-d', '--dir', help="the traces' directory (default the test's sim_build)")
+    c.add_argument('-n', '--diffs', type=int, default=10, help="max. no. of differences")
+    args = parser.parse_args()
+
+    if args.cmd == 'bench':
+        bench(args.benches)
+    elif args.cmd == 'switch':
+        explore_switch(*args.ports, args.latencies, args.depths, args.fracs, args.txns)
+    else:
+        from impact import collect
+        from speed_bench import run_kwargs
+        [(_, module, test, parameters, name)] = collect([args.nodeid])
+        kwargs = run_kwargs(module, test, parameters, name)
+        (level, m) = model(kwargs["toplevel"], kwargs["parameters"])
+        if level not in (Level.l1_pipe, Level.l2_stream):
+            sys.exit(f"{kwargs['toplevel']}: crosscheck supports single initiator CXU-L1 and -L2")
+        dir = args.dir or kwargs.get("sim_build", "sim_build")
+        diffs = crosscheck(dir, level, m, args.diffs)
+        for diff in diffs:
+            print(f"    {diff}")
+        print(f"{dir}: model {'differs from' if diffs else 'matches'} traces")
+        if diffs:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+## tlm_test.py: check the tlm.py models against the RTL, cycle for cycle
+
+'''
+Copyright (C) 2019-2023, Gray Research LLC.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+# Run a configuration of a CXU-L1 or -L2 dut's own testbench on the RTL with CXU_TRACE=1, then
+# replay its traced requests through the dut's tlm.py model (see tlm.py crosscheck), which must
+# produce the same responses in the same cycles.
+
+import os
+import pytest
+
+from speed_bench import environ, run_kwargs
+import tlm
+import vectors
+
+# test module, test function, parameters
+CONFIGS = [
+    ("mulacc_cxu_test",    "test_mulacc",    dict(latency=2, states=2, width=32)),
+    ("dotprod_cxu_test",   "test_dotprod",   dict(latency=1, states=3, width=32, elem_w=8)),
+    ("bnn_l1_cxu_test",    "test_bnn_l1",    dict(latency=1, width=32)),
+    ("bnn_l2_cxu_test",    "test_bnn_l2",    dict(width=32)),
+    ("bnn_l1_l2_cxu_test", "test_bnn_l1_l2", dict(latency=0, width=32)),
+    ("bnn_l1_l2_cxu_test", "test_bnn_l1_l2", dict(latency=2, width=32)),
+    ("mulacc_l2_cxu_test", "test_mulacc_l2", dict(latency=0, states=2, width=32)),
+    ("mulacc_l2_cxu_test", "test_mulacc_l2", dict(latency=2, states=2, width=32)),
+    ("mux_macs_cxu_test",  "test_mux_macs",  dict(cxus=2, states=2, width=32)),
+]
+
+# run the dut's testbench on the RTL, tracing its handshakes, then crosscheck its model
+def run(**kwargs):
+    with environ(CXU_VECTORS="0", CXU_BACKEND="cocotb", CXU_PROBE="0", CXU_NATIVE_CLOCK="0"):
+        vectors.run(**dict(kwargs, extra_env=dict(kwargs.get("extra_env", {}), CXU_TRACE="1")))
+    (level, model) = tlm.model(kwargs["toplevel"], kwargs["parameters"])
+    diffs = tlm.crosscheck(kwargs["sim_build"], level, model)
+    assert not diffs, "{0}: model differs from RTL traces:\n    {1}".format(kwargs["toplevel"], "\n    ".join(diffs))
+
+@pytest.mark.parametrize("config", CONFIGS,
+    ids=["{0}-{1}".format(m[:-len("_test")], "-".join(str(v) for v in p.values())) for (m, _, p) in CONFIGS])
+
+def test_tlm(request, config):
+    (module, test, parameters) = config
+    sim_build = os.path.join(".", "sim_build",
+        request.node.name.replace('[', '-').replace(']', ''))
+    run(**dict(run_kwargs(module, test, parameters), sim_build=sim_build))
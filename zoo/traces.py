@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+record, dump, and compare binary CXU transaction traces
+
+Copyright (C) 2019-2023, Gray Research LLC.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+# A trace is a 16 byte header (MAGIC, uint32 version, uint32 record size) followed by
+# fixed size little-endian records, one per request or response handshake, so a trace
+# may be np.memmap'd and compared in bulk. With CXU_TRACE=1, TB's request and response
+# monitors write req.trace and resp.trace in the test's run directory, and TB records the
+# cycle of each reset in reset.trace (see tlm.py crosscheck). To compare a run
+# against a golden run, e.g.
+#   CXU_TRACE=1 pytest ...; mv sim_build golden; CXU_TRACE=1 pytest ...
+#   python3 traces.py compare golden sim_build
+
+import argparse
+import numpy as np
+import os
+import sys
+
+MAGIC   = b"CXUTRACE"
+VERSION = 1
+HEADER  = 16
+
+RECORD = np.dtype([
+    ('cycle',  '<u8'),
+    ('cxu',    '<u2'),
+    ('state',  '<u2'),
+    ('func',   '<u2'),
+    ('data0',  '<u8'),
+    ('data1',  '<u8'),
+    ('status', 'u1'),
+    ('data',   '<u8'),
+    ('id',     '<u2')])
+FIELDS = RECORD.names
+
+# Writer: buffer trace records, appending them to a trace file
+class Writer:
+    def __init__(self, path, n_buf=4096):
+        self.path = path
+        self.n_buf = n_buf
+        self._buf = []
+        self._f = open(path, "wb")
+        header = np.array([VERSION, RECORD.itemsize], dtype='<u4')
+        self._f.write(MAGIC + header.tobytes())
+
+    # append one record; sample maps (some) field names to ints
+    def write(self, cycle, sample):
+        self._buf.append((cycle,) + tuple(sample.get(name, 0) for name in FIELDS[1:]))
+        if len(self._buf) >= self.n_buf:
+            self.flush()
+
+    def flush(self):
+        if self._buf:
+            np.array(self._buf, dtype=RECORD).tofile(self._f)
+            self._buf = []
+        self._f.flush()
+
+    def close(self):
+        self.flush()
+        self._f.close()
+
+_writers = {}
+
+# the process's Writer for path, so successive TBs in one test append to one trace
+def writer(path):
+    if path not in _writers:
+        _writers[path] = Writer(path)
+    return _writers[path]
+
+# memory map a trace's records
+def load(path):
+    with open(path, "rb") as f:
+        header = f.read(HEADER)
+    if len(header) != HEADER or header[:8] != MAGIC:
+        raise ValueError(f"{path}: not a CXU trace")
+    (version, size) = np.frombuffer(header[8:], dtype='<u4')
+    if version != VERSION or size != RECORD.itemsize:
+        raise ValueError(f"{path}: trace version {version}, record size {size} unsupported")
+    if os.path.getsize(path) == HEADER:
+        return np.zeros(0, dtype=RECORD)
+    return np.memmap(path, dtype=RECORD, mode='r', offset=HEADER)
+
+# compare two traces' records, over fields; return a list of differences (at most n_diffs)
+def compare(golden, actual, fields=FIELDS, n_diffs=10):
+    (a, b) = (load(golden), load(actual))
+    diffs = []
+    if len(a) != len(b):
+        diffs.append(f"{len(a)} != {len(b)} records")
+    n = min(len(a), len(b))
+    differ = np.zeros(n, dtype=bool)
+    for field in fields:
+        differ |= a[field][:n] != b[field][:n]
+    for i in np.flatnonzero(differ)[:n_diffs]:
+        diffs.append(f"record {i}: {describe(a[i])} != {describe(b[i])}")
+    return diffs
+
+def describe(rec):
+    return "@{0} cxu={1} state={2} func={3} data0={4:08x} data1={5:08x} => {6}:{7:08x} id={8}".format(
+        *(int(rec[name]) for name in FIELDS))
+
+# compare each trace under golden (a trace or a directory tree) with its counterpart under actual
+def compare_trees(golden, actual, fields=FIELDS, n_diffs=10):
+    if os.path.isfile(golden):
+        pairs = [(golden, actual)]
+    else:
+        pairs = []
+        for (root, _, files) in os.walk(golden):
+            for name in sorted(files):
+                if name.endswith(".trace"):
+                    path = os.path.join(root, name)
+                    pairs.append((path, os.path.join(actual, os.path.relpath(path, golden))))
+    n_bad = 0
+    for (g, a) in pairs:
+        diffs = compare(g, a, fields, n_diffs) if os.path.isfile(a) else ["missing"]
+        if diffs:
+            n_bad += 1
+            print(f"{a}:")
+            for diff in diffs:
+                print(f"    {diff}")
+    print(f"{len(pairs)} traces compared, {n_bad} differ")
+    return n_bad
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    dump = sub.add_parser('dump', help="print a trace's records")
+    dump.add_argument('trace')
+    cmp = sub.add_parser('compare', help="compare traces (or trees of traces) with golden ones")
+    cmp.add_argument('golden')
+    cmp.add_argument('actual')
+    cmp.add_argument('--ignore-cycles', action='store_true', help="compare transactions, not their timing")
+    cmp.add_argument('-n', '--diffs', type=int, default=10, help="max. no. of differences per trace")
+    args = parser.parse_args()
+
+    if args.cmd == 'dump':
+        for rec in load(args.trace):
+            print(describe(rec))
+    else:
+        fields = FIELDS[1:] if args.ignore_cycles else FIELDS
+        if compare_trees(args.golden, args.actual, fields, args.diffs) != 0:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+## vectors.py: self-checking in-HDL vector mode for CXU testbenches
+
+'''
+Copyright (C) 2019-2023, Gray Research LLC.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+# With CXU_VECTORS=1, TB records its test cases rather than driving them, and writes them
+# (with their expected responses) to a $readmemh file. A generated System Verilog harness,
+# <dut>_vectors, wraps the dut, streams the records into it at full rate, checks each response,
+# and reports its counts back to cocotb once per run, so the simulator runs at native speed.
+# The harness generates its own clock, so Python does not run on its cycles; Verilator builds
+# it with --timing (Verilator 5.006+).
+#
+# Each record is 8 64-bit words: op, cxu, state, func, data0, data1, status, data.
+# op REQ issues a request and expects response (status, data); op RESET waits for the
+# outstanding responses then resets the dut; op FLOW sets the resp_ready percentage to data0.
+
+from cocotb.triggers import FallingEdge, RisingEdge
+from jinja2 import Template
+import os
+import re
+
+from cxu_li import *
+import cppdriver
+import simcache
+import waves
+
+REQ   = 0
+RESET = 1
+FLOW  = 2
+
+N_RECS = 1 << 16                        # max records per harness run
+FILE   = "cxu_vectors.hex"
+
+# (cppdriver: while a list, Vectors.run() appends its records here rather than run the harness)
+recorded = None
+
+def enabled():
+    return os.environ.get("CXU_VECTORS", "0") != "0" or recorded is not None
+
+# TB side: record test cases, then run them through the harness
+class Vectors:
+    def __init__(self, dut, level):
+        self.dut   = dut
+        self.level = level
+        self.recs  = []
+        self.frac  = None               # (harness resp_ready percentage persists across TBs)
+        self.runs  = 0
+
+    def full(self):
+        return len(self.recs) >= N_RECS - 1
+
+    def reset(self):
+        if self.level > Level.l0_comb:
+            self.recs.append((RESET, 0, 0, 0, 0, 0, 0, 0))
+
+    def request(self, cxu, state, func, data0, data1, status, data, frac=1.0):
+        if self.level >= Level.l2_stream and frac != self.frac:
+            self.recs.append((FLOW, 0, 0, 0, round(frac*100), 0, 0, 0))
+            self.frac = frac
+        self.recs.append((REQ, cxu, state, func, data0, data1, status, data))
+
+    # write the records, run them through the harness, and check its counts
+    async def run(self):
+        if recorded is not None:
+            recorded.extend(self.recs)
+            self.recs = []
+            return
+        if not self.recs:
+            return
+        n_reqs = sum(1 for rec in self.recs if rec[0] == REQ)
+        with open(FILE, "w") as f:
+            f.writelines("{0:016x}\n".format(word & ((1<<64)-1)) for rec in self.recs for word in rec)
+        self.dut.n_recs.value = len(self.recs)
+        self.dut.start.value = 1
+        await RisingEdge(self.dut.done)
+        self.dut.start.value = 0
+        await FallingEdge(self.dut.done)    # (the harness idles until the next start)
+        (checked, errors, hung) = (self.dut.n_checked.value.integer, self.dut.n_errors.value.integer,
+                                   self.dut.hung.value.integer)
+        if errors:
+            waves.failed(self.dut.first_error.value.integer)    # (for a rerun's waveform window)
+        self.dut._log.info("vectors run {0}: {1} records, {2} responses checked, {3} errors".format(
+            self.runs, len(self.recs), checked, errors))
+        self.recs = []
+        self.runs += 1
+        assert not hung, "vectors: no progress, {0} of {1} responses checked".format(checked, n_reqs)
+        assert errors == 0 and checked == n_reqs, \
+            "vectors: {0} errors, {1} of {2} responses checked".format(errors, checked, n_reqs)
+
+
+# pytest side: drop-in for simcache.run(); in vector mode, runs the dut within its harness;
+# with CXU_BACKEND=cpp, runs the dut under the C++ driver instead; with CXU_BACKEND=tlm, runs
+# its Python model instead (see tlm.py); with CXU_PROBE=1, runs the dut within its probe
+# wrapper (see probe.py)
+def run(**kwargs):
+    import probe, tlm
+    if cppdriver.enabled():
+        return cppdriver.run(**kwargs)
+    if tlm.enabled():
+        return tlm.run(**kwargs)
+    if not enabled():
+        return simcache.run(**(probe.wrap(kwargs) if probe.enabled() else kwargs))
+
+    dut = kwargs["toplevel"]
+    sim_build = kwargs.get("sim_build", "sim_build")
+    os.makedirs(sim_build, exist_ok=True)
+    harness = generate(dut, f"{dut}.sv", kwargs.get("parameters", {}), sim_build)
+    return simcache.run(**timing(dict(kwargs, toplevel=f"{dut}_vectors",
+        verilog_sources=list(kwargs["verilog_sources"]) + [harness])))
+
+# run() arguments for a toplevel that generates its own clock with delays: under Verilator,
+# also compile with --timing, so the clock runs natively rather than being driven by cocotb
+def timing(kwargs):
+    sim = os.environ.get("SIM", kwargs.get("simulator") or "icarus")
+    args = list(kwargs.get("compile_args", []))
+    if sim.lower().startswith("verilator") and "--timing" not in args:
+        args.append("--timing")
+    return dict(kwargs, compile_args=args)
+
+# generate sim_build/<dut>_vectors.sv, a harness for the dut, which has the CXU-LI level and
+# default CXU parameters of its `CXU_L<n>_PARAMS() declaration in source, plus parameters
+def generate(dut, source, parameters, sim_build="."):
+    (level, args, extra) = declaration(source, parameters)
+    if level == Level.l3_ooo:
+        raise ValueError(f"{source}: vector mode does not support CXU-L3")
+
+    name = f"{dut}_vectors"
+    output = os.path.join(sim_build, f"{name}.sv")
+    with open(output, 'w') as f:
+        f.write(TEMPLATE.render(name=name, dut=dut, level=level, args=args, extra=extra,
+                                parameters=list(parameters), n_recs=N_RECS, file=FILE))
+        f.flush()
+    return output
+
+# the CXU-LI level and macro arguments of source's `CXU_L<n>_PARAMS() declaration, and
+# those of parameters that are not its CXU parameters, as [(name, value)]
+def declaration(source, parameters):
+    with open(source) as f:
+        text = f.read()
+    m = re.search(r"`CXU_L([0-3])_PARAMS\(", text)
+    if m is None:
+        raise ValueError(f"{source}: no `CXU_L<n>_PARAMS(...) declaration")
+    level = int(m.group(1))
+
+    # macro arguments, to the matching close paren, without comments
+    depth = 1
+    for (end, c) in enumerate(text[m.end():], m.end()):
+        depth += { '(':1, ')':-1 }.get(c, 0)
+        if depth == 0:
+            break
+    args = re.sub(r"/\*.*?\*/", "", text[m.end():end], flags=re.DOTALL)
+    args = ", ".join(arg.strip() for arg in args.split(","))
+
+    macro_params = { 0: ["N_CXUS","CXU_ID_W","FUNC_ID_W","DATA_W"],
+                     1: ["N_CXUS","N_STATES","LATENCY","RESET_LATENCY","CXU_ID_W","STATE_ID_W","FUNC_ID_W","DATA_W"],
+                     2: ["N_CXUS","N_STATES","CXU_ID_W","STATE_ID_W","FUNC_ID_W","INSN_W","DATA_W"],
+                     3: ["N_CXUS","N_STATES","REQ_ID_W","CXU_ID_W","STATE_ID_W","FUNC_ID_W","INSN_W","DATA_W"] }[level]
+    extra = [(name, value) for (name, value) in parameters.items()
+             if name not in ["CXU_" + p for p in macro_params]]
+    return (level, args, extra)
+
+TEMPLATE = Template(
+"""// {{name}}.sv: self-checking vector harness for {{dut}} (CXU-L{{level}}), generated by vectors.py
+//
+// Copyright (C) 2019-2023, Gray Research LLC.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//    http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+`include "cxu.svh"
+
+/* verilator lint_off DECLFILENAME */
+
+// {{name}}: on start, $readmemh n_recs records from VECTORS, stream them through {{dut}}
+// at full rate, check each response, then raise done with the counts, until start falls
+module {{name}}
+    import common_pkg::*, cxu_pkg::*;
+#(
+    `CXU_L{{level}}_PARAMS({{args}}),
+{%- for (p, value) in extra %}
+    parameter int {{p}} = {{value}},
+{%- endfor %}
+    parameter     VECTORS       = "{{file}}",
+    parameter int N_RECS        = {{n_recs}},        // max records per run
+    parameter int TIMEOUT       = 10000,        // no. of cycles without progress until hung
+    parameter int MAX_REPORTS   = 10            // no. of mismatches to $display
+);
+    localparam int REQ = 0, RESET = 1, FLOW = 2;   // record ops
+
+    // cocotb interface
+    logic           start = 1'b0;
+    int             n_recs = 0;
+    logic           done = 1'b0;
+    int             n_checked = 0;
+    int             n_errors = 0;
+    logic           hung = 1'b0;
+    int             first_error = 0;        // the first mismatch's time (ns)
+
+    logic           clk = 1'b0;
+    always #0.5 clk = ~clk;                 // 1 ns period, as TB's (Verilator: --timing)
+    int             now = 0;                // time (ns) of this clock edge, less 0.5
+    always_ff @(posedge clk)
+        now <= now + 1;
+
+    `CXU_L{{level}}_NETS(req, resp);
+{%- if level >= 1 %}
+    logic           rst;
+    logic           clk_en;
+{%- endif %}
+
+    // records and the dut
+    logic [63:0]    recs[N_RECS*8];
+    logic           running = 1'b0;
+    int             i;                      // next record to issue
+    int             j;                      // next record to check
+    int             n_out;                  // no. of requests awaiting responses
+    int             idle;                   // no. of cycles without progress
+    int             rst_cnt = 0;            // no. of reset cycles remaining
+    logic [6:0]     resp_ready_pct = 7'd100;
+    logic           req_hs;
+    logic           resp_hs;
+
+    {{dut}} #(
+{%- for p in parameters %}
+        .{{p}}({{p}}){% if not loop.last %},{% endif %}
+{%- endfor %}
+    ) {{dut}}(
+{%- if level >= 1 %}
+        `CXU_CLK_PORT_MAP,
+{%- endif %}
+        `CXU_L{{level}}_PORT_MAP(req,req, resp,resp));
+
+    wire [63:0] i_op = recs[8*i+0], i_cxu = recs[8*i+1], i_state = recs[8*i+2], i_func = recs[8*i+3];
+    wire [63:0] i_data0 = recs[8*i+4], i_data1 = recs[8*i+5];
+    wire [63:0] j_state = recs[8*j+2], j_func = recs[8*j+3], j_data0 = recs[8*j+4], j_data1 = recs[8*j+5];
+    wire [63:0] j_status = recs[8*j+6], j_data = recs[8*j+7];
+    wire _unused_ok = &{1'b0,i_op,i_cxu,i_state,i_func,i_data0,i_data1,
+                        j_state,j_func,j_data0,j_data1,j_status,j_data,1'b0};
+
+    always_comb begin
+        req_valid = running && rst_cnt == 0 && i < n_recs && i_op == REQ;
+        req_cxu   = i_cxu[msb(CXU_CXU_ID_W):0];
+        req_func  = i_func[msb(CXU_FUNC_ID_W):0];
+        req_data0 = i_data0[CXU_DATA_W-1:0];
+        req_data1 = i_data1[CXU_DATA_W-1:0];
+{%- if level >= 1 %}
+        req_state = i_state[msb(CXU_STATE_ID_W):0];
+        rst       = rst_cnt != 0;
+        clk_en    = 1'b1;
+{%- endif %}
+{%- if level >= 2 %}
+        req_insn  = '0;
+        req_hs    = req_valid && req_ready;
+        resp_hs   = resp_valid && resp_ready;
+{%- elif level == 1 %}
+        req_hs    = req_valid;
+        resp_hs   = resp_valid;
+{%- else %}
+        req_hs    = req_valid;
+        resp_hs   = req_valid;          // combinational: response is that of the current request
+{%- endif %}
+    end
+{%- if level >= 2 %}
+
+    // response flow control
+    always_ff @(posedge clk)
+        resp_ready <= ($urandom % 100) < resp_ready_pct;
+{%- endif %}
+
+    always_ff @(posedge clk) begin
+        if (!running) begin
+            if (start && !done) begin
+                $readmemh(VECTORS, recs, 0, 8*n_recs-1);
+                running <= 1'b1;
+                hung <= 1'b0;
+                i <= 0;
+                j <= 0;
+                n_out <= 0;
+                idle <= 0;
+                n_checked <= 0;
+                n_errors <= 0;
+                first_error <= 0;
+            end
+            else if (!start)
+                done <= 1'b0;
+        end
+        else begin
+            idle <= idle + 1;
+            if (rst_cnt != 0)
+                rst_cnt <= rst_cnt - 1;
+            else if (i < n_recs && i_op != REQ && n_out == 0) begin
+                // perform a control record, once every outstanding response is checked
+{%- if level >= 1 %}
+                if (i_op == RESET)
+                    rst_cnt <= 2;
+{%- endif %}
+                if (i_op == FLOW)
+                    resp_ready_pct <= 7'(i_data0);
+                i <= i + 1;
+                j <= i + 1;
+                idle <= 0;
+            end
+
+            if (req_hs) begin
+                i <= i + 1;
+                idle <= 0;
+            end
+            if (resp_hs) begin
+                if (n_out == 0 && !req_hs) begin
+                    if (n_errors < MAX_REPORTS)
+                        $display("%m: unexpected response %1d:%08x", resp_status, resp_data);
+                    if (n_errors == 0)
+                        first_error <= now;
+                    n_errors <= n_errors + 1;
+                end
+                else begin
+                    if (resp_status != j_status[CXU_STATUS_W-1:0]
+                     || resp_data != j_data[CXU_DATA_W-1:0]) begin
+                        if (n_errors < MAX_REPORTS)
+                            $display("%m: test(%1d,%2d,%08x,%08x) => %1d:%08x != %1d:%08x",
+                                j_state, j_func, j_data0[CXU_DATA_W-1:0], j_data1[CXU_DATA_W-1:0],
+                                resp_status, resp_data, j_status, j_data[CXU_DATA_W-1:0]);
+                        if (n_errors == 0)
+                            first_error <= now;
+                        n_errors <= n_errors + 1;
+                    end
+                    n_checked <= n_checked + 1;
+                    j <= j + 1;
+                end
+                idle <= 0;
+            end
+            n_out <= n_out + int'(req_hs) - int'(resp_hs);
+
+            if (i >= n_recs && n_out == 0 && rst_cnt == 0) begin
+                running <= 1'b0;
+                done <= 1'b1;
+            end
+            else if (idle >= TIMEOUT) begin
+                $display("%m: no progress in %1d cycles, at record %1d of %1d", TIMEOUT, i, n_recs);
+                running <= 1'b0;
+                hung <= 1'b1;
+                done <= 1'b1;
+            end
+        end
+    end
+endmodule
+""")
@@ -0,0 +1,84 @@
+## waves.py: opt-in, windowed, and on-failure waveform capture for CXU testbenches
+
+'''
+Copyright (C) 2019-2023, Gray Research LLC.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+# Each dut's `ifdef <MODULE>_VCD block dumps waveforms (see `CXU_WAVES in common.svh).
+# Rather than define it for every run, simcache.run() drops the *_VCD defines, per CXU_WAVES:
+#
+#   CXU_WAVES=fail      (default) no waveforms; but when a test fails, run it again with
+#                       waveforms of just the window of cycles around its first mismatch
+#   CXU_WAVES=1         waveforms of every run, in full
+#   CXU_WAVES=0         no waveforms
+#   CXU_WAVES_WINDOW    the failure window: cycles before,after the first mismatch (default 200,20)
+#
+# The first mismatch's simulation time is noted by TB (in vector mode, as reported by the
+# harness), in FAILURE in the run directory.
+# Waveforms are FST, where the simulator supports it (Icarus, Verilator), else VCD.
+
+from cocotb.utils import get_sim_time
+import json
+import os
+
+FAILURE = "cxu_failure.json"
+
+def mode():
+    m = os.environ.get("CXU_WAVES", "fail")
+    return { "0":"off", "1":"on" }.get(m, m)
+
+def is_waves_define(define):
+    return define.endswith("_VCD")
+
+# defines, without the waveform defines unless every run dumps waveforms
+def defines(defines):
+    if mode() == "on":
+        return list(defines)
+    return [d for d in defines if not is_waves_define(d)]
+
+# TB: note the first mismatch's time (default now), in the run directory
+def failed(time_ns=None):
+    if not os.path.exists(FAILURE):
+        with open(FAILURE, "w") as f:
+            json.dump({ "time_ns":get_sim_time(units="ns") if time_ns is None else time_ns }, f)
+
+def clear(work_dir):
+    path = os.path.join(work_dir, FAILURE)
+    if os.path.exists(path):
+        os.remove(path)
+
+# run() arguments for a rerun of a failed run, dumping the window around its first mismatch
+# to <work_dir>/<toplevel>.fst or .vcd; or None if the run defines no waveform define
+def rerun_kwargs(sim, kwargs, defines):
+    if not any(is_waves_define(d) for d in defines):
+        return None
+    work_dir = kwargs["work_dir"]
+    fst = sim in ("icarus", "verilator")
+    file = "{0}.{1}".format(kwargs["toplevel"], "fst" if fst else "vcd")
+    plus_args = list(kwargs.get("plus_args", [])) + [f"+cxu_waves_file={file}"]
+
+    path = os.path.join(work_dir, FAILURE)
+    if os.path.exists(path):
+        with open(path) as f:
+            at = int(json.load(f)["time_ns"])
+        (before, after) = (int(n) for n in os.environ.get("CXU_WAVES_WINDOW", "200,20").split(","))
+        plus_args += [f"+cxu_waves_from={max(0, at - before)}", f"+cxu_waves_to={at + after}"]
+
+    rerun = dict(kwargs, defines=list(defines), plus_args=plus_args)
+    if sim == "icarus":
+        rerun["plus_args"] = plus_args + ["-fst"]    # (a vvp extended argument, after the design file)
+    elif sim == "verilator":
+        rerun["compile_args"] = list(kwargs.get("compile_args", [])) + ["--trace-fst"]
+    return rerun